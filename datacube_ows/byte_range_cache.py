@@ -0,0 +1,414 @@
+# This file is part of datacube-ows, part of the Open Data Cube project.
+# See https://opendatacube.org for more information.
+#
+# Copyright (c) 2017-2024 OWS Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Process-wide cache of byte ranges read from remote (HTTP(S) and S3) raster files.
+
+Neighbouring tile requests typically read the same file headers and many of the same internal
+tiles of the same COGs.  When the byte range cache is enabled, remote reads made by
+GDAL while loading data are served through a Python opener that reads fixed-size
+blocks of each file through an LRU cache, optionally backed by a directory on disk that can be
+shared by all worker processes on a host.
+
+Blocks are cached by the URL of the file before it is passed through the layer's patch_url
+function, so that the cache is not defeated by URL signing.
+
+The cache assumes remote files are immutable: cached blocks are not revalidated (e.g. by ETag or
+Last-Modified), so a file rewritten at the same URL may be served stale (or as a mix of old and new
+blocks) from memory or disk until its blocks are evicted or expire from the cache.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import threading
+from contextlib import ExitStack, contextmanager
+from typing import Callable, Iterator, cast
+from urllib.parse import urlparse
+
+import rasterio
+import requests
+from datacube.utils.aws import s3_client, s3_url_parse
+from prometheus_client import Counter
+from rasterio.abc import FileContainer
+
+from datacube_ows.config_utils import CFG_DICT, ConfigException, OWSConfigEntry
+from datacube_ows.utils import LRUCache
+
+# Rasterio (major, minor) versions the private opener registration API below has been tested against.
+SUPPORTED_RASTERIO_VERSIONS = ((1, 4),)
+
+try:
+    # Registering an opener against a path is what rasterio.open(..., opener=...) does internally.
+    # Datacube opens the files itself, so the registered path has to be passed in through patch_url.
+    # This is a private rasterio API, so is only used with tested rasterio versions.
+    from rasterio._vsiopener import _opener_registration
+except ImportError:
+    # rasterio < 1.4
+    _opener_registration = None
+
+
+def _rasterio_supported() -> bool:
+    try:
+        version = tuple(int(part) for part in rasterio.__version__.split(".")[:2])
+    except ValueError:
+        return False
+    return _opener_registration is not None and version in SUPPORTED_RASTERIO_VERSIONS
+
+_LOG = logging.getLogger(__name__)
+
+BLOCK_HITS = Counter("ows_byte_range_cache_hits", "Blocks read from the byte range cache")
+BLOCK_MISSES = Counter("ows_byte_range_cache_misses", "Blocks fetched from remote storage by the byte range cache")
+
+CACHEABLE_SCHEMES = ("http", "https", "s3")
+
+_local = threading.local()
+
+
+def _gdal_option(name: str) -> str | None:
+    # Imported here to avoid a circular import.
+    from datacube_ows.startup_utils import CredentialManager
+    val = CredentialManager.gdal_opts.get(name, os.environ.get(name))
+    return None if val is None else str(val)
+
+
+def s3_cacheable() -> bool:
+    """
+    Whether S3 reads can be served through the cache.
+
+    The boto3 client used to fetch S3 byte ranges does not honour GDAL's S3 endpoint options,
+    so S3 reads are left to GDAL if a custom endpoint (or non-default addressing) is configured.
+    """
+    if _gdal_option("AWS_S3_ENDPOINT"):
+        return False
+    for name in ("AWS_HTTPS", "AWS_VIRTUAL_HOSTING"):
+        val = _gdal_option(name)
+        if val is not None and val.upper() in ("NO", "FALSE", "OFF", "0"):
+            return False
+    return True
+
+
+def fetch_range(url: str, start: int, end: int) -> tuple[bytes, int]:
+    """
+    Fetch a byte range of a remote file.
+
+    :param url: The (possibly signed) URL of the file.
+    :param start: The first byte to fetch.
+    :param end: One past the last byte to fetch.
+    :return: A tuple of the bytes fetched (which may be fewer than requested at the end of the file)
+        and the total size of the file.
+    """
+    if urlparse(url).scheme == "s3":
+        # Imported here to avoid a circular import.
+        from datacube_ows.startup_utils import CredentialManager
+        kwargs: dict[str, str] = {}
+        # pylint: disable=protected-access
+        if CredentialManager._instance is not None and CredentialManager._instance.requester_pays:
+            kwargs["RequestPayer"] = "requester"
+        bucket, key = s3_url_parse(url)
+        obj = s3_client(cache=True).get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end - 1}", **kwargs)
+        data = obj["Body"].read()
+        content_range = obj.get("ContentRange")
+    else:
+        session = getattr(_local, "session", None)
+        if session is None:
+            # One session (and so one pool of kept-alive connections) per thread.
+            session = requests.Session()
+            _local.session = session
+        resp = session.get(url, headers={"Range": f"bytes={start}-{end - 1}"}, timeout=60)
+        resp.raise_for_status()
+        if resp.status_code != 206:
+            # Server ignored the range and returned the whole file.
+            return resp.content[start:end], len(resp.content)
+        data = resp.content
+        content_range = resp.headers.get("Content-Range")
+    # e.g. "bytes 0-65535/1234567"
+    if content_range is None or "/" not in content_range or content_range.endswith("/*"):
+        raise OSError(f"Could not determine the size of {url}")
+    return data, int(content_range.rsplit("/", 1)[1])
+
+
+class DiskBlockStore:
+    """
+    Size-limited on-disk store of cached blocks, safe to share between processes.
+
+    Files are evicted least-recently-used first (by modification time, which is updated on every read)
+    whenever the total size of the store exceeds its limit.
+    """
+    def __init__(self, directory: str, max_size: int) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self._written = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: tuple[str, int]) -> str:
+        return os.path.join(self.directory, hashlib.sha256(f"{key[1]}:{key[0]}".encode("utf-8")).hexdigest())
+
+    def get(self, key: tuple[str, int]) -> bytes | None:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key: tuple[str, int], data: bytes) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            _LOG.warning("Could not write to byte range cache directory %s: %s", self.directory, str(e))
+            return
+        with self._lock:
+            self._written += len(data)
+            # Only rescan the directory once a tenth of the limit has been written by this process.
+            prune = self._written > self.max_size // 10
+            if prune:
+                self._written = 0
+        if prune:
+            self.prune()
+
+    def prune(self) -> None:
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+class ByteRangeCache(OWSConfigEntry):
+    """
+    Process-wide LRU cache of fixed-size blocks of remote files, keyed by URL and block.
+    """
+    def __init__(self, cfg: CFG_DICT) -> None:
+        super().__init__(cfg)
+        try:
+            self.max_size = int(cast(int | str, cfg.get("max_size", 256 * 1024 * 1024)))
+            self.block_size = int(cast(int | str, cfg.get("block_size", 64 * 1024)))
+        except ValueError:
+            raise ConfigException(f"max_size and block_size in byte_range_cache section must be integers: {cfg}")
+        if self.max_size <= 0 or self.block_size <= 0:
+            raise ConfigException(f"max_size and block_size in byte_range_cache section must be positive: {cfg}")
+        self.directory = cast(str | None, cfg.get("directory"))
+        if self.directory is not None:
+            try:
+                self.max_disk_size = int(cast(int | str, cfg.get("max_disk_size", 10 * self.max_size)))
+            except ValueError:
+                raise ConfigException(f"max_disk_size in byte_range_cache section must be an integer: {cfg}")
+            if self.max_disk_size <= 0:
+                raise ConfigException(f"max_disk_size in byte_range_cache section must be positive: {cfg}")
+            self._disk: DiskBlockStore | None = DiskBlockStore(self.directory, self.max_disk_size)
+        else:
+            self._disk = None
+        self._blocks = LRUCache(self.max_size, sizeof=len)
+        self._sizes = LRUCache(max(self.max_size // self.block_size, 1000))
+
+    def _block(self, key: str, url: str, idx: int) -> bytes:
+        block_key = (key, idx)
+        data = self._blocks.get(block_key)
+        if data is None and self._disk is not None:
+            data = self._disk.get(block_key)
+            if data is not None:
+                self._blocks.put(block_key, data)
+        if data is not None:
+            BLOCK_HITS.inc()
+            return data
+        BLOCK_MISSES.inc()
+        start = idx * self.block_size
+        data, size = fetch_range(url, start, start + self.block_size)
+        self._sizes.put(key, size)
+        self._blocks.put(block_key, data)
+        if self._disk is not None:
+            self._disk.put(block_key, data)
+        return data
+
+    def size(self, key: str, url: str) -> int:
+        """
+        The size of a remote file.
+
+        :param key: The cache key of the file (the URL before patching)
+        :param url: The URL to fetch the file from.
+        :return: The size of the file in bytes.
+        """
+        size = self._sizes.get(key)
+        if size is None:
+            # The first block is always needed for the file header, so fetching it is never wasted.
+            self._block(key, url, 0)
+            size = self._sizes.get(key)
+            if size is None:
+                # Header block came from disk, fetch the size directly.
+                _, size = fetch_range(url, 0, 1)
+                self._sizes.put(key, size)
+        return size
+
+    def read(self, key: str, url: str, offset: int, length: int) -> bytes:
+        """
+        Read a byte range of a remote file through the cache.
+
+        :param key: The cache key of the file (the URL before patching)
+        :param url: The URL to fetch the file from.
+        :param offset: The first byte to read.
+        :param length: The number of bytes to read.
+        :return: The bytes read (fewer than length at the end of the file.)
+        """
+        if length <= 0:
+            return b""
+        size = self.size(key, url)
+        if offset >= size:
+            return b""
+        first = offset // self.block_size
+        # Don't fetch blocks past the end of the file - the range request would be unsatisfiable.
+        last = min((offset + length - 1) // self.block_size, (size - 1) // self.block_size)
+        data = b"".join(self._block(key, url, idx) for idx in range(first, last + 1))
+        start = offset - first * self.block_size
+        return data[start:start + length]
+
+    def clear(self) -> None:
+        self._blocks.clear()
+        self._sizes.clear()
+
+    @contextmanager
+    def patch_url(self, patch_url: Callable[[str], str] | None) -> Iterator[Callable[[str], str]]:
+        """
+        A patch_url function for datacube load_data that routes remote reads through the cache.
+
+        Remote URLs are registered with a Python opener for the duration of the context, and the
+        registered GDAL virtual file path is returned in place of the (patched) URL.
+
+        :param patch_url: The layer's patch_url function (or None)
+        :return: A context manager returning a patch_url function.
+        """
+        with ExitStack() as stack:
+            opener = CachingOpener(self)
+            registered: dict[str, str] = {}
+
+            def cached_url(url: str) -> str:
+                if url in registered:
+                    return registered[url]
+                fetch_url = patch_url(url) if patch_url is not None else url
+                scheme = urlparse(fetch_url).scheme
+                if _opener_registration is None or scheme not in CACHEABLE_SCHEMES:
+                    return fetch_url
+                if scheme == "s3" and not s3_cacheable():
+                    return fetch_url
+                opener.urls[url] = fetch_url
+                registered[url] = stack.enter_context(_opener_registration(url, opener))
+                return registered[url]
+
+            yield cached_url
+
+
+class CachedFile(io.RawIOBase):
+    """
+    Read-only file object for a remote file, reading through the byte range cache.
+    """
+    def __init__(self, cache: ByteRangeCache, key: str, url: str) -> None:
+        super().__init__()
+        self.cache = cache
+        self.key = key
+        self.url = url
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.cache.size(self.key, self.url)
+        self._pos = offset
+        return self._pos
+
+    def read(self, size: int | None = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.cache.size(self.key, self.url) - self._pos
+        data = self.cache.read(self.key, self.url, self._pos, size)
+        self._pos += len(data)
+        return data
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+class CachingOpener(FileContainer):
+    """
+    Rasterio opener serving registered remote files through the byte range cache.
+
+    Only the registered files exist - requests for side-car files are reported as missing.
+    """
+    def __init__(self, cache: ByteRangeCache) -> None:
+        self.cache = cache
+        # Cache key (unpatched URL) to URL to fetch from.
+        self.urls: dict[str, str] = {}
+
+    def open(self, path: str, mode: str = "r", **kwargs) -> CachedFile:
+        if path not in self.urls or "w" in mode:
+            raise FileNotFoundError(path)
+        return CachedFile(self.cache, path, self.urls[path])
+
+    def isfile(self, path: str) -> bool:
+        return path in self.urls
+
+    def isdir(self, path: str) -> bool:
+        return False
+
+    def ls(self, path: str) -> list[str]:
+        return []
+
+    def mtime(self, path: str) -> int:
+        return 0
+
+    def rm(self, path: str) -> None:
+        raise PermissionError(path)
+
+    def size(self, path: str) -> int:
+        if path not in self.urls:
+            raise FileNotFoundError(path)
+        return self.cache.size(path, self.urls[path])
+
+
+def parse_byte_range_cache(cfg: CFG_DICT | None) -> ByteRangeCache | None:
+    """
+    Create a byte range cache from a byte_range_cache configuration section.
+
+    :param cfg: The byte_range_cache section of the global configuration (or None if not configured.)
+    :return: A byte range cache, or None if byte range caching is not configured.
+    """
+    if cfg is None:
+        return None
+    if not _rasterio_supported():
+        _LOG.warning("Byte range cache requires rasterio 1.4 (found %s) - caching disabled", rasterio.__version__)
+        return None
+    return ByteRangeCache(cfg)
@@ -9,13 +9,15 @@ import logging
 import os
 from importlib import import_module
 from itertools import chain
-from typing import Any, Callable, Iterable, Optional, Sequence, cast
+from typing import (Any, Callable, Iterable, MutableMapping, Optional,
+                    Sequence, cast)
 from urllib.parse import urlparse
 
 import fsspec
+import numpy
 from babel.messages import Catalog, Message
 from datacube.model import Product
-from datacube.utils.masking import make_mask
+from datacube.utils.masking import create_mask_value, get_flags_def, make_mask
 from flask_babel import gettext as _
 from xarray import DataArray
 
@@ -869,6 +871,8 @@ class AbstractMaskRule(OWSConfigEntry):
         super().__init__(cfg)
         self.band = mapper(band)
         self.parse_rule_spec(cfg)
+        # Boolean lookup tables for 8 and 16 bit data (see compiled_mask)
+        self.luts: dict[tuple[str, str], numpy.ndarray] = {}
 
     @property
     def context(self) -> str:
@@ -913,6 +917,44 @@ class AbstractMaskRule(OWSConfigEntry):
             raise ConfigException(
                 f"Mask rule in {self.context} has both a 'flags' and a 'values' section - choose one.")
 
+    def flag_terms(self, flags_def: CFG_DICT) -> list[tuple[int, int]]:
+        """
+        Compile the flags of this rule to bitwise tests.
+
+        :param flags_def: The flags definition of the flag band.
+        :return: A list of (bitmask, value) pairs. Data matches the rule where (data & bitmask) == value
+                 for all pairs (or for any pair, for "or" rules).
+        """
+        flags = cast(CFG_DICT, self.flags)
+        if self.or_flags:
+            return [create_mask_value(flags_def, **{k: v}) for k, v in flags.items()]
+        return [create_mask_value(flags_def, **flags)]
+
+    def evaluate(self, data: numpy.ndarray, flags_def: CFG_DICT | None) -> numpy.ndarray:
+        """
+        Evaluate this rule over raw integer flag data.
+
+        :param data: Raw integer flag data
+        :param flags_def: The flags definition of the flag band (only required for flags rules)
+        :return: A boolean numpy array, True where the data matches this rule.
+        """
+        if self.values:
+            result = numpy.isin(data, cast(list[int], self.values))
+        else:
+            scratch = numpy.empty(data.shape, dtype=data.dtype)
+            (bitmask, value), *terms = self.flag_terms(cast(CFG_DICT, flags_def))
+            numpy.bitwise_and(data, bitmask, out=scratch)
+            result = scratch == value
+            for bitmask, value in terms:
+                numpy.bitwise_and(data, bitmask, out=scratch)
+                if self.or_flags:
+                    result |= scratch == value
+                else:
+                    result &= scratch == value
+        if self.invert:
+            numpy.logical_not(result, out=result)
+        return result
+
     def create_mask(self, data: DataArray) -> DataArray | None:
         """
         Create a mask from raw flag band data.
@@ -920,6 +962,8 @@ class AbstractMaskRule(OWSConfigEntry):
         :param data: Raw flag data, assumed to be for this rule's flag band.
         :return: A boolean DataArray, True where the data matches this rule
         """
+        if can_compile_mask([self], data):
+            return DataArray(compiled_mask([self], data, self.luts), dims=data.dims, coords=data.coords)
         if self.values:
             mask: DataArray | None = None
             for v in cast(list[int], self.values):
@@ -943,6 +987,55 @@ class AbstractMaskRule(OWSConfigEntry):
         return mask
 
 
+def can_compile_mask(rules: Sequence[AbstractMaskRule], data: DataArray) -> bool:
+    """
+    Whether mask rules can be evaluated over flag data with compiled_mask.
+
+    :param rules: Mask rules for the band.
+    :param data: Raw flag data for the band.
+    :return: True if the data is integer and carries the flags definition required by any flags rules.
+    """
+    if data.dtype.kind not in "ui":
+        return False
+    return all(not rule.flags for rule in rules) or "flags_definition" in data.attrs
+
+
+def compiled_mask(rules: Sequence[AbstractMaskRule],
+                  data: DataArray,
+                  luts: MutableMapping[tuple[str, str], numpy.ndarray]) -> numpy.ndarray:
+    """
+    Evaluate mask rules for a flag band in a single pass over the raw data.
+
+    8 and 16 bit data is evaluated with a boolean lookup table over every possible value of the band,
+    built on first use.  Other integer data is evaluated with bitwise operations directly.
+
+    :param rules: Mask rules for the band, to be combined with logical AND.
+    :param data: Raw integer flag data for the band.
+    :param luts: Cache of lookup tables for these rules.
+    :return: A boolean numpy array, True where the data matches all the rules.
+    """
+    raw = data.values
+    flags_def = None
+    if any(rule.flags for rule in rules):
+        flags_def = cast(CFG_DICT, get_flags_def(data))
+
+    def evaluate(values: numpy.ndarray) -> numpy.ndarray:
+        result = rules[0].evaluate(values, flags_def)
+        for rule in rules[1:]:
+            result &= rule.evaluate(values, flags_def)
+        return result
+
+    if raw.dtype.itemsize > 2:
+        return evaluate(raw)
+    unsigned = numpy.dtype(f"u{raw.dtype.itemsize}")
+    key = (raw.dtype.str, repr(flags_def))
+    lut = luts.get(key)
+    if lut is None:
+        lut = evaluate(numpy.arange(2 ** (8 * raw.dtype.itemsize)).astype(unsigned).view(raw.dtype))
+        luts[key] = lut
+    return lut[raw.view(unsigned)]
+
+
 # Function wrapper for configurable functional elements
 class FunctionWrapper:
     """
@@ -6,18 +6,22 @@
 
 import logging
 from datetime import date, datetime, timedelta
-from typing import Any
+from typing import Any, Iterator, cast
 
 import numpy
 import numpy.ma
 import xarray
+from flask import stream_with_context
 from odc.geo import geom
 from odc.geo.geobox import GeoBox
 from pandas import Timestamp
 from rasterio.features import rasterize
-from rasterio.io import MemoryFile
 
-from datacube_ows.http_utils import FlaskResponse, json_response, png_response
+from datacube_ows.encoders import (TRANSPARENT, ImageEncoder,
+                                   default_png_encoder, encode_animation,
+                                   rgba_array)
+from datacube_ows.http_utils import (FlaskResponse, image_response,
+                                     json_response)
 from datacube_ows.loading import DataStacker
 from datacube_ows.ogc_exceptions import WMSException
 from datacube_ows.ogc_utils import xarray_image_as_png
@@ -81,12 +85,137 @@ class EmptyResponse(Exception):
     pass
 
 
+class RenderedMap:
+    """
+    A rendered, but not yet encoded, GetMap image.
+
+    Separating rendering from encoding allows a single rendered image to be encoded
+    in several parts (e.g. to slice a WMTS metatile into individual tiles).
+    """
+    def __init__(self, params: GetMapParameters, n_datasets: int, resource_limited: bool = False,
+                 img_data: xarray.Dataset | None = None, extent: geom.Geometry | None = None,
+                 animation: tuple[xarray.Dataset, xarray.DataArray | None] | None = None) -> None:
+        """
+        :param params: The GetMap request parameters
+        :param n_datasets: The number of datasets matching the request
+        :param resource_limited: True if the request exceeded the layer's resource limits
+        :param img_data: The styled image data, or None if there is no data to write.
+        :param extent: The extent polygon to write (for resource-limited requests), or None
+        :param animation: For animated multi-date requests, the raw data and mask to style frame by frame
+                while encoding, or None.
+        """
+        self.params = params
+        self.n_datasets = n_datasets
+        self.resource_limited = resource_limited
+        self.img_data = img_data
+        self.extent = extent
+        self.animation = animation
+
+    @property
+    def streamable(self) -> bool:
+        """
+        True if the image is an animation that should be streamed to the client as it is encoded.
+        """
+        return self.animation is not None and self.params.layer.image_encoders.png.stream_animation
+
+    @property
+    def encoder(self) -> ImageEncoder:
+        """
+        The encoder for the requested image format.
+        """
+        encoder = self.params.layer.image_encoders.for_format(self.params.format)
+        if encoder is None:
+            return self.params.layer.image_encoders.png
+        return encoder
+
+    def write(self, qprof: QueryProfiler, window: tuple[slice, slice] | None = None) -> bytes:
+        """
+        Encode the rendered image (or a window of it) in the requested format.
+
+        :param qprof: Query profiler
+        :param window: Optional (y, x) pixel slices to write a subset of the rendered image.
+        :return: The image bytes.
+        """
+        geobox = self.params.geobox
+        encoder = self.encoder
+        if self.animation is not None:
+            return b"".join(self.write_animation(qprof, window))
+        if window is not None:
+            geobox = geobox[window]
+        if self.img_data is not None:
+            img_data = self.img_data
+            if window is not None:
+                img_data = img_data.isel(dict(zip(self.params.geobox.dimensions, window)))
+            return _write_png(img_data, self.params.style, qprof, encoder)
+        qprof.start_event("write")
+        if self.extent is not None:
+            body = _write_polygon(geobox, self.extent,
+                                  self.params.layer.resource_limits.zoom_fill,
+                                  self.params.layer, encoder)
+        else:
+            body = _write_empty(geobox, encoder)
+        qprof.end_event("write")
+        return body
+
+    def write_animation(self, qprof: QueryProfiler, window: tuple[slice, slice] | None = None) -> Iterator[bytes]:
+        """
+        Style and encode an animated image one frame at a time.
+
+        :param qprof: Query profiler
+        :param window: Optional (y, x) pixel slices to write a subset of the rendered image.
+        :return: Iterator of parts of the APNG image bytes.
+        """
+        assert self.animation is not None  # For type checker
+        data, mask = self.animation
+        if window is not None:
+            isel = dict(zip(self.params.geobox.dimensions, window))
+            data = data.isel(isel)
+            if mask is not None:
+                mask = mask.isel(isel)
+        style = self.params.style
+        mdh = style.get_multi_date_handler(data)
+        qprof.start_event("write")
+        frames = (rgba_array(frame) for frame in style.transform_data_frames(data, mask))
+        yield from encode_animation(frames, style.count_dates(data),
+                                    mdh.frame_duration if mdh else 1000,
+                                    encoder=self.params.layer.image_encoders.png)
+        qprof.end_event("write")
+
+    def cache_headers(self) -> dict[str, str]:
+        return cast(dict[str, str],
+                    self.params.layer.resource_limits.wms_cache_rules.cache_headers(self.n_datasets))
+
+
 @log_call
 def get_map(args: dict[str, str]) -> FlaskResponse:
-    # pylint: disable=too-many-nested-blocks, too-many-branches, too-many-statements, too-many-locals
     # Parse GET parameters
     params = GetMapParameters(args)
     qprof = QueryProfiler(params.ows_stats)
+    rendered = render_map(params, qprof, args["requestid"])
+    if rendered.streamable and not params.ows_stats:
+        return image_response(stream_with_context(rendered.write_animation(qprof)), rendered.encoder.mime,
+                              extra_headers=rendered.cache_headers())
+    body = rendered.write(qprof)
+    if params.ows_stats:
+        return json_response(qprof.profile())
+    else:
+        return image_response(body, rendered.encoder.mime, extra_headers=rendered.cache_headers())
+
+
+@log_call
+def render_map(params: GetMapParameters, qprof: QueryProfiler, requestid: str = "",
+               render_resource_limited: bool = True) -> RenderedMap:
+    """
+    Search for and load the data for a GetMap request and apply the style.
+
+    :param params: The GetMap request parameters
+    :param qprof: Query profiler
+    :param requestid: Request id (for logging)
+    :param render_resource_limited: If False, return an empty resource-limited map as soon as the
+            request is found to exceed the layer's resource limits, without rendering anything.
+    :return: The rendered map image, ready for encoding.
+    """
+    # pylint: disable=too-many-nested-blocks, too-many-branches, too-many-statements, too-many-locals
     n_dates = len(params.times)
     if n_dates == 1:
         mdh = None
@@ -95,6 +224,11 @@ def get_map(args: dict[str, str]) -> FlaskResponse:
         if mdh is None:
             raise WMSException("Style %s does not support GetMap requests with %d dates" % (params.style.name, n_dates),
                                WMSException.INVALID_DIMENSION_VALUE, locator="Time parameter")
+        if mdh.animate and params.encoder.mime != "image/png":
+            raise WMSException(f"Animated multi-date requests are only supported in image/png format, "
+                               f"not {params.encoder.mime}",
+                               WMSException.INVALID_FORMAT,
+                               locator="Format parameter")
     qprof["n_dates"] = n_dates
     try:
         # Tiling.
@@ -106,11 +240,15 @@ def get_map(args: dict[str, str]) -> FlaskResponse:
         qprof["n_datasets"] = n_datasets
         qprof["zoom_level_base"] = params.resources.base_zoom_level
         qprof["zoom_level_adjusted"] = params.resources.load_adjusted_zoom_level
+        if params.layer.resource_limits.overview_factors:
+            qprof["overview_factor"] = params.resources.overview_factor(params.layer.resource_limits.overview_factors)
         try:
             params.layer.resource_limits.check_wms(n_datasets, params.zf, params.resources)
         except ResourceLimited as e:
             stacker.resource_limited = True
             qprof["resource_limited"] = str(e)
+            if not render_resource_limited:
+                return RenderedMap(params, n_datasets, resource_limited=True)
         if qprof.active:
             q_ds_dict = stacker.datasets()
             qprof["datasets"] = []
@@ -134,13 +272,7 @@ def get_map(args: dict[str, str]) -> FlaskResponse:
                 raise EmptyResponse()
             else:
                 qprof["write_action"] = "Polygon"
-                qprof.start_event("write")
-                body = _write_polygon(
-                    params.geobox,
-                    extent,
-                    params.layer.resource_limits.zoom_fill,
-                    params.layer)
-                qprof.end_event("write")
+                return RenderedMap(params, n_datasets, resource_limited=True, extent=extent)
         elif n_datasets == 0:
             qprof["write_action"] = "No datasets: Write Empty"
             raise EmptyResponse()
@@ -158,46 +290,16 @@ def get_map(args: dict[str, str]) -> FlaskResponse:
                     qprof["write_action"] = f"{n_dates} requested, only {len(dss.time)} found - returning empty image"
                     raise EmptyResponse()
             qprof.end_event("fetch-datasets")
-            _LOG.debug("load start %s %s", datetime.now().time(), args["requestid"])
+            _LOG.debug("load start %s %s", datetime.now().time(), requestid)
             qprof.start_event("load-data")
             data = stacker.data(datasets)
             qprof.end_event("load-data")
             if not data:
                 qprof["write_action"] = "No Data: Write Empty"
                 raise EmptyResponse()
-            _LOG.debug("load stop %s %s", datetime.now().time(), args["requestid"])
+            _LOG.debug("load stop %s %s", datetime.now().time(), requestid)
             qprof.start_event("build-masks")
-            td_masks = []
-            for npdt in data.time.values:
-                td = data.sel(time=npdt)
-                td_ext_mask_man: numpy.ndarray | None = None
-                td_ext_mask: xarray.DataArray | None = None
-                band = ""
-                for band in params.style.needed_bands:
-                    if band not in params.style.flag_bands:
-                        if params.layer.data_manual_merge:
-                            if td_ext_mask_man is None:
-                                td_ext_mask_man = ~numpy.isnan(td[band])
-                            else:
-                                td_ext_mask_man &= ~numpy.isnan(td[band])
-                        else:
-                            for f in params.layer.extent_mask_func:
-                                if td_ext_mask is None:
-                                    td_ext_mask = f(td, band)
-                                else:
-                                    td_ext_mask &= f(td, band)
-                if params.layer.data_manual_merge:
-                    td_ext_mask = xarray.DataArray(td_ext_mask_man)
-                if td_ext_mask is None:
-                    td_ext_mask = xarray.DataArray(
-                                        ~numpy.zeros(
-                                                    td[band].values.shape,
-                                                    dtype=numpy.bool_
-                                        ),
-                                        td[band].coords
-                    )
-                td_masks.append(td_ext_mask)
-            extent_mask = xarray.concat(td_masks, dim=data.time)
+            extent_mask = _extent_mask(data, params.layer, params.style)
             qprof.end_event("build-masks")
             qprof["write_action"] = "Write Data"
             if mdh and mdh.preserve_user_date_order:
@@ -209,74 +311,112 @@ def get_map(args: dict[str, str]) -> FlaskResponse:
                 data = data.sortby(sorter)
                 extent_mask = extent_mask.sortby(sorter)
 
-            body = _write_png(data, params.style, extent_mask, qprof)
+            if mdh and mdh.animate:
+                # Animated images are styled one frame at a time as they are encoded.
+                qprof.start_event("combine-masks")
+                mask = params.style.to_mask(data, extent_mask)
+                qprof.end_event("combine-masks")
+                return RenderedMap(params, n_datasets, resource_limited=stacker.resource_limited,
+                                   animation=(data, mask))
+            img_data = _apply_style(data, params.style, extent_mask, qprof,
+                                    paletted=params.encoder.paletted)
+            return RenderedMap(params, n_datasets, resource_limited=stacker.resource_limited, img_data=img_data)
     except EmptyResponse:
-        qprof.start_event("write")
-        body = _write_empty(params.geobox)
-        qprof.end_event("write")
+        pass
+    return RenderedMap(params, n_datasets, resource_limited=stacker.resource_limited)
 
-    if params.ows_stats:
-        return json_response(qprof.profile())
-    else:
-        return png_response(body, extra_headers=params.layer.resource_limits.wms_cache_rules.cache_headers(n_datasets))
+
+@log_call
+def _extent_mask(data: xarray.Dataset, layer: OWSNamedLayer, style: StyleDef) -> xarray.DataArray:
+    """
+    Build the extent mask for loaded data.
+
+    The mask is built in one pass over all time slices, relying on extent mask functions
+    broadcasting over the time dimension.
+
+    :param data: The loaded (time-stacked) data
+    :param layer: The layer the data was loaded for
+    :param style: The style the data will be rendered with
+    :return: A boolean DataArray mask with the same dimensions and coordinates as the data bands.
+    """
+    extent_mask: xarray.DataArray | None = None
+    for band in style.needed_bands:
+        if band in style.flag_bands:
+            continue
+        if layer.data_manual_merge:
+            # Manually merged data is NaN outside the extent of all datasets.
+            band_masks = [data[band].notnull()]
+        else:
+            band_masks = [f(data, band) for f in layer.extent_mask_func]
+        for band_mask in band_masks:
+            if not isinstance(band_mask, xarray.DataArray):
+                band_mask = xarray.DataArray(band_mask, coords=data[band].coords, dims=data[band].dims)
+            if extent_mask is None:
+                extent_mask = band_mask
+            else:
+                extent_mask = extent_mask & band_mask
+    if extent_mask is None:
+        extent_mask = xarray.ones_like(data[next(iter(data.data_vars))], dtype=numpy.bool_)
+    return extent_mask
 
 
 @log_call
-def _write_png(data: xarray.Dataset, style: StyleDef, extent_mask: xarray.DataArray,
-               qprof: QueryProfiler) -> bytes:
+def _apply_style(data: xarray.Dataset, style: StyleDef, extent_mask: xarray.DataArray,
+                 qprof: QueryProfiler, paletted: bool = False) -> xarray.Dataset:
     qprof.start_event("combine-masks")
     mask = style.to_mask(data, extent_mask)
     qprof.end_event("combine-masks")
     qprof.start_event("apply-style")
-    img_data = style.transform_data(data, mask)
+    img_data = None
+    if paletted:
+        # Styles with a palette render straight to palette indexes, skipping the RGBA image.
+        img_data = style.transform_data_indexed(data, mask)
+    if img_data is None:
+        img_data = style.transform_data(data, mask)
+    else:
+        qprof["paletted"] = True
     qprof.end_event("apply-style")
+    return img_data
+
+
+@log_call
+def _write_png(img_data: xarray.Dataset, style: StyleDef, qprof: QueryProfiler,
+               encoder: ImageEncoder | None = None) -> bytes:
     qprof.start_event("write")
     # If time dimension is present animate over it.
     # Verified using : https://docs.dea.ga.gov.au/notebooks/Frequently_used_code/Animated_timeseries.html
     mdh = style.get_multi_date_handler(img_data)
     if mdh:
-        image = xarray_image_as_png(img_data, loop_over='time', animate=True, frame_duration=mdh.frame_duration)
+        image = xarray_image_as_png(img_data, loop_over='time', animate=True, frame_duration=mdh.frame_duration,
+                                    encoder=encoder)
     else:
-        image = xarray_image_as_png(img_data)
+        image = xarray_image_as_png(img_data, encoder=encoder)
     qprof.end_event("write")
     return image
 
 
 @log_call
-def _write_empty(geobox: GeoBox) -> bytes:
-    with MemoryFile() as memfile:
-        with memfile.open(driver='PNG',
-                          width=geobox.width,
-                          height=geobox.height,
-                          count=1,
-                          transform=None,
-                          nodata=0,
-                          dtype='uint8') as thing:
-            pass
-        return memfile.read()
+def _write_empty(geobox: GeoBox, encoder: ImageEncoder = default_png_encoder) -> bytes:
+    return encoder.solid(geobox.width, geobox.height, TRANSPARENT)
 
 
 @log_call
-def _write_polygon(geobox: GeoBox, polygon: geom.Geometry, zoom_fill: list[int], layer: OWSNamedLayer) -> bytes:
+def _write_polygon(geobox: GeoBox, polygon: geom.Geometry, zoom_fill: list[int], layer: OWSNamedLayer,
+                   encoder: ImageEncoder | None = None) -> bytes:
+    if encoder is None:
+        encoder = layer.image_encoders.png
     geobox_ext = geobox.extent
+    # Uniformly filled or empty images are served pre-encoded, without rasterising the polygon.
     if geobox_ext.within(polygon):
-        data = numpy.full([geobox.height, geobox.width], fill_value=1, dtype="uint8")
-    else:
-        data = numpy.zeros([geobox.height, geobox.width], dtype="uint8")
-        data = rasterize(shapes=[polygon],
-                          fill=0,
-                          default_value=2,
-                          out=data,
-                          transform=geobox.affine
-                        )
-    with MemoryFile() as memfile:
-        with memfile.open(driver='PNG',
-                          width=geobox.width,
-                          height=geobox.height,
-                          count=4,
-                          transform=None,
-                          nodata=0,
-                          dtype='uint8') as thing:
-            for idx, fill in enumerate(zoom_fill, start=1):
-                thing.write_band(idx, data * fill)
-        return memfile.read()
+        return encoder.solid(geobox.width, geobox.height, cast(tuple[int, int, int, int], tuple(zoom_fill)))
+    if not geobox_ext.intersects(polygon):
+        return _write_empty(geobox, encoder)
+    data = numpy.zeros([geobox.height, geobox.width], dtype="uint8")
+    data = rasterize(shapes=[polygon],
+                      fill=0,
+                      default_value=2,
+                      out=data,
+                      transform=geobox.affine
+                    )
+    rgba = data[:, :, numpy.newaxis] * numpy.array(zoom_fill, dtype="uint8")
+    return encoder.encode(rgba)
@@ -0,0 +1,572 @@
+# This file is part of datacube-ows, part of the Open Data Cube project.
+# See https://opendatacube.org for more information.
+#
+# Copyright (c) 2017-2024 OWS Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Image encoding.
+
+Styled image data is packed into a single contiguous height x width x 4 (RGBA) uint8 buffer,
+which is handed directly to the image encoder.  Fully transparent and single-colour images
+(e.g. tiles outside the data extent, or entirely masked) are served from a cache of pre-encoded
+images rather than being compressed pixel by pixel.
+
+Styles with a palette of at most 256 colours (value maps and quantised colour ramps) can instead
+render a single uint8 "index" band into their palette, which is encoded directly as a paletted PNG.
+
+Animated (multi-date) images are encoded one frame at a time as APNG, so only one frame is held in
+memory at once and the image can be streamed as it is encoded.
+
+Encoders are registered by MIME type.  PNG is always available; lossy JPEG and WebP encoders are
+registered if supported by the installed Pillow.  Each layer configures its own encoder settings.
+"""
+
+import struct
+import zlib
+from io import BytesIO
+from typing import Any, Iterable, Iterator, cast
+
+import numpy
+import xarray
+from PIL import Image
+
+from datacube_ows.config_utils import CFG_DICT, ConfigException, OWSConfigEntry
+from datacube_ows.utils import LRUCache
+
+# zlib compression strategies supported for PNG encoding.
+PNG_STRATEGIES = {
+    "default": zlib.Z_DEFAULT_STRATEGY,
+    "filtered": zlib.Z_FILTERED,
+    "huffman_only": zlib.Z_HUFFMAN_ONLY,
+    "rle": zlib.Z_RLE,
+    "fixed": zlib.Z_FIXED,
+}
+
+BAND_INDEX = {
+    "red": 0,
+    "green": 1,
+    "blue": 2,
+    "alpha": 3,
+}
+
+# Mask for the alpha byte of an RGBA pixel viewed as a uint32 (independent of platform byte order)
+_ALPHA_MASK = numpy.frombuffer(bytes([0, 0, 0, 255]), dtype=numpy.uint32)[0]
+
+TRANSPARENT = (0, 0, 0, 0)
+
+
+def spatial_coords(img_data: xarray.Dataset) -> tuple[str, str]:
+    """
+    Identify the spatial coordinates of an image.
+
+    :param img_data: An xarray Dataset
+    :return: The names of the x and y coordinates
+    """
+    xcoord = None
+    ycoord = None
+    for cc in ("x", "longitude", "Longitude", "long", "lon"):
+        if cc in img_data.coords:
+            xcoord = cc
+            break
+    for cc in ("y", "latitude", "Latitude", "lat"):
+        if cc in img_data.coords:
+            ycoord = cc
+            break
+    if not xcoord or not ycoord:
+        raise Exception("Could not identify spatial coordinates")
+    return xcoord, ycoord
+
+
+def rgba_array(img_data: xarray.Dataset) -> numpy.ndarray:
+    """
+    Pack an xarray RGB(A) image into a contiguous height x width x 4 uint8 array.
+
+    :param img_data: An xarray Dataset with no time dimension, containing 3 or 4 uint8 variables:
+                red, green, blue, and optionally alpha.  Alpha defaults to fully opaque.
+    :return: A C-contiguous numpy array of shape (height, width, 4)
+    """
+    xcoord, ycoord = spatial_coords(img_data)
+    buffer = numpy.empty((len(img_data.coords[ycoord]), len(img_data.coords[xcoord]), 4), dtype=numpy.uint8)
+    if "alpha" not in img_data.data_vars:
+        buffer[:, :, 3] = 255
+    for band in img_data.data_vars:
+        buffer[:, :, BAND_INDEX[cast(str, band)]] = img_data[band].transpose(ycoord, xcoord).values
+    return buffer
+
+
+def indexed_image(index: xarray.DataArray, palette: numpy.ndarray) -> xarray.Dataset:
+    """
+    Wrap paletted image data as an image Dataset.
+
+    :param index: uint8 palette indexes.  Entry zero of the palette must be fully transparent.
+    :param palette: (n, 4) uint8 RGBA palette, with n at most 256.
+    :return: An xarray Dataset with a single "index" variable, and the palette in the "palette" attribute.
+    """
+    return xarray.Dataset({"index": index}, attrs={"palette": palette})
+
+
+def is_indexed(img_data: xarray.Dataset) -> bool:
+    """
+    :param img_data: An image Dataset
+    :return: True if img_data is a paletted image, as returned by indexed_image()
+    """
+    return "index" in img_data.data_vars
+
+
+def index_array(img_data: xarray.Dataset) -> numpy.ndarray:
+    """
+    Extract the palette indexes of a paletted image as a contiguous height x width uint8 array.
+
+    :param img_data: A paletted image Dataset with no time dimension, as returned by indexed_image()
+    :return: A C-contiguous numpy array of shape (height, width)
+    """
+    xcoord, ycoord = spatial_coords(img_data)
+    return numpy.ascontiguousarray(img_data["index"].transpose(ycoord, xcoord).values, dtype=numpy.uint8)
+
+
+def solid_colour(rgba: numpy.ndarray) -> tuple[int, int, int, int] | None:
+    """
+    Detect images that are a single colour.
+
+    :param rgba: A C-contiguous (height, width, 4) uint8 array
+    :return: The (red, green, blue, alpha) colour of the image if every pixel is the same colour
+            or fully transparent, otherwise None.  Fully transparent images are always returned as
+            (0, 0, 0, 0), regardless of the colour values of the transparent pixels.
+    """
+    pixels = rgba.view(numpy.uint32).reshape(-1)
+    if not pixels.size:
+        return TRANSPARENT
+    if (pixels == pixels[0]).all():
+        if not pixels[0] & _ALPHA_MASK:
+            return TRANSPARENT
+        return cast(tuple[int, int, int, int], tuple(int(v) for v in rgba[0, 0]))
+    if not (pixels & _ALPHA_MASK).any():
+        return TRANSPARENT
+    return None
+
+
+# Pre-encoded single-colour images, by (width, height, colour).  Built lazily, bounded by total size in bytes.
+_solid_pngs = LRUCache(4 * 1024 * 1024, sizeof=len)
+# Pre-encoded single-colour images in other formats, by (encoder cache key, width, height, colour).
+_solid_images = LRUCache(4 * 1024 * 1024, sizeof=len)
+
+
+def solid_png(width: int, height: int, colour: tuple[int, int, int, int]) -> bytes:
+    """
+    A pre-encoded single-colour PNG image.
+
+    Used for empty (fully transparent) images and for images uniformly filled
+    with a layer's zoomed-out fill colour.
+
+    :param width: Image width in pixels
+    :param height: Image height in pixels
+    :param colour: (red, green, blue, alpha) colour of the image
+    :return: PNG image bytes
+    """
+    key = (width, height, colour)
+    png = _solid_pngs.get(key)
+    if png is None:
+        img_io = BytesIO()
+        Image.new("RGBA", (width, height), colour).save(img_io, "PNG")
+        png = img_io.getvalue()
+        _solid_pngs.put(key, png)
+    return png
+
+
+class ImageEncoder(OWSConfigEntry):
+    """
+    Base class for image encoders.
+
+    Subclasses set the MIME type, the name of their configuration sub-section and
+    the Pillow format name, and provide the Pillow save options.
+    """
+    mime = ""
+    cfg_key = ""
+    pil_format = ""
+    # True if the encoder can encode paletted images directly.
+    paletted = False
+
+    @property
+    def save_options(self) -> dict[str, Any]:
+        """
+        Options to pass to Pillow's encoder.
+        """
+        return {}
+
+    @property
+    def cache_key(self) -> tuple:
+        """
+        Identifies the encoder format and settings, for caching pre-encoded images.
+        """
+        return (self.mime, tuple(sorted(self.save_options.items())))
+
+    def prepare(self, img: Image.Image) -> Image.Image:
+        """
+        Convert an RGBA Pillow image to a mode supported by the encoder.
+        """
+        return img
+
+    def save(self, img: Image.Image) -> bytes:
+        """
+        Encode a Pillow image.
+
+        :param img: An RGBA Pillow image
+        :return: Image bytes
+        """
+        img_io = BytesIO()
+        self.prepare(img).save(img_io, self.pil_format, **self.save_options)
+        return img_io.getvalue()
+
+    def solid(self, width: int, height: int, colour: tuple[int, int, int, int]) -> bytes:
+        """
+        A pre-encoded single-colour image.
+
+        :param width: Image width in pixels
+        :param height: Image height in pixels
+        :param colour: (red, green, blue, alpha) colour of the image
+        :return: Image bytes
+        """
+        key = (self.cache_key, width, height, colour)
+        img = _solid_images.get(key)
+        if img is None:
+            img = self.save(Image.new("RGBA", (width, height), colour))
+            _solid_images.put(key, img)
+        return img
+
+    def encode(self, rgba: numpy.ndarray) -> bytes:
+        """
+        Encode an RGBA image.
+
+        :param rgba: A C-contiguous (height, width, 4) uint8 array, as returned by rgba_array()
+        :return: Image bytes
+        """
+        colour = solid_colour(rgba)
+        if colour is not None:
+            return self.solid(rgba.shape[1], rgba.shape[0], colour)
+        return self.save(Image.fromarray(rgba, "RGBA"))
+
+    def encode_indexed(self, index: numpy.ndarray, palette: numpy.ndarray) -> bytes:
+        """
+        Encode a paletted image.
+
+        Encoders without native palette support encode the equivalent RGBA image.
+
+        :param index: A C-contiguous (height, width) uint8 array of palette indexes, as returned by index_array()
+        :param palette: (n, 4) uint8 RGBA palette, with n at most 256.
+        :return: Image bytes
+        """
+        return self.encode(numpy.ascontiguousarray(palette[index]))
+
+
+class PngEncoder(ImageEncoder):
+    """
+    PNG encoder, with configurable zlib compression.
+    """
+    mime = "image/png"
+    cfg_key = "png"
+    pil_format = "PNG"
+
+    def __init__(self, cfg: CFG_DICT) -> None:
+        super().__init__(cfg)
+        compress_level = cfg.get("compress_level", 6)
+        if not isinstance(compress_level, int) or not 0 <= compress_level <= 9:
+            raise ConfigException(f"PNG compress_level must be an integer from 0 to 9: {compress_level}")
+        self.compress_level = compress_level
+        strategy = cast(str, cfg.get("strategy", "default"))
+        if strategy not in PNG_STRATEGIES:
+            raise ConfigException(f"Unknown PNG compression strategy: {strategy} "
+                                  f"(supported strategies: {', '.join(PNG_STRATEGIES)})")
+        self.strategy = strategy
+        self.paletted = bool(cfg.get("paletted", True))
+        self.stream_animation = bool(cfg.get("stream_animation", False))
+
+    @property
+    def save_options(self) -> dict[str, Any]:
+        return {
+            "compress_level": self.compress_level,
+            "compress_type": PNG_STRATEGIES[self.strategy],
+        }
+
+    def solid(self, width: int, height: int, colour: tuple[int, int, int, int]) -> bytes:
+        # Single colour PNGs are tiny regardless of compression settings, so are shared by all PNG encoders.
+        return solid_png(width, height, colour)
+
+    def encode_indexed(self, index: numpy.ndarray, palette: numpy.ndarray) -> bytes:
+        """
+        Encode a paletted image as an 8 bit paletted PNG, with palette alpha in a tRNS chunk.
+
+        :param index: A C-contiguous (height, width) uint8 array of palette indexes, as returned by index_array()
+        :param palette: (n, 4) uint8 RGBA palette, with n at most 256.
+        :return: PNG image bytes
+        """
+        flat = index.reshape(-1)
+        if not flat.size:
+            return solid_png(index.shape[1], index.shape[0], TRANSPARENT)
+        if (flat == flat[0]).all():
+            colour = cast(tuple[int, int, int, int], tuple(int(v) for v in palette[flat[0]]))
+            if not colour[3]:
+                colour = TRANSPARENT
+            return solid_png(index.shape[1], index.shape[0], colour)
+        img = Image.fromarray(index, "P")
+        img.putpalette(palette[:, :3].tobytes(), "RGB")
+        img_io = BytesIO()
+        img.save(img_io, "PNG", transparency=palette[:, 3].tobytes(), **self.save_options)
+        return img_io.getvalue()
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """
+    Pack a PNG chunk.
+
+    :param chunk_type: The four byte chunk type
+    :param data: The chunk data
+    :return: The chunk, with length and CRC
+    """
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+
+def png_chunks(png: bytes) -> Iterator[tuple[bytes, bytes]]:
+    """
+    Split a PNG image into chunks.
+
+    :param png: PNG image bytes
+    :return: Iterator of (chunk type, chunk data) tuples
+    """
+    if not png.startswith(PNG_SIGNATURE):
+        raise ValueError("Not a PNG image")
+    pos = len(PNG_SIGNATURE)
+    while pos < len(png):
+        length, = struct.unpack(">I", png[pos:pos + 4])
+        yield png[pos + 4:pos + 8], png[pos + 8:pos + 8 + length]
+        pos += length + 12
+
+
+class AnimatedPngWriter:
+    """
+    Incremental APNG encoder.
+
+    Each frame is compressed as a stand-alone PNG by a PngEncoder as it is added, and its image
+    data is repackaged as an APNG frame.  The first frame doubles as the default image for
+    viewers that do not support animation.  Frames are written with the "source" blend operation
+    (each frame replaces the previous one entirely.)
+    """
+    def __init__(self, encoder: PngEncoder, n_frames: int, frame_duration: int = 1000, loop: int = 0) -> None:
+        """
+        :param encoder: The PNG encoder to compress frames with
+        :param n_frames: The total number of frames that will be added.
+        :param frame_duration: Frame duration in milliseconds
+        :param loop: The number of times to play the animation (zero for indefinitely)
+        """
+        if n_frames < 1:
+            raise ValueError("An animation must have at least one frame")
+        self.encoder = encoder
+        self.n_frames = n_frames
+        self.frame_duration = frame_duration
+        self.loop = loop
+        self._frames = 0
+        self._seq = 0
+        self._ihdr: bytes | None = None
+
+    def _fctl(self, width: int, height: int) -> bytes:
+        data = struct.pack(">IIIIIHHBB", self._seq, width, height, 0, 0,
+                           self.frame_duration, 1000,
+                           0,  # dispose_op: none
+                           0)  # blend_op: source
+        self._seq += 1
+        return png_chunk(b"fcTL", data)
+
+    def add_frame(self, rgba: numpy.ndarray) -> bytes:
+        """
+        Encode a frame.
+
+        :param rgba: A C-contiguous (height, width, 4) uint8 array, as returned by rgba_array()
+        :return: The encoded bytes for the frame (preceded by the image header for the first frame.)
+        """
+        if self._frames >= self.n_frames:
+            raise ValueError(f"Animation already has {self.n_frames} frames")
+        out = []
+        height, width = rgba.shape[:2]
+        ihdr: bytes | None = None
+        idat = []
+        for chunk_type, data in png_chunks(self.encoder.encode(rgba)):
+            if chunk_type == b"IHDR":
+                ihdr = data
+            elif chunk_type == b"IDAT":
+                idat.append(data)
+        if self._ihdr is None:
+            self._ihdr = ihdr
+            out.append(PNG_SIGNATURE)
+            out.append(png_chunk(b"IHDR", cast(bytes, ihdr)))
+            out.append(png_chunk(b"acTL", struct.pack(">II", self.n_frames, self.loop)))
+        elif ihdr != self._ihdr:
+            raise ValueError("Animation frames must all be the same size and type")
+        out.append(self._fctl(width, height))
+        for data in idat:
+            if self._frames == 0:
+                out.append(png_chunk(b"IDAT", data))
+            else:
+                out.append(png_chunk(b"fdAT", struct.pack(">I", self._seq) + data))
+                self._seq += 1
+        self._frames += 1
+        return b"".join(out)
+
+    def finish(self) -> bytes:
+        """
+        :return: The end of the image.
+        """
+        if self._frames != self.n_frames:
+            raise ValueError(f"Animation has {self._frames} frames, expected {self.n_frames}")
+        return png_chunk(b"IEND", b"")
+
+
+def encode_animation(frames: Iterable[numpy.ndarray], n_frames: int, frame_duration: int = 1000,
+                     encoder: PngEncoder | None = None) -> Iterator[bytes]:
+    """
+    Encode an animated PNG incrementally.
+
+    :param frames: Iterable of C-contiguous (height, width, 4) uint8 RGBA arrays.  Frames are
+                   consumed (and may be generated) one at a time.
+    :param n_frames: The number of frames
+    :param frame_duration: Frame duration in milliseconds
+    :param encoder: The PNG encoder to compress frames with (defaults to default PNG settings)
+    :return: Iterator of parts of the APNG image bytes.
+    """
+    writer = AnimatedPngWriter(encoder if encoder is not None else default_png_encoder, n_frames, frame_duration)
+    for rgba in frames:
+        yield writer.add_frame(rgba)
+    yield writer.finish()
+
+
+def _quality(cfg: CFG_DICT, fmt: str, default: int, maximum: int) -> int:
+    quality = cfg.get("quality", default)
+    if not isinstance(quality, int) or isinstance(quality, bool) or not 1 <= quality <= maximum:
+        raise ConfigException(f"{fmt} quality must be an integer from 1 to {maximum}: {quality}")
+    return quality
+
+
+class JpegEncoder(ImageEncoder):
+    """
+    Lossy JPEG encoder.
+
+    JPEG has no alpha channel, so transparent and partially transparent pixels are
+    blended onto a configurable background colour.
+    """
+    mime = "image/jpeg"
+    cfg_key = "jpeg"
+    pil_format = "JPEG"
+
+    def __init__(self, cfg: CFG_DICT) -> None:
+        super().__init__(cfg)
+        self.quality = _quality(cfg, "JPEG", 85, 95)
+        background = cfg.get("background", [255, 255, 255])
+        if (not isinstance(background, list | tuple) or len(background) != 3
+                or not all(isinstance(v, int) and 0 <= v <= 255 for v in background)):
+            raise ConfigException(f"JPEG background must be a list of 3 integers from 0 to 255: {background}")
+        self.background = cast(tuple[int, int, int], tuple(background))
+
+    @property
+    def save_options(self) -> dict[str, Any]:
+        return {
+            "quality": self.quality,
+            # Tile images are small - the Huffman table optimisation pass is cheap.
+            "optimize": True,
+        }
+
+    @property
+    def cache_key(self) -> tuple:
+        return super().cache_key + (self.background,)
+
+    def prepare(self, img: Image.Image) -> Image.Image:
+        background = Image.new("RGB", img.size, self.background)
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+
+
+class WebpEncoder(ImageEncoder):
+    """
+    WebP encoder, lossy (with a lossless alpha channel) by default, or lossless.
+    """
+    mime = "image/webp"
+    cfg_key = "webp"
+    pil_format = "WEBP"
+
+    def __init__(self, cfg: CFG_DICT) -> None:
+        super().__init__(cfg)
+        self.quality = _quality(cfg, "WebP", 80, 100)
+        self.lossless = bool(cfg.get("lossless", False))
+        method = cfg.get("method", 4)
+        if not isinstance(method, int) or isinstance(method, bool) or not 0 <= method <= 6:
+            raise ConfigException(f"WebP method must be an integer from 0 to 6: {method}")
+        self.method = method
+
+    @property
+    def save_options(self) -> dict[str, Any]:
+        return {
+            "quality": self.quality,
+            "lossless": self.lossless,
+            "method": self.method,
+        }
+
+
+# Registered image encoder classes, by MIME type.
+ENCODERS: dict[str, type[ImageEncoder]] = {}
+
+
+def register_encoder(encoder_cls: type[ImageEncoder]) -> type[ImageEncoder]:
+    """
+    Register an image encoder class, making its format available for GetMap and GetTile requests.
+
+    Encoders for formats not supported by the installed Pillow are not registered.
+
+    :param encoder_cls: An ImageEncoder subclass
+    :return: The encoder class (so this function may be used as a class decorator.)
+    """
+    Image.init()
+    if encoder_cls.pil_format in Image.SAVE:
+        ENCODERS[encoder_cls.mime] = encoder_cls
+    return encoder_cls
+
+
+for _cls in (PngEncoder, JpegEncoder, WebpEncoder):
+    register_encoder(_cls)
+
+
+class ImageEncoders(OWSConfigEntry):
+    """
+    Per-layer image encoder configuration (the layer "image_encoding" section).
+    """
+    def __init__(self, cfg: CFG_DICT) -> None:
+        super().__init__(cfg)
+        # Lossy formats are opt-in.
+        formats = cast(list[str], cfg.get("formats", ["image/png"]))
+        if "image/png" not in formats:
+            raise ConfigException(f"image/png must be included in image_encoding formats: {formats}")
+        self.encoders: dict[str, ImageEncoder] = {}
+        for fmt in formats:
+            if fmt not in ENCODERS:
+                raise ConfigException(f"Unsupported image format: {fmt} "
+                                      f"(supported formats: {', '.join(ENCODERS)})")
+            encoder_cls = ENCODERS[fmt]
+            self.encoders[fmt] = encoder_cls(cast(CFG_DICT, cfg.get(encoder_cls.cfg_key, {})))
+        self.png = cast(PngEncoder, self.encoders["image/png"])
+
+    @property
+    def formats(self) -> list[str]:
+        """
+        MIME types of the image formats supported by the layer.
+        """
+        return list(self.encoders)
+
+    def for_format(self, fmt: str) -> ImageEncoder | None:
+        """
+        :param fmt: A MIME type
+        :return: The layer's encoder for the format, or None if the format is not supported by the layer.
+        """
+        return self.encoders.get(fmt)
+
+
+default_png_encoder = PngEncoder({})
@@ -5,7 +5,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import json
-from typing import Optional
+from typing import Iterator, Optional
 from urllib.parse import urlparse
 
 from flask import Request, render_template, request
@@ -16,7 +16,7 @@ TYPE_CHECKING = False
 if TYPE_CHECKING:
     from datacube_ows.ows_configuration import OWSConfig
 
-FlaskResponse = tuple[str | bytes, int, dict[str, str]]
+FlaskResponse = tuple[str | bytes | Iterator[bytes], int, dict[str, str]]
 
 
 
@@ -124,13 +124,18 @@ def html_json_response(result: CFG_DICT, cfg: Optional["OWSConfig"] = None) -> F
 
 
 def png_response(body: bytes, cfg: Optional["OWSConfig"] = None, extra_headers: dict[str, str] | None = None) -> FlaskResponse:
+    return image_response(body, "image/png", cfg=cfg, extra_headers=extra_headers)
+
+
+def image_response(body: bytes | Iterator[bytes], mime: str,
+                   cfg: Optional["OWSConfig"] = None, extra_headers: dict[str, str] | None = None) -> FlaskResponse:
     from datacube_ows.ows_configuration import get_config
     if not cfg:
         cfg = get_config()
     assert cfg is not None  # For type checker
     if extra_headers is None:
         extra_headers = {}
-    headers = {"Content-Type": "image/png"}
+    headers = {"Content-Type": mime}
     headers.update(extra_headers)
     headers = cfg.response_headers(headers)
     return body, 200, cfg.response_headers(headers)
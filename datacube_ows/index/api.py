@@ -51,7 +51,8 @@ class CoordRange(NamedTuple):
 
 
 class LayerExtent:
-    def __init__(self, lat: CoordRange, lon: CoordRange, times: list[DateOrDateTime], bboxes: CFG_DICT):
+    def __init__(self, lat: CoordRange, lon: CoordRange, times: list[DateOrDateTime], bboxes: CFG_DICT,
+                 last_updated: datetime | None = None):
         self.lat = lat
         self.lon = lon
         self.times = times
@@ -59,6 +60,7 @@ class LayerExtent:
         self.end_time = times[-1]
         self.time_set = set(times)
         self.bboxes = bboxes
+        self.last_updated = last_updated
 
 
 class OWSAbstractIndex(ABC):
@@ -129,25 +131,18 @@ class OWSAbstractIndex(ABC):
                crs: CRS | None = None
                ) -> Geometry | None:
         geom = self._prep_geom(layer, geom)
-        if crs is None:
-            crs = CRS("epsg:4326")
-        ext: Geometry | None = None
-        # Accumulate extent in native CRS if possible.
-        for ds in self.ds_search(layer, times, geom, products):
-            if ds.extent:
-                if ds.extent.crs != CRS(layer.native_CRS):
-                    # Reproject to layer "native" CRS if needed.
-                    ds_extent: Geometry = ds.extent.to_crs(layer.native_CRS)
-                else:
-                    ds_extent = ds.extent
-                if ext is None:
-                    ext = ds_extent
-                else:
-                    ext = ext.union(ds_extent)
-        if ext is not None and crs != CRS(layer.native_CRS):
-            # Reproject to requested CRS if necessary
-            return ext.to_crs(crs)
-        return ext
+        return datasets_extent(layer, self.ds_search(layer, times, geom, products), crs)
+
+    def ds_get(self, layer: "OWSNamedLayer", ids: Iterable[UUID]) -> Iterable[Dataset]:
+        """
+        Fetch datasets by id (e.g. as previously returned by dsid_search).
+
+        Uses the global dataset cache, if one is configured.
+        """
+        dataset_cache = layer.global_cfg.dataset_cache
+        if dataset_cache is not None:
+            return dataset_cache.bulk_get(layer.dc.index, ids)
+        return layer.dc.index.datasets.bulk_get(ids)
 
     def _prep_geom(self, layer: "OWSNamedLayer", any_geom: Geometry | None) -> Geometry | None:
         # Prepare a Geometry for geospatial search
@@ -177,6 +172,36 @@ class OWSAbstractIndex(ABC):
             # Return polygons and multipolygons as is.
             return any_geom
 
+def datasets_extent(layer: "OWSNamedLayer", datasets: Iterable[Dataset], crs: CRS | None = None) -> Geometry | None:
+    """
+    Calculate the union of the extents of a collection of datasets.
+
+    :param layer: The layer the datasets belong to
+    :param datasets: The datasets
+    :param crs: The CRS to return the extent in (defaults to EPSG:4326)
+    :return: The extent polygon, or None if none of the datasets have an extent.
+    """
+    if crs is None:
+        crs = CRS("epsg:4326")
+    ext: Geometry | None = None
+    # Accumulate extent in native CRS if possible.
+    for ds in datasets:
+        if ds.extent:
+            if ds.extent.crs != CRS(layer.native_CRS):
+                # Reproject to layer "native" CRS if needed.
+                ds_extent: Geometry = ds.extent.to_crs(layer.native_CRS)
+            else:
+                ds_extent = ds.extent
+            if ext is None:
+                ext = ds_extent
+            else:
+                ext = ext.union(ds_extent)
+    if ext is not None and crs != CRS(layer.native_CRS):
+        # Reproject to requested CRS if necessary
+        return ext.to_crs(crs)
+    return ext
+
+
 class OWSAbstractIndexDriver(ABC):
     @classmethod
     @abstractmethod
@@ -0,0 +1,76 @@
+# This file is part of datacube-ows, part of the Open Data Cube project.
+# See https://opendatacube.org for more information.
+#
+# Copyright (c) 2017-2024 OWS Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Process-wide cache of hydrated ODC Dataset objects, keyed by dataset id.
+
+Fetching datasets by id from the ODC index requires fetching and parsing the full metadata
+document of every dataset.  The dataset cache allows repeated requests to only fetch datasets
+they have not seen before.  It is shared by all OWS index drivers.
+"""
+
+from typing import Iterable, cast
+from uuid import UUID
+
+from datacube.index.abstract import AbstractIndex
+from datacube.model import Dataset
+
+from datacube_ows.config_utils import CFG_DICT, ConfigException, OWSConfigEntry
+from datacube_ows.utils import LRUCache
+
+
+class DatasetCache(OWSConfigEntry):
+    """
+    Size-bounded, TTL-limited LRU cache of Dataset objects by id.
+    """
+    def __init__(self, cfg: CFG_DICT) -> None:
+        super().__init__(cfg)
+        try:
+            self.max_datasets = int(cast(int | str, cfg.get("max_datasets", 50000)))
+            self.ttl = float(cast(float | str, cfg.get("ttl", 3600)))
+        except ValueError:
+            raise ConfigException(f"max_datasets and ttl in dataset_cache section must be numbers: {cfg}")
+        if self.max_datasets <= 0 or self.ttl <= 0:
+            raise ConfigException(f"max_datasets and ttl in dataset_cache section must be positive: {cfg}")
+        self._datasets = LRUCache(self.max_datasets, ttl=self.ttl)
+
+    def bulk_get(self, index: AbstractIndex, ids: Iterable[UUID]) -> list[Dataset]:
+        """
+        Fetch datasets by id, only fetching datasets from the index that are not already cached.
+
+        :param index: The ODC index to fetch uncached datasets from
+        :param ids: Dataset ids
+        :return: The datasets, in the same order as ids.
+        """
+        ids = list(ids)
+        found: dict[UUID, Dataset] = {}
+        missing: list[UUID] = []
+        for dsid in ids:
+            ds = self._datasets.get(dsid)
+            if ds is None:
+                missing.append(dsid)
+            else:
+                found[dsid] = ds
+        if missing:
+            for ds in index.datasets.bulk_get(missing):
+                self._datasets.put(ds.id, ds)
+                found[ds.id] = ds
+        return [found[dsid] for dsid in ids if dsid in found]
+
+    def clear(self) -> None:
+        self._datasets.clear()
+
+
+def parse_dataset_cache(cfg: CFG_DICT | None) -> DatasetCache | None:
+    """
+    Create a dataset cache from a dataset_cache configuration section.
+
+    :param cfg: The dataset_cache section of the global configuration (or None if not configured.)
+    :return: A dataset cache, or None if dataset caching is not configured.
+    """
+    if cfg is None:
+        return None
+    return DatasetCache(cfg)
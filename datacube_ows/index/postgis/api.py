@@ -107,6 +107,8 @@ class OWSPostgisIndex(OWSAbstractIndex):
                   geom: Geometry | None = None,
                   products: Iterable[Product] | None = None
                   ) -> Iterable[Dataset]:
+        if layer.global_cfg.dataset_cache is not None:
+            return self.ds_get(layer, self.dsid_search(layer, times=times, geom=geom, products=products))
         return layer.dc.index.datasets.search(**self._query(layer, times, geom, products))
 
     def dsid_search(self,
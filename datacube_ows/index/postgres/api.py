@@ -62,6 +62,8 @@ class OWSPostgresIndex(OWSAbstractIndex):
                   geom: Geometry | None = None,
                   products: Iterable[Product] | None = None
                   ) -> Iterable[Dataset]:
+        if layer.global_cfg.dataset_cache is not None:
+            return self.ds_get(layer, self.dsid_search(layer, times=times, geom=geom, products=products))
         return cast(Iterable[Dataset], mv_search(layer.dc.index, MVSelectOpts.DATASETS,
                                                  times=times, geom=geom, products=products))
 
@@ -238,6 +238,7 @@ def get_ranges(layer: OWSNamedLayer) -> LayerExtent | None:
             lat=CoordRange(min=float(result.lat_min), max=float(result.lat_max)),
             lon=CoordRange(min=float(result.lon_min), max=float(result.lon_max)),
             times=times,
-            bboxes=result.bboxes
+            bboxes=result.bboxes,
+            last_updated=result.last_updated
         )
     return None
@@ -0,0 +1,171 @@
+# This file is part of datacube-ows, part of the Open Data Cube project.
+# See https://opendatacube.org for more information.
+#
+# Copyright (c) 2017-2024 OWS Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Process-wide cache of dataset search results.
+
+Search geometries are quantised to a quad-tree grid of longitude/latitude cells, with the
+cell size chosen to be at least as large as the search area.  The index is searched once per
+grid cell and the cached results for a cell are re-used by all searches (e.g. neighbouring
+map tiles at the same zoom level) that touch it, with the datasets filtered to the actual search
+geometry in memory.
+
+Searches larger than the maximum cell size, and cells containing too many datasets to cache,
+go straight to the index.
+"""
+
+import math
+from itertools import islice
+from typing import Hashable, Iterable, cast
+
+from datacube.model import Dataset, Product
+from odc.geo.geom import Geometry, box
+
+from datacube_ows.config_utils import CFG_DICT, ConfigException, OWSConfigEntry
+from datacube_ows.index.api import TimeSearchTerm
+from datacube_ows.utils import LRUCache
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from datacube_ows.ows_configuration import OWSNamedLayer
+
+# A cached search result: datasets with their extents in EPSG:4326
+CellEntry = list[tuple[Dataset, Geometry | None]]
+
+# Default maximum grid cell size, in degrees.
+DEFAULT_MAX_CELL_SIZE = 360.0 / 2 ** 5
+
+# Cached in place of the datasets for cells with too many datasets to cache, so that
+# subsequent searches touching the cell go straight to the index.
+OVERSIZED_CELL: CellEntry = []
+
+
+class DatasetSearchCache(OWSConfigEntry):
+    """
+    Size-bounded, TTL-limited LRU cache of dataset search results by grid cell.
+    """
+    def __init__(self, cfg: CFG_DICT) -> None:
+        super().__init__(cfg)
+        try:
+            self.max_datasets = int(cast(int | str, cfg.get("max_datasets", 10000)))
+            self.ttl = float(cast(float | str, cfg.get("ttl", 300)))
+            self.max_cell_size = float(cast(float | str, cfg.get("max_cell_size", DEFAULT_MAX_CELL_SIZE)))
+        except ValueError:
+            raise ConfigException(
+                f"max_datasets, ttl and max_cell_size in dataset_search_cache section must be numbers: {cfg}")
+        if self.max_datasets <= 0 or self.ttl <= 0 or self.max_cell_size <= 0:
+            raise ConfigException(
+                f"max_datasets, ttl and max_cell_size in dataset_search_cache section must be positive: {cfg}")
+        # Entry size is number of datasets, (with a minimum of one, so empty cells are not free.)
+        self._cells = LRUCache(self.max_datasets, sizeof=lambda entry: max(len(entry), 1), ttl=self.ttl)
+
+    @staticmethod
+    def grid_cells(geom: Geometry,
+                   max_cell_size: float = DEFAULT_MAX_CELL_SIZE) -> list[tuple[int, int, int]] | None:
+        """
+        Find the grid cells covering a search geometry.
+
+        :param geom: The search geometry
+        :param max_cell_size: The largest permitted cell size, in degrees.
+        :return: A list of (level, column, row) cell indexes, or None if the geometry cannot be
+                 sensibly mapped to the grid (e.g. crosses the anti-meridian, or would require
+                 cells larger than max_cell_size.)
+        """
+        bbox = geom.to_crs("EPSG:4326").boundingbox
+        if bbox.left < -180.0 or bbox.right > 180.0 or bbox.bottom < -90.0 or bbox.top > 90.0:
+            return None
+        span = max(bbox.right - bbox.left, bbox.top - bbox.bottom)
+        if span <= 0.0 or span >= 180.0:
+            return None
+        # Smallest cell size that is at least as large as the search area, so a search
+        # covers at most 2x2 cells.
+        level = math.floor(math.log2(360.0 / span))
+        size = 360.0 / 2 ** level
+        if size > max_cell_size:
+            return None
+        cols = range(math.floor((bbox.left + 180.0) / size), math.floor((bbox.right + 180.0) / size) + 1)
+        rows = range(math.floor((bbox.bottom + 90.0) / size), math.floor((bbox.top + 90.0) / size) + 1)
+        return [(level, col, row) for col in cols for row in rows]
+
+    @staticmethod
+    def cell_geom(cell: tuple[int, int, int]) -> Geometry:
+        level, col, row = cell
+        size = 360.0 / 2 ** level
+        return box(col * size - 180.0, row * size - 90.0,
+                   (col + 1) * size - 180.0, min((row + 1) * size - 90.0, 90.0),
+                   "EPSG:4326")
+
+    def search(self,
+               layer: "OWSNamedLayer",
+               times: Iterable[TimeSearchTerm] | None,
+               geom: Geometry,
+               products: Iterable[Product]) -> list[Dataset]:
+        """
+        Search for datasets, using cached results where available.
+
+        :param layer: The layer being searched
+        :param times: Search times
+        :param geom: Search geometry
+        :param products: Products to search
+        :return: List of matching datasets
+        """
+        products = list(products)
+        cells = self.grid_cells(geom, self.max_cell_size)
+        if cells is None:
+            return list(layer.ows_index().ds_search(layer, times=times, geom=geom, products=products))
+        # Cached results are stale once the layer's ranges have been updated.
+        key_base: tuple[Hashable, ...] = (
+            layer.name,
+            tuple(p.name for p in products),
+            None if times is None else tuple(times),
+            layer.ranges_last_updated,
+        )
+        search_geom = geom.to_crs("EPSG:4326")
+        results: dict = {}
+        for cell in cells:
+            key = key_base + (cell,)
+            entry: CellEntry | None = self._cells.get(key)
+            if entry is None:
+                entry = self._search_cell(layer, times, cell, products)
+                self._cells.put(key, entry)
+            if entry is OVERSIZED_CELL:
+                return list(layer.ows_index().ds_search(layer, times=times, geom=geom, products=products))
+            for ds, ext in entry:
+                if ds.id not in results and (ext is None or ext.intersects(search_geom)):
+                    results[ds.id] = ds
+        return list(results.values())
+
+    def _search_cell(self,
+                     layer: "OWSNamedLayer",
+                     times: Iterable[TimeSearchTerm] | None,
+                     cell: tuple[int, int, int],
+                     products: list[Product]) -> CellEntry:
+        # Stop reading as soon as the cell has more datasets than could be cached.
+        datasets = list(islice(
+            layer.ows_index().ds_search(layer, times=times, geom=self.cell_geom(cell), products=products),
+            self.max_datasets + 1
+        ))
+        if len(datasets) > self.max_datasets:
+            return OVERSIZED_CELL
+        return [
+            (ds, ds.extent.to_crs("EPSG:4326") if ds.extent is not None else None)
+            for ds in datasets
+        ]
+
+    def clear(self) -> None:
+        self._cells.clear()
+
+
+def parse_dataset_search_cache(cfg: CFG_DICT | None) -> DatasetSearchCache | None:
+    """
+    Create a dataset search cache from a dataset_search_cache configuration section.
+
+    :param cfg: The dataset_search_cache section of the global configuration (or None if not configured.)
+    :return: A dataset search cache, or None if search caching is not configured.
+    """
+    if cfg is None:
+        return None
+    return DatasetSearchCache(cfg)
@@ -6,10 +6,19 @@
 
 import datetime
 import logging
-from collections import OrderedDict
-from typing import Iterable, Mapping, cast
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import nullcontext
+from itertools import islice
+from threading import Lock
+from typing import (Callable, Container, ContextManager, Hashable, Iterable,
+                    Iterator, Mapping, cast)
 from uuid import UUID
 
+import dask
+import dask.array
 import datacube
 import numpy
 import xarray
@@ -17,15 +26,68 @@ from odc.geo.geobox import GeoBox
 from odc.geo.geom import Geometry, CRS
 from odc.geo.warp import Resampling
 
+from datacube_ows.byte_range_cache import ByteRangeCache
+from datacube_ows.index.api import datasets_extent
 from datacube_ows.ogc_exceptions import WMSException
 from datacube_ows.ows_configuration import OWSNamedLayer
-from datacube_ows.startup_utils import CredentialManager
+from datacube_ows.startup_utils import (CredentialManager,
+                                        activate_gdal_environment)
 from datacube_ows.styles import StyleDef
 from datacube_ows.utils import log_call
-from datacube_ows.wms_utils import solar_correct_data
+from datacube_ows.wms_utils import solar_correction_factor
 
 _LOG: logging.Logger = logging.getLogger(__name__)
 
+_load_pool: ThreadPoolExecutor | None = None
+_layer_load_pools: dict[str, ThreadPoolExecutor] = {}
+_load_pool_lock = Lock()
+
+
+def load_concurrency(cfg, layer: OWSNamedLayer | None = None) -> int:
+    """
+    The number of concurrent reads allowed when loading data.
+
+    :param cfg: The OWS configuration object
+    :param layer: The layer being loaded (optional)
+    :return: The loading concurrency of the layer if it sets one, otherwise the max_load_threads
+            global config entry.  Values of 1 or less mean loading is not concurrent.
+    """
+    if layer is not None and isinstance(layer.loading.concurrency, int):
+        return layer.loading.concurrency
+    max_threads = getattr(cfg, "max_load_threads", 1)
+    if not isinstance(max_threads, int):
+        return 1
+    return max_threads
+
+
+def load_executor(cfg, layer: OWSNamedLayer | None = None) -> ThreadPoolExecutor | None:
+    """
+    The thread pool for concurrent data loading.
+
+    Pools are created on first use and shared by all requests in the worker process, so the
+    total number of concurrent reads per worker is bounded by the max_load_threads global config entry,
+    or by the loading concurrency of layers that set one (in which case the layer has its own pool).
+
+    :param cfg: The OWS configuration object
+    :param layer: The layer being loaded (optional)
+    :return: The thread pool, or None if loading is not configured to be concurrent.
+    """
+    global _load_pool  # pylint: disable=global-statement
+    concurrency = load_concurrency(cfg, layer)
+    if concurrency <= 1:
+        return None
+    if layer is not None and isinstance(layer.loading.concurrency, int):
+        with _load_pool_lock:
+            if layer.name not in _layer_load_pools:
+                _layer_load_pools[layer.name] = ThreadPoolExecutor(max_workers=concurrency,
+                                                                   thread_name_prefix=f"ows_load_{layer.name}")
+            return _layer_load_pools[layer.name]
+    if _load_pool is None:
+        with _load_pool_lock:
+            if _load_pool is None:
+                _load_pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ows_load")
+    return _load_pool
+
 
 class ProductBandQuery:
     def __init__(self,
@@ -121,6 +183,9 @@ class ProductBandQuery:
 PerPBQReturnType = xarray.DataArray | Iterable[UUID]
 
 class DataStacker:
+    # Monotonic clock deadline for concurrent reads for the current request, if the layer has a loading timeout.
+    _load_deadline: float | None = None
+
     @log_call
     def __init__(self,
                  layer: OWSNamedLayer,
@@ -155,10 +220,40 @@ class DataStacker:
             ]
         self.group_by = self._layer.dataset_groupby()
         self.resource_limited = False
+        # Request-scoped memo of index search results over the geobox extent,
+        # keyed by search products and time-awareness.  Counts, ids, datasets and
+        # (where available) extents are all taken from one search per query.
+        self._ds_cache: dict[tuple[tuple[int | None, ...], bool], list[datacube.model.Dataset]] = {}
 
     def needed_bands(self) -> list[str]:
         return self._needed_bands
 
+    def _query_times(self, query: ProductBandQuery) -> list[datetime.datetime] | None:
+        if query.ignore_time:
+            return None
+        return self._times
+
+    def _search_key(self, query: ProductBandQuery) -> tuple[tuple[int | None, ...], bool]:
+        return (tuple(p.id for p in query.products), query.ignore_time)
+
+    def _query_datasets(self, query: ProductBandQuery) -> list[datacube.model.Dataset]:
+        # Search the index once per query, and re-use the result for the rest of the request.
+        key = self._search_key(query)
+        if key not in self._ds_cache:
+            if self.cfg.dataset_search_cache is not None:
+                self._ds_cache[key] = self.cfg.dataset_search_cache.search(
+                    self._layer,
+                    times=self._query_times(query),
+                    geom=self._geobox.extent,
+                    products=query.products)
+            else:
+                self._ds_cache[key] = list(self._layer.ows_index().ds_search(
+                    self._layer,
+                    times=self._query_times(query),
+                    geom=self._geobox.extent,
+                    products=query.products))
+        return self._ds_cache[key]
+
     def n_datasets(self) -> int:
         if self.style:
             # we have a style - lets go with that.
@@ -166,13 +261,8 @@ class DataStacker:
         else:
             # Just take needed bands.
             queries = [ProductBandQuery.simple_layer_query(self._layer, self.needed_bands())]
-        geom = self._geobox.extent
         for query in queries:
-            if query.ignore_time:
-                qry_times = None
-            else:
-                qry_times = self._times
-            return self._layer.ows_index().count(self._layer, times=qry_times, geom=geom, products=query.products)
+            return len(self._query_datasets(query))
         return 0
 
     def extent(self, crs: CRS | None = None) -> Geometry | None:
@@ -182,11 +272,20 @@ class DataStacker:
                 self.resource_limited
         )
         geom = self._geobox.extent
-        if query.ignore_time:
-            times = None
-        else:
-            times = self._times
-        return self._layer.ows_index().extent(self._layer, times=times, geom=geom, products=query.products, crs=crs)
+        key = self._search_key(query)
+        if key not in self._ds_cache:
+            return self._layer.ows_index().extent(self._layer, times=self._query_times(query), geom=geom,
+                                                  products=query.products, crs=crs)
+        # Datasets already fetched for this request - no need to go back to the database.
+        ext = datasets_extent(self._layer, self._ds_cache[key], crs=geom.crs)
+        if ext is None:
+            return None
+        ext = ext.intersection(geom)
+        if ext.is_empty:
+            return None
+        if crs is not None and crs != ext.crs:
+            ext = ext.to_crs(crs)
+        return ext
 
     def dsids(self) -> dict[ProductBandQuery, Iterable[UUID]]:
         if self.style:
@@ -197,13 +296,7 @@ class DataStacker:
             queries = [ProductBandQuery.simple_layer_query(self._layer, self.needed_bands())]
         results: list[tuple[ProductBandQuery, Iterable[UUID]]] = []
         for query in queries:
-            if query.ignore_time:
-                qry_times = None
-            else:
-                qry_times = self._times
-            result = self._layer.ows_index().dsid_search(self._layer, times=qry_times, geom=self._geobox.extent,
-                                                         products=query.products)
-            results.append((query, result))
+            results.append((query, [ds.id for ds in self._query_datasets(query)]))
         return OrderedDict(results)
 
     def datasets_all_time(self, point: Geometry | None = None) -> xarray.DataArray:
@@ -238,21 +331,16 @@ class DataStacker:
             # Just take needed bands.
             queries = [ProductBandQuery.simple_layer_query(self._layer, self.needed_bands())]
 
-        if point:
-            geom = point
-        else:
-            geom = self._geobox.extent
         results: list[tuple[ProductBandQuery, xarray.DataArray]] = []
         for query in queries:
-            if query.ignore_time:
-                qry_times = None
+            if point:
+                result: Iterable[datacube.model.Dataset] = self._layer.ows_index().ds_search(
+                                   layer=self._layer,
+                                   times=self._query_times(query),
+                                   geom=point,
+                                   products=query.products)
             else:
-                qry_times = self._times
-            result = self._layer.ows_index().ds_search(
-                               layer=self._layer,
-                               times=qry_times,
-                               geom=geom,
-                               products=query.products)
+                result = self._query_datasets(query)
             grpd_result = datacube.Datacube.group_datasets(
                 cast(Iterable[datacube.model.Dataset], result),
                 self.group_by
@@ -285,57 +373,202 @@ class DataStacker:
              skip_corrections=False) -> xarray.Dataset | None:
         # pylint: disable=too-many-locals, consider-using-enumerate
         # datasets is an XArray DataArray of datasets grouped by time.
-        data: xarray.Dataset | None = None
-        for pbq, datasets in datasets_by_query.items():
-            if data is not None and len(data.time) == 0:
-                # No data, so no need for masking data.
-                continue
-            measurements = pbq.products[0].lookup_measurements(pbq.bands)
-            fuse_func = pbq.fuse_func
-            if pbq.manual_merge:
-                qry_result = self.manual_data_stack(datasets, measurements, pbq.bands, skip_corrections, fuse_func=fuse_func)
-            else:
-                qry_result = self.read_data(datasets, measurements, self._geobox, resampling=self._resampling, fuse_func=fuse_func)
-            if qry_result is None:
-                continue
-            if data is None:
-                data = qry_result
-                continue
-            if len(data.time) == 0:
-                # No data, so no need for masking data.
-                continue
-            if pbq.ignore_time:
-                # regularise time dimension:
-                if len(qry_result.time) > 1:
-                    raise WMSException("Cannot ignore time on PQ (flag) bands from a time-aware product")
-                elif len(qry_result.time) == len(data.time):
-                    qry_result["time"] = data.time
-                else:
-                    if len(qry_result.time) == 0:
-                        data = self.create_nodata_filled_flag_bands(data, pbq)
-                        continue
+        executor = load_executor(self.cfg, self._layer)
+        loading = self._layer.loading
+        if executor is not None and loading.timeout:
+            self._load_deadline = time.monotonic() + loading.timeout
+        else:
+            self._load_deadline = None
+        pending: dict[ProductBandQuery, list[list[Future]]] = {}
+        if executor is not None:
+            # Start all (non-manual-merge) reads concurrently, one per query per time slice
+            # (and per band, if the layer splits reads by band).
+            # Results are still merged below in query order, so the result is deterministic.
+            for pbq, datasets in datasets_by_query.items():
+                if not pbq.manual_merge:
+                    measurements = pbq.products[0].lookup_measurements(pbq.bands)
+                    if len(datasets.time) > 1:
+                        slices = [datasets.isel(time=[i]) for i in range(len(datasets.time))]
                     else:
-                        data_new_bands = {}
-                        for band in pbq.bands:
-                            band_data = qry_result[band]
-                            timeless_band_data = band_data.sel(time=qry_result.time.values[0])
-                            band_time_slices = []
-                            for dt in data.time.values:
-                                band_time_slices.append(timeless_band_data)
-                            timed_band_data = xarray.concat(band_time_slices, data.time)
-                            data_new_bands[band] = timed_band_data
-                    data = data.assign(data_new_bands)
+                        slices = [datasets]
+                    if loading.split_bands:
+                        band_groups = [{band: msmt} for band, msmt in measurements.items()]
+                    else:
+                        band_groups = [measurements]
+                    pending[pbq] = [
+                        [
+                            executor.submit(self.read_data, slc, group, self._geobox,
+                                            resampling=self._resampling, fuse_func=pbq.fuse_func)
+                            for group in band_groups
+                        ]
+                        for slc in slices
+                    ]
+        data: xarray.Dataset | None = None
+        try:
+            for pbq, datasets in datasets_by_query.items():
+                if data is not None and len(data.time) == 0:
+                    # No data, so no need for masking data.
                     continue
-            elif len(qry_result.time) == 0:
-                # Time-aware mask product has no data, but main product does.
-                data = self.create_nodata_filled_flag_bands(data, pbq)
-                continue
-            assert data is not None
-            qry_result.coords["time"] = data.coords["time"]
-            data = cast(xarray.Dataset, xarray.combine_by_coords([data, qry_result], join="exact"))
-
+                data = self._merge_query_data(data, pbq, datasets, pending.get(pbq), skip_corrections)
+        finally:
+            # Don't wait for reads that are no longer required.
+            for futures in pending.values():
+                for slice_futures in futures:
+                    for future in slice_futures:
+                        future.cancel()
         return data
 
+    @log_call
+    def chunked_data(self,
+                     datasets_by_query: dict[ProductBandQuery, xarray.DataArray],
+                     bands: list[str],
+                     chunk_size: int,
+                     skip_corrections=False) -> xarray.Dataset:
+        """
+        Lazily load data in spatial chunks, as a dask-backed Dataset.
+
+        Nothing is read until chunks are computed.  Each chunk is searched for and loaded independently,
+        exactly as data() would load the whole geobox, so chunks can be loaded, processed and
+        written one at a time with memory use bounded by the chunk size.
+
+        Only supports single time-slice requests.
+
+        :param datasets_by_query: The datasets for the whole geobox, as returned by datasets()
+        :param bands: The (canonical) names of the bands to return.
+        :param chunk_size: Height and width of each chunk in pixels.
+        :param skip_corrections: As for data()
+        :return: A dask-backed Dataset with dimensions time (of length 1), and the y and x dimensions of the geobox.
+        """
+        main_datasets = next(iter(datasets_by_query.values()))
+        if len(main_datasets.time) != 1:
+            raise WMSException("Chunked loading only supports requests for a single time slice")
+        band_idx = self._layer.band_idx
+        dtypes = {}
+        for band in bands:
+            dtype = numpy.dtype(band_idx.dtype_val(band))
+            if self._layer.float32_processing and dtype == numpy.float64:
+                dtype = numpy.dtype("float32")
+            dtypes[band] = dtype
+
+        def load_chunk(window: tuple[slice, slice]) -> dict[str, numpy.ndarray]:
+            geobox = self._geobox[window]
+            stacker = DataStacker(self._layer, geobox, self.raw_times, self._resampling, bands=bands)
+            stacker.resource_limited = self.resource_limited
+            shape = (1,) + geobox.shape
+            data = None
+            # One index search per chunk - empty chunks are filled without loading.
+            chunk_datasets = stacker.datasets()
+            if len(next(iter(chunk_datasets.values())).time) > 0:
+                data = stacker.data(chunk_datasets, skip_corrections=skip_corrections)
+            chunk = {}
+            for band, dtype in dtypes.items():
+                nodata = band_idx.nodata_val(band)
+                if data is None or len(data.time) == 0 or band not in data.data_vars:
+                    chunk[band] = numpy.full(shape, nodata, dtype=dtype)
+                    continue
+                values = data[band].values[:1]
+                if numpy.issubdtype(values.dtype, numpy.floating) and not numpy.issubdtype(dtype, numpy.floating):
+                    # Empty pixels from manual merging are NaN
+                    values = numpy.where(numpy.isnan(values), nodata, values)
+                chunk[band] = values.astype(dtype, copy=False)
+            return chunk
+
+        height, width = self._geobox.shape
+        blocks: dict[str, list[list[dask.array.Array]]] = {band: [] for band in bands}
+        for row in range(0, height, chunk_size):
+            for band in bands:
+                blocks[band].append([])
+            for col in range(0, width, chunk_size):
+                window = (slice(row, min(row + chunk_size, height)), slice(col, min(col + chunk_size, width)))
+                chunk = dask.delayed(load_chunk)(window)
+                shape = (1, window[0].stop - row, window[1].stop - col)
+                for band in bands:
+                    blocks[band][-1].append(dask.array.from_delayed(chunk[band], shape=shape, dtype=dtypes[band]))
+
+        coords = {"time": main_datasets.time.values}
+        coords.update({name: coord.values for name, coord in self._geobox.coordinates.items()})
+        dims = ("time",) + tuple(self._geobox.dimensions)
+        return xarray.Dataset(
+            {
+                band: xarray.DataArray(dask.array.block(blocks[band]), dims=dims, coords=coords,
+                                       attrs={"nodata": band_idx.nodata_val(band)})
+                for band in bands
+            },
+            coords=coords,
+        )
+
+    def _load_result(self, future: Future) -> xarray.Dataset:
+        # Wait for a concurrent read, up to the load deadline for the request.
+        if self._load_deadline is None:
+            timeout = None
+        else:
+            timeout = max(self._load_deadline - time.monotonic(), 0.0)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            _LOG.warning("Timed out loading data for layer %s", self._layer.name)
+            raise WMSException(f"Timed out loading data for layer {self._layer.name}", http_response=504)
+
+    def _merge_query_data(self,
+                          data: xarray.Dataset | None,
+                          pbq: ProductBandQuery,
+                          datasets: xarray.DataArray,
+                          futures: list[list[Future]] | None,
+                          skip_corrections: bool) -> xarray.Dataset | None:
+        # pylint: disable=too-many-return-statements
+        measurements = pbq.products[0].lookup_measurements(pbq.bands)
+        fuse_func = pbq.fuse_func
+        if futures is not None:
+            slices = []
+            for slice_futures in futures:
+                parts = [self._load_result(future) for future in slice_futures]
+                if len(parts) == 1:
+                    slices.append(parts[0])
+                else:
+                    slices.append(xarray.merge(parts, join="exact", compat="override", combine_attrs="override"))
+            if len(slices) == 1:
+                qry_result: xarray.Dataset | None = slices[0]
+            else:
+                qry_result = xarray.concat(slices, dim="time")
+        elif pbq.manual_merge:
+            qry_result = self.manual_data_stack(datasets, measurements, pbq.bands, skip_corrections, fuse_func=fuse_func)
+        else:
+            qry_result = self.read_data(datasets, measurements, self._geobox, resampling=self._resampling, fuse_func=fuse_func)
+        if qry_result is None:
+            return data
+        if self._layer.float32_processing:
+            qry_result = self._float32_data(qry_result)
+        if data is None:
+            return qry_result
+        if len(data.time) == 0:
+            # No data, so no need for masking data.
+            return data
+        if pbq.ignore_time:
+            # regularise time dimension:
+            if len(qry_result.time) > 1:
+                raise WMSException("Cannot ignore time on PQ (flag) bands from a time-aware product")
+            elif len(qry_result.time) == len(data.time):
+                qry_result["time"] = data.time
+            else:
+                if len(qry_result.time) == 0:
+                    return self.create_nodata_filled_flag_bands(data, pbq)
+                else:
+                    data_new_bands = {}
+                    for band in pbq.bands:
+                        band_data = qry_result[band]
+                        timeless_band_data = band_data.sel(time=qry_result.time.values[0])
+                        band_time_slices = []
+                        for dt in data.time.values:
+                            band_time_slices.append(timeless_band_data)
+                        timed_band_data = xarray.concat(band_time_slices, data.time)
+                        data_new_bands[band] = timed_band_data
+                return data.assign(data_new_bands)
+        elif len(qry_result.time) == 0:
+            # Time-aware mask product has no data, but main product does.
+            return self.create_nodata_filled_flag_bands(data, pbq)
+        qry_result.coords["time"] = data.coords["time"]
+        return cast(xarray.Dataset, xarray.combine_by_coords([data, qry_result], join="exact"))
+
     @log_call
     def manual_data_stack(self,
                           datasets: xarray.DataArray,
@@ -346,46 +579,155 @@ class DataStacker:
         # pylint: disable=too-many-locals, too-many-branches
         # manual merge
         if self.style:
-            flag_bands: Iterable[str] = set(filter(lambda b: b in self.style.flag_bands, bands))  # type: ignore[arg-type]
+            flag_bands: Container[Hashable] = set(filter(lambda b: b in self.style.flag_bands, bands))  # type: ignore[arg-type]
             non_flag_bands: Iterable[str] = set(filter(lambda b: b not in self.style.flag_bands, bands))  #type: ignore[arg-type]
         else:
             non_flag_bands = bands
             flag_bands = set()
-        time_slices = []
-        for dt in datasets.time.values:
-            tds = datasets.sel(time=dt)
-            merged = None
-            for ds in cast(Iterable[datacube.model.Dataset], tds.values.item()):
-                d = self.read_data_for_single_dataset(ds, measurements, self._geobox, fuse_func=fuse_func)
-                extent_mask = None
-                for band in non_flag_bands:
-                    for f in self._layer.extent_mask_func:
-                        if extent_mask is None:
-                            extent_mask = f(d, band)
+        slice_datasets = [
+            list(cast(Iterable[datacube.model.Dataset], datasets.sel(time=dt).values.item()))
+            for dt in datasets.time.values
+        ]
+        all_datasets = [ds for dss in slice_datasets for ds in dss]
+
+        def load(ds: datacube.model.Dataset) -> xarray.Dataset:
+            return self.read_data_for_single_dataset(ds, measurements, self._geobox, fuse_func=fuse_func)
+
+        executor = load_executor(self.cfg, self._layer)
+        # Reads submitted to the thread pool but not yet merged.
+        pending: deque[Future] = deque()
+        if executor is None:
+            loaded: Iterator[xarray.Dataset] = map(load, all_datasets)
+        else:
+            loaded = self._read_ahead(executor, load, all_datasets, pending,
+                                      2 * load_concurrency(self.cfg, self._layer))
+        masked = bool(non_flag_bands) and bool(self._layer.extent_mask_func)
+        solar = bool(self._layer.solar_correction) and not skip_corrections
+        try:
+            time_slices = []
+            for dss in slice_datasets:
+                # Merge each dataset into one pre-allocated buffer per band, only filling pixels
+                # that are still empty, so memory use does not grow with the number of datasets.
+                merged: xarray.Dataset | None = None
+                # Pixels covered by the extent of any dataset merged so far.
+                filled: numpy.ndarray | None = None
+                for ds in dss:
+                    d = next(loaded)
+                    if merged is None:
+                        merged = self._merge_buffers(d, flag_bands, masked=masked, solar=solar,
+                                                     float32=self._layer.float32_processing)
+                    extent_mask = self._extent_mask(d, non_flag_bands) if masked else None
+                    csz = solar_correction_factor(ds) if solar else None
+                    for band, dest in merged.data_vars.items():
+                        buf = dest.values
+                        src = d[band].values
+                        if numpy.issubdtype(buf.dtype, numpy.floating):
+                            fill = numpy.isnan(buf)
+                        elif filled is None:
+                            fill = numpy.ones(buf.shape, dtype=bool)
                         else:
-                            extent_mask &= f(d, band)
-                if extent_mask is not None:
-                    d = d.where(extent_mask)
-                if self._layer.solar_correction and not skip_corrections:
-                    for band in non_flag_bands:
-                        d[band] = solar_correct_data(d[band], ds)
+                            fill = ~numpy.broadcast_to(filled, buf.shape)
+                        if extent_mask is not None:
+                            fill &= numpy.broadcast_to(extent_mask, buf.shape)
+                        if csz is not None and band not in flag_bands:
+                            numpy.divide(src, csz, out=buf, where=fill, casting="unsafe")
+                        else:
+                            numpy.copyto(buf, src, where=fill, casting="unsafe")
+                    if extent_mask is None:
+                        filled = numpy.ones(d[next(iter(d.data_vars))].shape, dtype=bool)
+                    elif filled is None:
+                        filled = extent_mask
+                    else:
+                        filled |= extent_mask
                 if merged is None:
-                    merged = d
-                else:
-                    merged = merged.combine_first(d)
-            if merged is None:
-                continue
-            for band in flag_bands:
-                # REVISIT: not sure about type converting one band like this?
-                merged[band] = merged[band].astype('uint16', copy=True)
-                merged[band].attrs = d[band].attrs
-            time_slices.append(merged)
+                    continue
+                time_slices.append(merged)
+        finally:
+            # Don't wait for reads that are no longer required.
+            for future in pending:
+                future.cancel()
 
         if not time_slices:
             return None
         result = xarray.concat(time_slices, datasets.time)
         return result
 
+    def _read_ahead(self,
+                    executor: ThreadPoolExecutor,
+                    load: Callable[[datacube.model.Dataset], xarray.Dataset],
+                    datasets: Iterable[datacube.model.Dataset],
+                    pending: deque[Future],
+                    window: int) -> Iterator[xarray.Dataset]:
+        # Yield loaded datasets in submission order (so merge order is unchanged), keeping at most
+        # window reads in flight.  Each future is dropped before its result is yielded, so loaded
+        # datasets don't pile up waiting to be merged.
+        remaining = iter(datasets)
+        pending.extend(executor.submit(load, ds) for ds in islice(remaining, window))
+        while pending:
+            future = pending.popleft()
+            pending.extend(executor.submit(load, ds) for ds in islice(remaining, 1))
+            result = self._load_result(future)
+            del future
+            yield result
+
+    @staticmethod
+    def _float32_data(data: xarray.Dataset) -> xarray.Dataset:
+        # Convert double precision bands to float32
+        converted = {
+            band: band_data.astype(numpy.float32)
+            for band, band_data in data.data_vars.items()
+            if band_data.dtype == numpy.float64
+        }
+        if not converted:
+            return data
+        return data.assign(converted)
+
+    def _extent_mask(self, data: xarray.Dataset, bands: Iterable[str]) -> numpy.ndarray | None:
+        extent_mask: numpy.ndarray | None = None
+        for band in bands:
+            for f in self._layer.extent_mask_func:
+                mask = numpy.asarray(f(data, band), dtype=bool)
+                if extent_mask is None:
+                    extent_mask = mask.copy()
+                else:
+                    extent_mask &= mask
+        return extent_mask
+
+    @staticmethod
+    def _merge_buffers(data: xarray.Dataset, flag_bands: Container[Hashable], masked: bool, solar: bool,
+                       float32: bool = False) -> xarray.Dataset:
+        # Empty merge buffers, shaped like the loaded data.
+        # Empty pixels are NaN, except for flag bands, which are uint16 and zero.
+        # Integer bands are promoted as xarray's where() (for extent masking) and true division
+        # (for solar correction) would promote them: masking promotes small integer types to
+        # float32 and all others to float64; solar correction of unmasked data always gives float64.
+        # If float32 is set, all floating point buffers are float32.
+        buffers = {}
+        for band, src in data.data_vars.items():
+            if band in flag_bands:
+                buffers[band] = numpy.zeros(src.shape, dtype="uint16")
+            else:
+                dtype = src.dtype
+                if (masked or solar) and not numpy.issubdtype(dtype, numpy.floating):
+                    if float32 or (masked and dtype.itemsize <= 2):
+                        dtype = numpy.dtype("float32")
+                    else:
+                        dtype = numpy.dtype("float64")
+                elif float32 and dtype == numpy.float64:
+                    dtype = numpy.dtype("float32")
+                if numpy.issubdtype(dtype, numpy.floating):
+                    buffers[band] = numpy.full(src.shape, numpy.nan, dtype=dtype)
+                else:
+                    buffers[band] = numpy.zeros(src.shape, dtype=dtype)
+        return data.copy(data=buffers)
+
+    def _patch_url(self) -> ContextManager[Callable[[str], str] | None]:
+        # Route remote reads through the byte range cache, if configured.
+        cache = self._layer.global_cfg.byte_range_cache
+        if isinstance(cache, ByteRangeCache):
+            return cache.patch_url(self._layer.patch_url)
+        return nullcontext(self._layer.patch_url)
+
     # Read data for given datasets and measurements per the output_geobox
     # TODO: Make skip_broken passed in via config
     @log_call
@@ -397,15 +739,17 @@ class DataStacker:
                   resampling: Resampling = "nearest",
                   fuse_func: datacube.api.core.FuserFunction | None = None) -> xarray.Dataset:
         CredentialManager.check_cred()
+        activate_gdal_environment()
         try:
-            return datacube.Datacube.load_data(
-                    datasets,
-                    geobox,
-                    measurements=measurements,
-                    fuse_func=fuse_func,
-                    skip_broken_datasets=skip_broken,
-                    patch_url=self._layer.patch_url,
-                    resampling=resampling)
+            with self._patch_url() as patch_url:
+                return datacube.Datacube.load_data(
+                        datasets,
+                        geobox,
+                        measurements=measurements,
+                        fuse_func=fuse_func,
+                        skip_broken_datasets=skip_broken,
+                        patch_url=patch_url,
+                        resampling=resampling)
         except Exception as e:
             _LOG.error("Error (%s) in load_data: %s", e.__class__.__name__, str(e))
             raise
@@ -422,15 +766,17 @@ class DataStacker:
         datasets = [dataset]
         dc_datasets = datacube.Datacube.group_datasets(datasets, self._layer.time_resolution.dataset_groupby())
         CredentialManager.check_cred()
+        activate_gdal_environment()
         try:
-            return datacube.Datacube.load_data(
-                dc_datasets,
-                geobox,
-                measurements=measurements,
-                fuse_func=fuse_func,
-                skip_broken_datasets=skip_broken,
-                patch_url=self._layer.patch_url,
-                resampling=resampling)
+            with self._patch_url() as patch_url:
+                return datacube.Datacube.load_data(
+                    dc_datasets,
+                    geobox,
+                    measurements=measurements,
+                    fuse_func=fuse_func,
+                    skip_broken_datasets=skip_broken,
+                    patch_url=patch_url,
+                    resampling=resampling)
         except Exception as e:
             _LOG.error("Error (%s) in load_data: %s", e.__class__.__name__, str(e))
             raise
@@ -6,7 +6,6 @@
 
 import datetime
 import logging
-from io import BytesIO
 from typing import Any, cast
 
 import numpy
@@ -15,7 +14,6 @@ from affine import Affine
 from deprecat import deprecat
 from odc.geo.geobox import GeoBox
 from odc.geo.geom import CRS
-from PIL import Image
 
 TYPE_CHECKING = False
 if TYPE_CHECKING:
@@ -163,96 +161,58 @@ def create_geobox(
     return GeoBox((height, width), affine, crs)
 
 
-def xarray_image_as_png(img_data, loop_over=None, animate=False, frame_duration=1000):
+def xarray_image_as_png(img_data, loop_over=None, animate=False, frame_duration=1000, encoder=None):
     """
     Render an Xarray image as a PNG.
 
     :param img_data: An xarray dataset, containing 3 or 4 uint8 variables: red, greed, blue, and optionally alpha.
+                (Or a paletted image, as returned by datacube_ows.encoders.indexed_image.)
     :param loop_over: Optional name of a dimension on img_data.  If set, xarray_image_as_png is called in a loop
                 over all coordinate values for the named dimension.
     :param animate: Optional generate animated PNG
+    :param encoder: Optional PngEncoder, with the compression settings to use.
     :return: A list of bytes representing a PNG image file. (Or a list of lists of bytes, if loop_over was set.)
     """
+    from datacube_ows.encoders import (default_png_encoder, encode_animation,
+                                       index_array, is_indexed)
+    if encoder is None:
+        encoder = default_png_encoder
     if loop_over and not animate:
         return [
-            xarray_image_as_png(img_data.sel(**{loop_over: coord}))
+            xarray_image_as_png(img_data.sel(**{loop_over: coord}), encoder=encoder)
             for coord in img_data.coords[loop_over].values
         ]
-    xcoord = None
-    ycoord = None
-    for cc in ("x", "longitude", "Longitude", "long", "lon"):
-        if cc in img_data.coords:
-            xcoord = cc
-            break
-    for cc in ("y", "latitude", "Latitude", "lat"):
-        if cc in img_data.coords:
-            ycoord = cc
-            break
-    if not xcoord or not ycoord:
-        raise Exception("Could not identify spatial coordinates")
-    width = len(img_data.coords[xcoord])
-    height = len(img_data.coords[ycoord])
-    img_io = BytesIO()
-    # Render XArray to APNG via Pillow
-    # https://pillow.readthedocs.io/en/stable/handbook/image-file-formats.html#apng-sequences
+    # Render XArray to APNG, rendering and encoding one frame at a time.
     if loop_over and animate:
-        time_slices_array = [
-            xarray_image_as_png(img_data.sel(**{loop_over: coord}), animate=True)
+        frames = (
+            render_frame(img_data.sel(**{loop_over: coord}))
             for coord in img_data.coords[loop_over].values
-        ]
-        images = []
-
-        for t_slice in time_slices_array:
-            im = Image.fromarray(t_slice, "RGBA")
-            images.append(im)
-        images[0].save(img_io, "PNG", save_all=True, default_image=True, loop=0, duration=frame_duration, append_images=images)
-        img_io.seek(0)
-        return img_io.read()
+        )
+        return b"".join(encode_animation(frames, len(img_data.coords[loop_over]), frame_duration, encoder=encoder))
 
     if "time" in img_data.dims:
         img_data = img_data.squeeze(dim="time", drop=True)
 
-    pillow_data = render_frame(img_data.transpose(xcoord, ycoord), width, height)
+    if is_indexed(img_data):
+        return encoder.encode_indexed(index_array(img_data), img_data.attrs["palette"])
+
+    pillow_data = render_frame(img_data)
     if not loop_over and animate:
         return pillow_data
 
-    # Change PNG rendering to Pillow
-    im_final = Image.fromarray(pillow_data, "RGBA")
-    im_final.save(img_io, "PNG")
-    img_io.seek(0)
-    return img_io.read()
+    return encoder.encode(pillow_data)
 
 
-def render_frame(img_data, width, height):
+def render_frame(img_data, width=None, height=None):
     """Render to a 3D numpy array an Xarray RGB(A) input
 
     Args:
         img_data ([type]): Input 3D XArray
-        width ([type]): Width of the frame to render
-        height ([type]): Height of the frame to render
+        width ([type]): Width of the frame to render (ignored - taken from img_data)
+        height ([type]): Height of the frame to render (ignored - taken from img_data)
 
     Returns:
-        numpy.ndarray: 3D Rendered Xarray as numpy array
+        numpy.ndarray: Contiguous (height, width, 4) RGBA numpy array
     """
-    masked = False
-    last_band = None
-    buffer = numpy.zeros((4, width, height), numpy.uint8)
-    band_index = {
-        "red": 0,
-        "green": 1,
-        "blue": 2,
-        "alpha": 3,
-    }
-    for band in img_data.data_vars:
-        index = band_index[band]
-        band_data = img_data[band].values
-        if band == "alpha":
-            masked = True
-        buffer[index, :, :] = band_data
-        index += 1
-        last_band = band_data
-    if not masked:
-        alpha_mask = numpy.empty(last_band.shape).astype('uint8')
-        alpha_mask.fill(255)
-        buffer[3, :, :] = alpha_mask
-    return buffer.transpose()
+    from datacube_ows.encoders import rgba_array
+    return rgba_array(img_data)
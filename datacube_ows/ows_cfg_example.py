@@ -987,6 +987,9 @@ style_deform = {
     # The range specifies the min and max values for the color ramp.  Required if an explicit color ramp is not
     # defined.
     "range": [-110.0, 110.0],
+    # Reduce the ramp to this many evenly spaced colours, so images can be encoded as paletted PNGs.
+    # Optional - defaults to an unquantised (smooth) ramp.
+    "quantise": 44,
     # The Matplotlib color ramp. Value specified is a string that indicates a Matplotlib Colour Ramp should be
     # used. Reference here: https://matplotlib.org/examples/color/colormaps_reference.html
     # Only used if an explicit colour ramp is not defined.  Optional - defaults to a simple (but
@@ -1342,6 +1345,13 @@ standard_resource_limits = {
         # Defaults to 300.0
         "min_zoom_factor": 500.0,
 
+        # Decimation factors of the internal overview levels available in all the source data of the layer
+        # (e.g. Cloud Optimised GeoTIFFs).  Zoomed out requests read from the appropriate overview level, and
+        # the minimum zoom limits above are relaxed accordingly.
+        #
+        # Defaults to an empty list (no overviews).
+        "overview_factors": [2, 4, 8, 16, 32],
+
         # Min zoom factor (above) works well for small-tiled requests, (e.g. 256x256 as sent by Terria).
         # However, for large-tiled requests (e.g. as sent by QGIS), large and intensive queries can still
         # go through to the datacube.
@@ -1397,6 +1407,16 @@ standard_resource_limits = {
         #
         # Defaults to zero, which is interpreted as no dataset limit.
         "max_datasets": 16,
+        # wcs::chunk_size enables chunked loading of large single-date GeoTIFF coverages.  Requests wider or
+        # taller than chunk_size pixels are loaded, written and returned one chunk_size x chunk_size chunk at a
+        # time, so memory use does not grow with the size of the request.
+        #
+        # Optional - defaults to no chunking.  Should be a multiple of the GeoTIFF tile size (256).
+        "chunk_size": 2048,
+        # wcs::max_chunked_image_size replaces max_image_size for chunked requests.
+        #
+        # Optional - defaults to the value of max_image_size.  Zero is interpreted as no limit.
+        "max_chunked_image_size": 20000 * 20000 * 4,
         # dataset_cache_rules can be set independently for WCS requests.  This example omits it, so
         # WCS GetCoverage requests will always return no cache-control header.
     }
@@ -1515,6 +1535,56 @@ ows_cfg = {
                 "vertical_coord": "y",
             },
         },
+        # Process-wide cache of dataset search results, shared by neighbouring requests.
+        # Optional, defaults to no search result caching.
+        "dataset_search_cache": {
+            # Maximum number of datasets to hold in the cache.  Optional, defaults to 10000.
+            "max_datasets": 20000,
+            # Time in seconds before cached search results expire. Optional, defaults to 300.
+            "ttl": 600,
+            # Largest grid cell size (in degrees) to cache search results for.  Optional, defaults to 11.25.
+            "max_cell_size": 5.625,
+        },
+        # Process-wide cache of hydrated ODC Dataset objects (by dataset id), so that
+        # repeated requests do not re-fetch and re-parse dataset metadata documents.
+        # Optional, defaults to no dataset caching.
+        "dataset_cache": {
+            # Maximum number of datasets to hold in the cache.  Optional, defaults to 50000.
+            "max_datasets": 50000,
+            # Time in seconds before cached datasets expire. Optional, defaults to 3600.
+            "ttl": 3600,
+        },
+        # Maximum number of threads per worker process used to load data concurrently.
+        # Optional, defaults to 1 (data is loaded serially in the request thread).
+        "max_load_threads": 4,
+        # Default for the layer "float32_processing" entry.  Optional, defaults to False.
+        "float32_processing": False,
+        # GDAL I/O environment, kept open for the lifetime of each worker thread.
+        # Optional - if not supplied, GDAL defaults are used.
+        "gdal_environment": {
+            # Size of the VSI block cache (in bytes) for remote reads.  Optional, defaults to 64MB.
+            "vsi_cache_size": 64 * 1024 * 1024,
+            # Reuse HTTP connections (HTTP/2 multiplexing and TCP keep-alive).  Optional, defaults to True.
+            "http_multiplex": True,
+            # Don't list directories looking for side-car files.  Optional, defaults to True.
+            "disable_readdir_on_open": True,
+            # Any other GDAL configuration options.  Optional.
+            "options": {
+                "GDAL_HTTP_MAX_RETRY": "3",
+            },
+        },
+        # Cache of byte ranges read from remote (HTTP(S) and S3) files, shared by all requests.
+        # Optional - if not supplied, remote reads are not cached.
+        "byte_range_cache": {
+            # Maximum size of the in-memory cache (in bytes).  Optional, defaults to 256MB.
+            "max_size": 256 * 1024 * 1024,
+            # Size of the blocks files are read and cached in (in bytes).  Optional, defaults to 64KB.
+            "block_size": 64 * 1024,
+            # Directory for an on-disk cache shared by all worker processes.  Optional, defaults to no disk cache.
+            "directory": "/tmp/ows_byte_range_cache",
+            # Maximum size of the on-disk cache (in bytes).  Optional, defaults to ten times max_size.
+            "max_disk_size": 4 * 1024 * 1024 * 1024,
+        },
     },   #### End of "global" section.
 
     # Config items in the "wms" section apply to the WMS service (and WMTS, which is implemented as a
@@ -1541,7 +1611,19 @@ ows_cfg = {
             # The authorities dictionary maps names to authority urls.
             "auth": "https://authoritative-authority.com",
             "idsrus": "https://www.identifiers-r-us.com",
-        }
+        },
+        # Server-side cache of rendered WMS GetMap and WMTS GetTile images.
+        # Optional, defaults to no server-side tile caching.
+        "tile_cache": {
+            # "memory" (per-worker in-process LRU cache) or "disk" (shared local directory).
+            "backend": "disk",
+            # Maximum total size of cached tiles, in megabytes.  Optional, defaults to 256.
+            "max_size": 1024,
+            # Cache directory. Required for the disk backend.
+            "directory": "/var/cache/datacube-ows/tiles",
+            # How often (in seconds) to check the database for updated layer ranges.  Optional, defaults to 60.
+            "ranges_refresh": 60,
+        },
     }, ####  End of "wms" section.
 
     # Config items in the "wmts" section apply to the WMTS service only.
@@ -1593,6 +1675,11 @@ ows_cfg = {
                 # is 2**1 = 2
                 # So tiles side by side (2x1) (then 4x2, 8x4, 16x8, etc.)
                 "matrix_exponent_initial_offsets": (1, 0),
+                # Render blocks of 4x4 tiles at a time and store the
+                # other tiles in the block in the tile cache.
+                # Only used if a tile_cache is configured in the "wms" section.
+                # Optional, defaults to 1 (no metatiling).
+                "metatile_size": 4,
             },
         }
     },
@@ -1632,6 +1719,9 @@ ows_cfg = {
         # Maybe over-ridden at the named layer (i.e. coverage)
         # level.
         "native_format": "GeoTIFF",
+        # Directory GeoTIFF responses are spooled to before being streamed to the client.
+        # Optional - defaults to the system temporary directory.
+        # "tiff_spool_directory": "/var/tmp/ows",
     }, ###### End of "wcs" section
 
     # Products published by this datacube_ows instance.
@@ -1700,6 +1790,49 @@ ows_cfg = {
                     # Resource limits.
                     # See reusable resource limit declarations above for documentation.
                     "resource_limits": standard_resource_limits,
+                    # Image encoding settings.  Optional - see documentation for details.
+                    "image_encoding": {
+                        # Image formats supported by the layer.  Must include "image/png".
+                        # Optional, defaults to ["image/png"] (i.e. lossy formats must be enabled explicitly).
+                        "formats": ["image/png", "image/jpeg", "image/webp"],
+                        "png": {
+                            # zlib compression level (0-9).  Optional, defaults to 6.
+                            "compress_level": 3,
+                            # zlib compression strategy.  Optional, defaults to "default".
+                            "strategy": "rle",
+                            # Encode styles with a palette (value maps and quantised ramps) as
+                            # 8 bit paletted PNGs.  Optional, defaults to True.
+                            "paletted": True,
+                            # Stream animated multi-date images as they are encoded.
+                            # Optional, defaults to False.
+                            "stream_animation": False,
+                        },
+                        "jpeg": {
+                            # JPEG quality (1-95).  Optional, defaults to 85.
+                            "quality": 80,
+                            # Colour transparent pixels are blended onto.  Optional, defaults to white.
+                            "background": [255, 255, 255],
+                        },
+                        "webp": {
+                            # WebP quality (1-100).  Optional, defaults to 80.
+                            "quality": 75,
+                            # Use lossless WebP compression.  Optional, defaults to False.
+                            "lossless": False,
+                        },
+                    },
+                    # Concurrent loading settings.  Optional - see documentation for details.
+                    "loading": {
+                        # Maximum concurrent reads for the layer per worker process.
+                        # Optional, defaults to using the global max_load_threads pool.
+                        "concurrency": 8,
+                        # Read each band separately.  Optional, defaults to False.
+                        "split_bands": True,
+                        # Maximum time (in seconds) to wait for concurrent reads.  Optional, defaults to no timeout.
+                        "timeout": 30,
+                    },
+                    # Carry out floating point calculations in single precision (float32).
+                    # Optional, defaults to the global "float32_processing" entry.
+                    "float32_processing": True,
                     # If "dynamic" is False (the default) the the ranges for the product are cached in memory.
                     # Dynamic products slow down the generation of the GetCapabilities document - use sparingly.
                     "dynamic": False,
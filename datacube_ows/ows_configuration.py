@@ -33,6 +33,7 @@ from odc.geo.geobox import GeoBox
 from ows import Version
 from slugify import slugify
 
+from datacube_ows.byte_range_cache import ByteRangeCache, parse_byte_range_cache
 from datacube_ows.config_utils import (CFG_DICT, RAW_CFG, ConfigException,
                                        F, FlagProductBands, FunctionWrapper,
                                        ODCInitException, OWSConfigEntry,
@@ -40,11 +41,16 @@ from datacube_ows.config_utils import (CFG_DICT, RAW_CFG, ConfigException,
                                        OWSFlagBand, OWSMetadataConfig,
                                        cfg_expand, get_file_loc,
                                        import_python_obj, load_json_obj)
+from datacube_ows.encoders import ImageEncoders
 from datacube_ows.index.api import OWSAbstractIndex, ows_index
+from datacube_ows.index.dataset_cache import DatasetCache, parse_dataset_cache
+from datacube_ows.index.search_cache import (DatasetSearchCache,
+                                             parse_dataset_search_cache)
 from datacube_ows.ogc_utils import create_geobox
 from datacube_ows.resource_limits import (OWSResourceManagementRules,
                                           parse_cache_age)
 from datacube_ows.styles import StyleDef
+from datacube_ows.tile_cache import OWSTileCache, parse_tile_cache
 from datacube_ows.tile_matrix_sets import TileMatrixSet
 from datacube_ows.time_utils import local_solar_date_range
 from datacube_ows.utils import (group_by_begin_datetime, group_by_mosaic,
@@ -241,6 +247,62 @@ class SuppURL(OWSConfigEntry):
         self.format = cfg["format"]
 
 
+class LoadingCfg(OWSConfigEntry):
+    """
+    Concurrent loading configuration for a layer (the layer "loading" section).
+    """
+    def __init__(self, cfg: CFG_DICT, context: str) -> None:
+        super().__init__(cfg)
+        self.concurrency = cast(int | None, cfg.get("concurrency"))
+        if self.concurrency is not None and (not isinstance(self.concurrency, int) or self.concurrency < 1):
+            raise ConfigException(f"loading concurrency must be a positive integer in {context}: {self.concurrency}")
+        self.timeout = cast(float | None, cfg.get("timeout"))
+        if self.timeout is not None and (not isinstance(self.timeout, (int, float)) or self.timeout <= 0):
+            raise ConfigException(f"loading timeout must be a positive number of seconds in {context}: {self.timeout}")
+        self.split_bands = bool(cfg.get("split_bands", False))
+
+
+class GDALEnvironmentCfg(OWSConfigEntry):
+    """
+    GDAL I/O environment configuration (the global "gdal_environment" section).
+    """
+    def __init__(self, cfg: CFG_DICT) -> None:
+        super().__init__(cfg)
+        self.vsi_cache_size = cast(int | None, cfg.get("vsi_cache_size", 64 * 1024 * 1024))
+        self.block_cache_size = cast(int | None, cfg.get("block_cache_size"))
+        for name, val in (("vsi_cache_size", self.vsi_cache_size), ("block_cache_size", self.block_cache_size)):
+            if val is not None and (not isinstance(val, int) or val <= 0):
+                raise ConfigException(f"{name} in gdal_environment section must be a positive integer number of bytes: {val}")
+        self.http_multiplex = bool(cfg.get("http_multiplex", True))
+        self.disable_readdir_on_open = bool(cfg.get("disable_readdir_on_open", True))
+        self.options = cast(dict[str, Any], cfg.get("options", {}))
+        if not isinstance(self.options, dict):
+            raise ConfigException(f"options in gdal_environment section must be a dictionary: {self.options}")
+
+    def gdal_options(self) -> dict[str, Any]:
+        """
+        The GDAL configuration options to apply to the rasterio environment of each thread.
+
+        :return: A dictionary of GDAL configuration options.
+        """
+        opts: dict[str, Any] = {}
+        if self.disable_readdir_on_open:
+            opts["GDAL_DISABLE_READDIR_ON_OPEN"] = "EMPTY_DIR"
+        if self.http_multiplex:
+            opts["GDAL_HTTP_MULTIPLEX"] = "YES"
+            opts["GDAL_HTTP_VERSION"] = "2"
+            opts["GDAL_HTTP_TCP_KEEPALIVE"] = "YES"
+            opts["GDAL_HTTP_MERGE_CONSECUTIVE_RANGES"] = "YES"
+        if self.vsi_cache_size is not None:
+            opts["VSI_CACHE"] = "TRUE"
+            opts["VSI_CACHE_SIZE"] = str(self.vsi_cache_size)
+            opts["CPL_VSIL_CURL_CACHE_SIZE"] = str(self.vsi_cache_size)
+        if self.block_cache_size is not None:
+            opts["GDAL_CACHEMAX"] = str(self.block_cache_size)
+        opts.update(self.options)
+        return opts
+
+
 class OWSLayer(OWSMetadataConfig):
     METADATA_KEYWORDS = True
     METADATA_ATTRIBUTION = True
@@ -579,6 +641,9 @@ class OWSNamedLayer(OWSExtensibleConfigEntry, OWSLayer):
         self.resource_limits = OWSResourceManagementRules(self.global_cfg,
                                                           cast(CFG_DICT, cfg.get("resource_limits", {})),
                                                           f"Layer {self.name}")
+        self.image_encoders = ImageEncoders(cast(CFG_DICT, cfg.get("image_encoding", {})))
+        self.loading = LoadingCfg(cast(CFG_DICT, cfg.get("loading", {})), f"layer {self.name}")
+        self.float32_processing = bool(cfg.get("float32_processing", self.global_cfg.float32_processing))
         try:
             self.parse_flags(cast(CFG_DICT, cfg.get("flags", {})))
             self.declare_unready("all_flag_band_names")
@@ -994,6 +1059,13 @@ class OWSNamedLayer(OWSExtensibleConfigEntry, OWSLayer):
             end = ranges.end_time
         return (start, end)
 
+    @property
+    def ranges_last_updated(self) -> datetime.datetime | None:
+        # When the currently loaded ranges were last updated (without refreshing dynamic layers.)
+        if self._ranges is None:
+            return None
+        return self._ranges.last_updated
+
     @property
     def ranges(self) -> "LayerExtent":
         if self.dynamic:
@@ -1239,6 +1311,7 @@ class ContactInfo(OWSConfigEntry):
 class OWSConfig(OWSMetadataConfig):
     _instance: Optional["OWSConfig"] = None
     initialised = False
+    gdal_environment_initialised = False
 
     def __new__(cls, *args, **kwargs):
         if not cls._instance or kwargs.get("refresh"):
@@ -1263,6 +1336,14 @@ class OWSConfig(OWSMetadataConfig):
     def active_product_index(self) -> dict[str, OWSNamedLayer]:
         return {prod.name: prod for prod in self.active_products}
 
+    @property
+    def image_formats(self) -> list[str]:
+        # Image formats supported by at least one active layer.
+        formats: dict[str, None] = {}
+        for prod in self.active_products:
+            formats.update(dict.fromkeys(prod.image_encoders.formats))
+        return list(formats) or ["image/png"]
+
     def __init__(self, refresh=False, cfg: CFG_DICT | None = None,
                  ignore_msgfile=False, called_from_update_ranges=False):
         self.called_from_update_ranges = called_from_update_ranges
@@ -1308,6 +1389,7 @@ class OWSConfig(OWSMetadataConfig):
                 )
             self.catalog: Catalog | None = None
             self.initialised = True
+            self.gdal_environment_initialised = False
             self.declare_unready("dc")
             self.declare_unready("crses")
             self.declare_unready("native_product_index")
@@ -1396,6 +1478,26 @@ class OWSConfig(OWSMetadataConfig):
         self.info_url = cfg["info_url"]
         self.contact_info = ContactInfo.parse(cfg.get("contact_info"), self)
         self.attribution = AttributionCfg.parse(cast(CFG_DICT | None, cfg.get("attribution")), self)
+        self.dataset_search_cache: DatasetSearchCache | None = parse_dataset_search_cache(
+            cast(CFG_DICT | None, cfg.get("dataset_search_cache"))
+        )
+        self.dataset_cache: DatasetCache | None = parse_dataset_cache(
+            cast(CFG_DICT | None, cfg.get("dataset_cache"))
+        )
+        self.byte_range_cache: ByteRangeCache | None = parse_byte_range_cache(
+            cast(CFG_DICT | None, cfg.get("byte_range_cache"))
+        )
+        max_load_threads = cfg.get("max_load_threads", 1)
+        if not isinstance(max_load_threads, int) or max_load_threads < 1:
+            raise ConfigException(f"max_load_threads must be a positive integer: {max_load_threads}")
+        self.max_load_threads: int = max_load_threads
+        self.float32_processing = bool(cfg.get("float32_processing", False))
+        if "gdal_environment" in cfg:
+            self.gdal_environment: GDALEnvironmentCfg | None = GDALEnvironmentCfg(
+                cast(CFG_DICT, cfg["gdal_environment"])
+            )
+        else:
+            self.gdal_environment = None
 
         def make_gml_name(name):
             if name.startswith("EPSG:"):
@@ -1483,6 +1585,7 @@ class OWSConfig(OWSMetadataConfig):
         self.authorities = cast(dict[str, str], cfg.get("authorities", {}))
         self.user_band_math_extension = cfg.get("user_band_math_extension", False)
         self.wms_cap_cache_age = parse_cache_age(cfg, "caps_cache_maxage", "wms")
+        self.tile_cache: OWSTileCache | None = parse_tile_cache(cast(CFG_DICT | None, cfg.get("tile_cache")))
         if "attribution" in cfg:
             _LOG.warning("Attribution entry in top level 'wms' section will be ignored. Attribution should be moved to the 'global' section")
 
@@ -1506,6 +1609,7 @@ class OWSConfig(OWSMetadataConfig):
             if self.native_wcs_format not in self.wcs_formats_by_name:
                 raise ConfigException(f"Configured native WCS format ({self.native_wcs_format}) not a supported format.")
             self.wcs_tiff_statistics = cfg.get("calculate_tiff_statistics", True)
+            self.wcs_tiff_spool_dir = cast(str | None, cfg.get("tiff_spool_directory"))
             self.wcs_cap_cache_age = parse_cache_age(cfg, "caps_cache_maxage", "wcs")
             self.wcs_default_descov_age = parse_cache_age(cfg, "default_desc_cache_maxage", "wcs")
         else:
@@ -1514,6 +1618,7 @@ class OWSConfig(OWSMetadataConfig):
             self.wcs_formats_by_mime = {}
             self.native_wcs_format = None
             self.wcs_tiff_statistics = False
+            self.wcs_tiff_spool_dir = None
             self.wcs_cap_cache_age = 0
             self.wcs_default_descov_age = 0
 
@@ -1579,6 +1684,12 @@ class OWSConfig(OWSMetadataConfig):
 
 def get_config(refresh=False, called_from_update_ranges=False) -> OWSConfig:
     cfg = OWSConfig(refresh=refresh, called_from_update_ranges=called_from_update_ranges)
+    if not cfg.gdal_environment_initialised:
+        # Apply the gdal_environment section as soon as the config is parsed
+        # (which may be deferred to the first request.)
+        from datacube_ows.startup_utils import initialise_gdal_environment
+        initialise_gdal_environment(cfg, _LOG)
+        cfg.gdal_environment_initialised = True
     if not cfg.ready:
         try:
             cfg.make_ready()
@@ -128,6 +128,35 @@ class RequestScale:
     def zoom_lvl_offset(self) -> float:
         return math.log(self.load_factor, 4)
 
+    @property
+    def decimation(self) -> float:
+        """
+        The ratio of the output pixel size to the native resolution of the data.
+        """
+        span_x, span_y = self.pixel_span()
+        return math.sqrt(abs(span_x * span_y) / self.res_xy())
+
+    def overview_factor(self, factors: Iterable[int]) -> int:
+        """
+        Select the overview level that data for the request will be read from.
+
+        :param factors: The decimation factors of the overview levels available in the source data.
+        :return: The decimation factor of the coarsest overview level that is no coarser than the request,
+                 or 1 (i.e. full resolution) if there is none.
+        """
+        decimation = self.decimation * (1.0 + 1e-6)
+        return max((f for f in factors if f <= decimation), default=1)
+
+    def overview_adjusted_zoom_level(self, factors: Iterable[int]) -> float:
+        """
+        The load-adjusted zoom level, allowing for data being read from an overview level.
+
+        Reading from an overview level with a decimation factor of f reads f*f fewer pixels.
+
+        :param factors: The decimation factors of the overview levels available in the source data.
+        """
+        return self.load_adjusted_zoom_level + math.log2(self.overview_factor(factors))
+
 
 RequestScale.standard_scale = RequestScale(CRS("EPSG:3857"), (25.0, 25.0),
                                            GeoBox((256, 256), affine=affine.identity, crs="EPSG:3857"),
@@ -235,8 +264,20 @@ class OWSResourceManagementRules(OWSConfigEntry):
         self.min_zoom = cast(float | None, wms_cfg.get("min_zoom_factor"))
         self.min_zoom_lvl = cast(int | float | None, wms_cfg.get("min_zoom_level"))
         self.max_datasets_wms = cast(int, wms_cfg.get("max_datasets", 0))
+        self.overview_factors = cast(list[int], wms_cfg.get("overview_factors", []))
+        if (not isinstance(self.overview_factors, list)
+                or any(not isinstance(f, int) or f < 2 for f in self.overview_factors)
+                or self.overview_factors != sorted(set(self.overview_factors))):
+            raise ConfigException(
+                f"overview_factors must be a list of increasing integers greater than 1 in {context}")
         self.max_datasets_wcs = cast(int, wcs_cfg.get("max_datasets", 0))
         self.max_image_size_wcs = cast(int, wcs_cfg.get("max_image_size", 0))
+        self.wcs_chunk_size = cast(int | None, wcs_cfg.get("chunk_size"))
+        if self.wcs_chunk_size is not None and (not isinstance(self.wcs_chunk_size, int)
+                                                or self.wcs_chunk_size <= 0):
+            raise ConfigException(f"wcs chunk_size must be a positive integer in {context}")
+        # Defaults to the unchunked limit, so enabling chunking does not remove the size limit.
+        self.max_chunked_image_size_wcs = cast(int, wcs_cfg.get("max_chunked_image_size", self.max_image_size_wcs))
         self.wms_cache_rules = CacheControlRules(wms_cfg.get("dataset_cache_rules"), context, self.max_datasets_wms)
         self.wcs_cache_rules = CacheControlRules(wcs_cfg.get("dataset_cache_rules"), context, self.max_datasets_wcs)
         self.wcs_desc_cache_rule = parse_cache_age(
@@ -258,25 +299,47 @@ class OWSResourceManagementRules(OWSConfigEntry):
         limits_exceeded: list[str] = []
         if self.max_datasets_wms > 0 and n_datasets > self.max_datasets_wms:
             limits_exceeded.append("too many datasets")
+        if self.overview_factors:
+            # Data is read from the source overviews, which reduces the resources required.
+            overview_factor = request_scale.overview_factor(self.overview_factors)
+            zoom_level = request_scale.overview_adjusted_zoom_level(self.overview_factors)
+        else:
+            overview_factor = 1
+            zoom_level = request_scale.load_adjusted_zoom_level
         if self.min_zoom is not None:
-            if zoom_factor < self.min_zoom:
+            if zoom_factor * overview_factor < self.min_zoom:
                 limits_exceeded.append("zoomed out too far")
         if self.min_zoom_lvl is not None:
             fuzz_factor = 0.01
-            if request_scale.load_adjusted_zoom_level < self.min_zoom_lvl - fuzz_factor:
+            if zoom_level < self.min_zoom_lvl - fuzz_factor:
                 limits_exceeded.append("too much projected resource requirements")
         if limits_exceeded:
             raise ResourceLimited(limits_exceeded)
 
+    def chunk_wcs(self, height: int, width: int, n_dates: int) -> bool:
+        """
+        Whether a WCS request should be loaded and written in spatial chunks.
+
+        :param height: The height of the requested coverage in pixels
+        :param width: The width of the requested coverage in pixels
+        :param n_dates: The number of dates requested
+        :return: True if chunked loading is enabled for the layer and the request spans more than one chunk.
+        """
+        if self.wcs_chunk_size is None or n_dates != 1:
+            return False
+        return height > self.wcs_chunk_size or width > self.wcs_chunk_size
+
     def check_wcs(self, n_datasets: int,
                   height: int, width: int,
                   pixel_size: int,
-                  n_dates: int
+                  n_dates: int,
+                  chunked: bool = False
                  ) -> None:
         """
         Check whether a WCS requests exceeds the configured resource limits.
 
         :param n_datasets: The number of datasets for the query
+        :param chunked: True if the request is to be loaded and written in spatial chunks
         :raises: ResourceLimited if any limits are exceeded.
         """
         limits_exceeded: list[str] = []
@@ -284,7 +347,9 @@ class OWSResourceManagementRules(OWSConfigEntry):
         if self.max_datasets_wcs > 0 and n_datasets > self.max_datasets_wcs:
             limits_exceeded.append(f"too many datasets ({n_datasets}: maximum={self.max_datasets_wcs}")
         pixel_count = height * width
-        if self.max_image_size_wcs > 0 and n_dates * pixel_count * pixel_size > self.max_image_size_wcs:
+        # Memory use for chunked requests is bounded by the chunk size, so they have their own limit.
+        max_image_size = self.max_chunked_image_size_wcs if chunked else self.max_image_size_wcs
+        if max_image_size > 0 and n_dates * pixel_count * pixel_size > max_image_size:
             limits_exceeded.append(f"too much data for a single request - try selecting fewer pixels or less bands")
             hard = True
         if limits_exceeded:
@@ -10,7 +10,10 @@ import warnings
 
 from botocore.credentials import RefreshableCredentials
 from datacube.utils.aws import configure_s3_access
+from datacube.utils.rio import (activate_from_config, get_rio_env,
+                                 set_default_rio_config)
 from flask import Flask, request
+from prometheus_client import Counter
 from rasterio.errors import NotGeoreferencedWarning
 
 from datacube_ows.ows_configuration import get_config
@@ -23,6 +26,8 @@ __all__ = [
     'initialise_sentry',
     'initialise_aws_credentials',
     'parse_config_file',
+    'initialise_gdal_environment',
+    'activate_gdal_environment',
     'initialise_flask',
     'initialise_prometheus',
     'CredentialManager',
@@ -78,6 +83,8 @@ def initialise_sentry(log=None):
 
 class CredentialManager:
     _instance = None
+    # GDAL configuration options from the gdal_environment global config section.
+    gdal_opts: dict = {}
 
     def __new__(cls, log=None):
         if not cls._instance:
@@ -155,7 +162,8 @@ class CredentialManager:
             if self.log:
                 self.log.info("Establishing/renewing credentials")
             self.credentials = configure_s3_access(aws_unsigned=self.unsigned,
-                                                            requester_pays=self.requester_pays)
+                                                   requester_pays=self.requester_pays,
+                                                   **self.gdal_opts)
             if self.log:
                 if isinstance(self.credentials, RefreshableCredentials):
                     # pylint: disable=protected-access
@@ -177,6 +185,51 @@ def parse_config_file(log=None):
     return cfg
 
 
+# Counts of GDAL environment reuse - not GDAL VSI cache statistics, which GDAL does not expose.
+GDAL_ENV_REUSED = Counter("ows_gdal_env_reused",
+                          "Data reads that reused the already-open GDAL environment of the thread")
+GDAL_ENV_OPENED = Counter("ows_gdal_env_opened",
+                          "Data reads that had to open a new GDAL environment for the thread")
+
+
+def activate_gdal_environment() -> bool:
+    """
+    Ensure the long-lived rasterio environment of the current thread is open and up to date.
+
+    The environment (and with it GDAL's HTTP connections and VSI caches) stays open for the
+    lifetime of the thread, and is only reopened when the configuration changes (e.g. when
+    credentials are renewed).
+
+    :return: True if the existing environment was reused, False if a new one was opened
+            (or if no rasterio environment is configured).
+    """
+    if activate_from_config() is not None:
+        GDAL_ENV_OPENED.inc()
+        return False
+    if not get_rio_env():
+        # No environment configured, so nothing was reused.
+        return False
+    GDAL_ENV_REUSED.inc()
+    return True
+
+
+def initialise_gdal_environment(cfg, log=None):
+    # Configure GDAL I/O (HTTP connection reuse, VSI caching) from the gdal_environment global config section.
+    if cfg is None or cfg.gdal_environment is None:
+        return
+    CredentialManager.gdal_opts = cfg.gdal_environment.gdal_options()
+    # pylint: disable=protected-access
+    cm = CredentialManager._instance
+    if cm is not None and cm.use_aws:
+        # S3 access setup replaces the default rasterio config, so must pass the GDAL options through.
+        cm.renew_creds()
+    else:
+        set_default_rio_config(**CredentialManager.gdal_opts)
+    activate_gdal_environment()
+    if log:
+        log.info("GDAL environment configured")
+
+
 def initialise_flask(name):
     app_path = os.path.dirname(os.path.abspath(__file__))
     app = Flask(name.split('.')[0], template_folder=os.path.join(app_path, 'templates'))
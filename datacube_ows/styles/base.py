@@ -6,8 +6,8 @@
 
 import io
 import logging
-from typing import (Any, Iterable, Mapping, MutableMapping, Optional, Sized,
-                    Type, Union, cast)
+from typing import (Any, Iterable, Iterator, Mapping, MutableMapping,
+                    Optional, Sized, Type, Union, cast)
 
 import datacube.model
 import numpy as np
@@ -23,7 +23,9 @@ from datacube_ows.config_utils import (CFG_DICT, RAW_CFG, AbstractMaskRule,
                                        OWSExtensibleConfigEntry,
                                        OWSFlagBandStandalone,
                                        OWSIndexedConfigEntry,
-                                       OWSMetadataConfig)
+                                       OWSMetadataConfig, can_compile_mask,
+                                       compiled_mask)
+from datacube_ows.encoders import indexed_image
 from datacube_ows.legend_utils import get_image_from_url
 from datacube_ows.ogc_exceptions import WMSException
 
@@ -122,6 +124,9 @@ class StyleDefBase(OWSExtensibleConfigEntry, OWSMetadataConfig):
     auto_legend: bool = False
     # Used by Ramp subclass to expose index values to GetFeatureInfo
     include_in_feature_info: bool = False
+    # Over-ridden by subclasses that can (for some configurations) render paletted images
+    # with transform_single_date_data_indexed()
+    supports_indexed: bool = False
 
     def __new__(cls, product: Optional["datacube_ows.ows_configuration.OWSNamedLayer"] = None,
                 style_cfg: Optional[CFG_DICT] = None,
@@ -193,6 +198,11 @@ class StyleDefBase(OWSExtensibleConfigEntry, OWSMetadataConfig):
             StyleMask(mask_cfg, self)
             for mask_cfg in cast(list[CFG_DICT], raw_cfg.get("pq_masks", []))
         ]
+        # Mask rules grouped by flag band, and lookup tables for evaluating them (see to_mask)
+        self.masks_by_band: dict[str, list[StyleMask]] = {}
+        for mask in self.masks:
+            self.masks_by_band.setdefault(mask.band, []).append(mask)
+        self._mask_luts: dict[str, dict[tuple[str, str], np.ndarray]] = {}
         if self.stand_alone:
             self.flag_products: list[FlagProductBands] = []
         else:
@@ -281,6 +291,31 @@ class StyleDefBase(OWSExtensibleConfigEntry, OWSMetadataConfig):
         # pyre-ignore[16]
         return [self.product.band_idx.measurements[b] for b in self.needed_bands]
 
+    @property
+    def float32_processing(self) -> bool:
+        """
+        Whether floating point calculations should be carried out in single precision (per the layer config).
+        """
+        return bool(getattr(self.product, "float32_processing", False))
+
+    def float32_data(self, data: xr.Dataset) -> xr.Dataset:
+        """
+        Convert non-flag bands to float32, if float32 processing is enabled.
+
+        :param data: Raw data
+        :return: The raw data, with non-flag bands converted to float32 (or unchanged if float32 processing is disabled)
+        """
+        if not self.float32_processing:
+            return data
+        converted = {
+            band: band_data.astype(np.float32)
+            for band, band_data in data.data_vars.items()
+            if band not in self.flag_bands and band_data.dtype.kind in "iuf" and band_data.dtype != np.float32
+        }
+        if not converted:
+            return data
+        return data.assign(converted)
+
     def local_band(self, band: str) -> str:
         """
         Local band alias handling.
@@ -309,24 +344,39 @@ class StyleDefBase(OWSExtensibleConfigEntry, OWSMetadataConfig):
         :return: A spatial mask with same dimensions and coordinates as data (including time).
         """
 
-        def render_mask(data: xr.Dataset, mask: StyleMask) -> xr.DataArray | None:
+        def render_masks(data: xr.Dataset, band: str, masks: list[StyleMask]) -> Iterable[xr.DataArray | None]:
             """
-            Calculate a style mask.
+            Calculate the style masks for a flag band.
+
+            Integer flag data is evaluated for all the masks on the band in a single pass.
+
             :param data: Raw Data
-            :param mask: A StyleMask object to calculate
-            :return: A DataArray boolean mask with no time dimension
+            :param band: The flag band
+            :param masks: The StyleMask objects on the band
+            :return: DataArray boolean masks with no time dimension
             """
-            pq_data = getattr(data, mask.band)
-            odc_mask = mask.create_mask(pq_data)
-            return odc_mask
+            pq_data = getattr(data, band)
+            if can_compile_mask(masks, pq_data):
+                luts = self._mask_luts.setdefault(band, {})
+                yield xr.DataArray(compiled_mask(masks, pq_data, luts),
+                                   dims=pq_data.dims, coords=pq_data.coords)
+            else:
+                for mask in masks:
+                    yield mask.create_mask(pq_data)
 
         result: xr.DataArray | None = extra_mask
-        for mask in self.masks:
-            mask_data = render_mask(data, mask)
-            if result is None:
-                result = mask_data
-            elif mask_data is not None:
-                result = result & mask_data
+        # Whether result is a new array owned by this method, so can be combined in place.
+        owned = False
+        for band, masks in self.masks_by_band.items():
+            for mask_data in render_masks(data, band, masks):
+                if result is None:
+                    result = mask_data
+                elif mask_data is not None:
+                    if owned:
+                        result &= mask_data
+                    else:
+                        result = result & mask_data
+                        owned = True
         return result
 
     def apply_mask_to_image(self, img_data: xr.Dataset, mask: Optional[xr.DataArray],
@@ -352,19 +402,32 @@ class StyleDefBase(OWSExtensibleConfigEntry, OWSMetadataConfig):
         else:
             alpha = img_data.alpha
         if mask is not None:
-            if output_date_count == 1 and input_date_count > 1:
-                flat_mask: Optional[xr.DataArray] = None
-                for coord in mask.coords["time"].values:
-                    mask_slice = mask.sel(time=coord)
-                    if flat_mask is None:
-                        flat_mask = mask_slice
-                    else:
-                        flat_mask &= mask_slice
-                mask = cast(xr.DataArray, flat_mask)
+            mask = self.flatten_mask(mask, input_date_count, output_date_count)
             alpha = alpha.where(mask, other=0)
         img_data = img_data.assign({"alpha": alpha})
         return img_data
 
+    @staticmethod
+    def flatten_mask(mask: xr.DataArray, input_date_count: int, output_date_count: int) -> xr.DataArray:
+        """
+        Combine the time slices of a mask, for multi-date data rendered to a single image.
+
+        :param mask: Mask, as returned by to_mask()
+        :param input_date_count: Number of timeslices in raw data (and therefore in the mask)
+        :param output_date_count: Number of timeslices in the image
+        :return: The mask to apply to the image.
+        """
+        if output_date_count == 1 and input_date_count > 1:
+            flat_mask: Optional[xr.DataArray] = None
+            for coord in mask.coords["time"].values:
+                mask_slice = mask.sel(time=coord)
+                if flat_mask is None:
+                    flat_mask = mask_slice
+                else:
+                    flat_mask &= mask_slice
+            mask = cast(xr.DataArray, flat_mask)
+        return mask
+
     def transform_data(self, data: xr.Dataset, mask: Optional[xr.DataArray]) -> xr.Dataset:
         """
         Apply style to raw data to make an RGBA image xarray (time aware-ish)
@@ -388,6 +451,82 @@ class StyleDefBase(OWSExtensibleConfigEntry, OWSMetadataConfig):
         img_data = self.apply_mask_to_image(img_data, mask, input_date_count, output_date_count)
         return img_data
 
+    def transform_data_frames(self, data: xr.Dataset, mask: Optional[xr.DataArray]) -> Iterator[xr.Dataset]:
+        """
+        Apply style to raw data to make RGBA image xarrays, one time slice at a time.
+
+        For animated multi-date requests: each frame is styled (and masked) only when requested,
+        so only one styled frame need be held in memory at a time.  Multi-date handlers with an
+        aggregator function (other than multi_date_pass) may combine dates, so the whole time
+        stack is styled at once and then split into frames.
+
+        :param data: Raw ODC data, with all required data bands and flag bands.
+        :param mask: Optional additional mask to apply.
+        :return: Iterator of Xarray datasets with RGBA uint8 bands and no time dimension, one per time slice.
+        """
+        mdh = self.get_multi_date_handler(data)
+        if mdh is not None and not mdh.per_frame:
+            stack = self.transform_data(data, mask)
+            for idx in range(self.count_dates(data)):
+                if "time" in stack.dims:
+                    yield stack.isel(time=idx, drop=True)
+                else:
+                    yield stack
+            return
+        for idx in range(self.count_dates(data)):
+            frame = data.isel(time=slice(idx, idx + 1))
+            if mdh is None:
+                img_data = self.transform_single_date_data(frame)
+            else:
+                img_data = mdh.transform_data(frame)
+            if "time" in img_data.dims:
+                img_data = img_data.squeeze(dim="time", drop=True)
+            frame_mask = mask
+            if mask is not None and "time" in mask.dims:
+                frame_mask = mask.isel(time=idx, drop=True)
+            yield self.apply_mask_to_image(img_data, frame_mask, 1, 1)
+
+    def transform_data_indexed(self, data: xr.Dataset, mask: Optional[xr.DataArray]) -> Optional[xr.Dataset]:
+        """
+        Apply style to raw data to make a paletted image xarray, if the style has a palette.
+
+        Only supported for styles with a palette of at most 256 colours (value maps and quantised colour
+        ramps) rendering a single image.  Masked pixels are set to palette entry zero (transparent).
+
+        :param data: Raw ODC data, with all required data bands and flag bands.
+        :param mask: Optional additional mask to apply.
+        :return: Paletted image xarray (as returned by datacube_ows.encoders.indexed_image),
+                 or None if the style cannot render paletted images for this data.
+        """
+        if not self.supports_indexed:
+            return None
+        input_date_count = self.count_dates(data)
+        mdh = self.get_multi_date_handler(input_date_count)
+        if mdh is None:
+            indexed = self.transform_single_date_data_indexed(data)
+        else:
+            indexed = mdh.transform_data_indexed(data)
+        if indexed is None:
+            return None
+        index, palette = indexed
+        if "time" in index.dims and len(index.coords["time"]) > 1:
+            return None
+        if mask is not None:
+            mask = self.flatten_mask(mask, input_date_count, 1)
+            index = index.where(mask, other=0).astype(np.uint8)
+        return indexed_image(index, palette)
+
+    def transform_single_date_data_indexed(self, data: xr.Dataset) -> Optional[tuple[xr.DataArray, np.ndarray]]:
+        """
+        Apply style to raw data to make palette indexes (single time slice only)
+        Must be over-ridden by subclasses that set supports_indexed.
+
+        :param data: Raw data, all bands.
+        :return: Tuple of uint8 palette indexes and (n, 4) uint8 RGBA palette (with entry zero transparent),
+                 or None if not supported for this style configuration.
+        """
+        raise NotImplementedError()
+
     def transform_single_date_data(self, data: xr.Dataset) -> xr.Dataset:
         """
         Apply style to raw data to make an RGBA image xarray (single time slice only)
@@ -527,6 +666,9 @@ class StyleDefBase(OWSExtensibleConfigEntry, OWSMetadataConfig):
 
             self.animate = cast(bool, cfg.get("animate", False))
             self.frame_duration: int = 1000
+            # Whether each date can be styled on its own (i.e. the aggregator does not combine dates).
+            self.per_frame = ("aggregator_function" not in cfg
+                              or self.is_pass_through(cast(RAW_CFG, cfg["aggregator_function"])))
             if "aggregator_function" in cfg:
                 self.aggregator: FunctionWrapper | None = FunctionWrapper(style.product,
                                                   cast(CFG_DICT, cfg["aggregator_function"]),
@@ -534,6 +676,10 @@ class StyleDefBase(OWSExtensibleConfigEntry, OWSMetadataConfig):
             elif self.animate:
                 self.aggregator = FunctionWrapper(style.product, lambda x: x, stand_alone=True)
                 self.frame_duration = cast(int, cfg.get("frame_duration", 1000))
+                # Packed into an unsigned 16 bit field of the APNG frame control chunk.
+                if not isinstance(self.frame_duration, int) or not 0 <= self.frame_duration <= 65535:
+                    raise ConfigException("multi_date handler frame_duration must be an integer number of "
+                                          f"milliseconds between 0 and 65535: {self.frame_duration}")
             else:
                 self.aggregator = None
                 if self.non_animate_requires_aggregator:
@@ -546,6 +692,13 @@ class StyleDefBase(OWSExtensibleConfigEntry, OWSMetadataConfig):
                 for k, v in custom_includes.items()
             }
 
+        @staticmethod
+        def is_pass_through(func_cfg: RAW_CFG) -> bool:
+            """Is the aggregator function config the pass-through aggregator (multi_date_pass)?"""
+            func = func_cfg.get("function") if isinstance(func_cfg, dict) else func_cfg
+            return (func is datacube_ows.band_utils.multi_date_pass
+                    or func == "datacube_ows.band_utils.multi_date_pass")
+
         def applies_to(self, count: int) -> bool:
             """Does this multidate handler apply to a request with this number of dates?"""
             return self.min_count <= count and self.max_count >= count
@@ -569,6 +722,18 @@ class StyleDefBase(OWSExtensibleConfigEntry, OWSMetadataConfig):
             """
             return self.style.transform_single_date_data(data)
 
+        def transform_data_indexed(self, data: xr.Dataset) -> Optional[tuple[xr.DataArray, np.ndarray]]:
+            """
+            Apply image transformation to palette indexes
+
+            For implementation by subclasses that have a palette.
+
+            :param data: Raw data
+            :return: Tuple of uint8 palette indexes and (n, 4) uint8 RGBA palette (with entry zero transparent),
+                     or None if not supported.
+            """
+            return None
+
         # pylint: disable=abstract-method
         class Legend(LegendBase):
             """
@@ -655,5 +820,6 @@ class GlobalCfgProxy:
 
 class StandaloneProductProxy:
     name = "standalone"
+    float32_processing = False
     global_cfg = GlobalCfgProxy()
     band_idx = BandIdxProxy()
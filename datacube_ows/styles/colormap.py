@@ -235,31 +235,146 @@ def convert_to_uint8(fval):
     return clipped
 
 
+class ValueMapRenderer:
+    """
+    A value map compiled to a palette of rule colours and a per-pixel rule index calculation.
+
+    Images are rendered by calculating the index of the matching rule for each pixel, then looking up
+    all four channels in the palette in a single pass.  Rule indexes for 8 and 16 bit bands are read
+    from a lookup table over all possible band values, built on first use.
+    """
+    def __init__(self, value_map: MutableMapping[str, list[AbstractValueMapRule]]) -> None:
+        self.value_map = value_map
+        # Palette entry zero is for pixels that match no rule.
+        palette = [(0, 0, 0, 0)]
+        self.rule_indexes: dict[str, list[int]] = {}
+        for band, rules in value_map.items():
+            self.rule_indexes[band] = list(range(len(palette), len(palette) + len(rules)))
+            for rule in rules:
+                palette.append((
+                    convert_to_uint8(rule.rgb.red),
+                    convert_to_uint8(rule.rgb.green),
+                    convert_to_uint8(rule.rgb.blue),
+                    convert_to_uint8(rule.alpha),
+                ))
+        self.palette = numpy.array(palette, dtype="uint8")
+        self.index_dtype = numpy.dtype("uint8") if len(palette) <= 256 else numpy.dtype("uint16")
+        self._luts: dict[tuple, numpy.ndarray] = {}
+
+    def rule_index(self, band: str, data: DataArray) -> DataArray | None:
+        """
+        Calculate the index (into the palette) of the first matching rule for each pixel.
+
+        :param band: The (config) name of the band
+        :param data: Integer band data
+        :return: Rule indexes, with the dimensions of the rule masks (zero where no rule matches),
+                 or None if the band has no rules.
+        """
+        idx: DataArray | None = None
+        # Apply in reverse order so earlier rules take precedence.
+        for rule, rule_idx in reversed(list(zip(self.value_map[band], self.rule_indexes[band]))):
+            mask = rule.create_mask(data)
+            if mask is None:
+                continue
+            if idx is None:
+                idx = xarray.zeros_like(mask, dtype=self.index_dtype)
+            idx.values[numpy.asarray(mask, dtype=bool)] = rule_idx
+        return idx
+
+    def lut(self, band: str, data: DataArray) -> numpy.ndarray | None:
+        """
+        A lookup table of rule indexes for every possible value of an 8 or 16 bit band.
+
+        :param band: The (config) name of the band
+        :param data: Band data
+        :return: The lookup table (to be indexed by the band data viewed as unsigned), or None if the band
+                 is not 8 or 16 bit integer data, or has multi-date rules.
+        """
+        rules = self.value_map[band]
+        if data.dtype.kind not in "ui" or data.dtype.itemsize > 2:
+            return None
+        if any(isinstance(rule, MultiDateValueMapRule) for rule in rules):
+            return None
+        flags_def = None
+        if any(rule.flags for rule in rules):
+            flags_def = repr(data.attrs.get("flags_definition"))
+        key = (band, data.dtype.str, flags_def)
+        lut = self._luts.get(key)
+        if lut is None:
+            all_values = numpy.arange(2 ** (8 * data.dtype.itemsize)).astype(f"u{data.dtype.itemsize}")
+            values = DataArray(all_values.view(data.dtype), dims=["value"], attrs=data.attrs)
+            idx = self.rule_index(band, values)
+            if idx is None:
+                lut = numpy.zeros(all_values.shape, dtype=self.index_dtype)
+            else:
+                lut = idx.values
+            self._luts[key] = lut
+        return lut
+
+    @property
+    def paletted(self) -> bool:
+        """
+        True if the palette is small enough for 8 bit paletted images.
+        """
+        return self.index_dtype == numpy.uint8
+
+    def index(self, data: Dataset, band_mapper: Callable[[str], str]) -> DataArray:
+        """
+        Calculate the palette index of each pixel.
+
+        :param data: Raw data, including all value map bands
+        :param band_mapper: Maps config band names to band names in data
+        :return: Palette indexes (zero where no rule matches)
+        """
+        idx: DataArray | None = None
+        for cfg_band in self.value_map:
+            band = band_mapper(cfg_band)
+            bdata = cast(DataArray, data[band])
+            if bdata.dtype.kind == 'f':
+                # Convert back to int for bitmasking
+                bdata = ColorMapStyleDef.reint(bdata)
+            lut = self.lut(cfg_band, bdata)
+            if lut is None:
+                band_idx = self.rule_index(cfg_band, bdata)
+            else:
+                band_idx = DataArray(lut[bdata.values.view(f"u{bdata.dtype.itemsize}")],
+                                     dims=bdata.dims, coords=bdata.coords)
+            if band_idx is None:
+                continue
+            if idx is None:
+                idx = band_idx
+            else:
+                # Rules for later bands take precedence.
+                idx = xarray.where(band_idx != 0, band_idx, idx)
+        if idx is None:
+            imgdata = Dataset(coords={k: v for k, v in data.coords.items() if k != "time"})
+            shape = tuple(imgdata.sizes.values())
+            idx = DataArray(numpy.zeros(shape, dtype=self.index_dtype), coords=imgdata.coords)
+        return idx
+
+    def apply(self, data: Dataset, band_mapper: Callable[[str], str]) -> Dataset:
+        """
+        Render data as an RGBA image.
+
+        :param data: Raw data, including all value map bands
+        :param band_mapper: Maps config band names to band names in data
+        :return: RGBA uint8 image Dataset
+        """
+        idx = self.index(data, band_mapper)
+        rgba = numpy.take(self.palette, idx.values, axis=0)
+        return Dataset(
+            {
+                channel: (idx.dims, rgba[..., i])
+                for i, channel in enumerate(("red", "green", "blue", "alpha"))
+            },
+            coords=idx.coords
+        )
+
+
 def apply_value_map(value_map: MutableMapping[str, list[AbstractValueMapRule]],
                     data: Dataset,
                     band_mapper: Callable[[str], str]) -> Dataset:
-    imgdata = Dataset(coords={k: v for k, v in data.coords.items() if k != "time"})
-    shape = tuple(imgdata.sizes.values())
-    for channel in ("red", "green", "blue", "alpha"):
-        c = numpy.full(shape, 0, dtype="uint8")
-        imgdata[channel] = DataArray(c, coords=imgdata.coords)
-    for cfg_band, rules in value_map.items():
-        # Run through each item
-        band = band_mapper(cfg_band)
-        bdata = cast(DataArray, data[band])
-        if bdata.dtype.kind == 'f':
-            # Convert back to int for bitmasking
-            bdata = ColorMapStyleDef.reint(bdata)
-        for rule in reversed(rules):
-            mask = rule.create_mask(bdata)
-            if mask is not None and mask.data.any():
-                for channel in ("red", "green", "blue", "alpha"):
-                    if channel == "alpha":
-                        val = convert_to_uint8(rule.alpha)
-                    else:
-                        val = convert_to_uint8(getattr(rule.rgb, channel))
-                    imgdata[channel] = xarray.where(mask, val, imgdata[channel])
-    return imgdata
+    return ValueMapRenderer(value_map).apply(data, band_mapper)
 
 
 class PatchTemplate:
@@ -326,6 +441,7 @@ class ColorMapStyleDef(StyleDefBase):
     Style subclass for value-map styles
     """
     auto_legend = True
+    supports_indexed = True
 
     def __init__(self,
                  product: "OWSNamedLayer",
@@ -338,6 +454,7 @@ class ColorMapStyleDef(StyleDefBase):
         super().__init__(product, style_cfg, stand_alone=stand_alone, user_defined=user_defined)
         style_cfg = cast(CFG_DICT, self._raw_cfg)
         self.value_map = AbstractValueMapRule.value_map_from_config(self, cast(CFG_DICT, style_cfg["value_map"]))
+        self.value_map_renderer = ValueMapRenderer(self.value_map)
         self.legend_cfg.register_value_map(self.value_map)
         for mdh in self.multi_date_handlers:
             mdh.legend_cfg.register_value_map(mdh.value_map)
@@ -387,7 +504,19 @@ class ColorMapStyleDef(StyleDefBase):
         #            data[band] = data[band].where(extent_mask, other=data[band].attrs['nodata'])
         #        except AttributeError:
         #            data[band] = data[band].where(extent_mask)
-        return apply_value_map(self.value_map, data, self.product.band_idx.band)
+        return self.value_map_renderer.apply(data, self.product.band_idx.band)
+
+    def transform_single_date_data_indexed(self, data: Dataset) -> tuple[DataArray, numpy.ndarray] | None:
+        """
+        Apply style to raw data to make palette indexes (single time slice only)
+
+        :param data: Raw data, all bands.
+        :return: Tuple of uint8 palette indexes and RGBA palette, or None if the value map has too many rules.
+        """
+        if not self.value_map_renderer.paletted:
+            return None
+        return (self.value_map_renderer.index(data, self.product.band_idx.band),
+                self.value_map_renderer.palette)
 
     class Legend(ColorMapLegendBase):
         pass
@@ -405,6 +534,7 @@ class ColorMapStyleDef(StyleDefBase):
             """
             super().__init__(style, cfg)
             self._value_map: dict[str, list[AbstractValueMapRule]] | None = None
+            self._value_map_renderer: ValueMapRenderer | None = None
             tcfg = cast(CFG_DICT, self._raw_cfg)
             if self.animate:
                 if "value_map" in tcfg:
@@ -418,6 +548,15 @@ class ColorMapStyleDef(StyleDefBase):
                 self._value_map = self.style.value_map
             return self._value_map
 
+        @property
+        def value_map_renderer(self) -> ValueMapRenderer:
+            if self._value_map_renderer is None:
+                if self._value_map is None or self._value_map is self.style.value_map:
+                    self._value_map_renderer = cast(ColorMapStyleDef, self.style).value_map_renderer
+                else:
+                    self._value_map_renderer = ValueMapRenderer(self._value_map)
+            return self._value_map_renderer
+
         def transform_data(self, data: "xarray.Dataset") -> "xarray.Dataset":
             """
             Apply image transformation
@@ -426,10 +565,24 @@ class ColorMapStyleDef(StyleDefBase):
             :return: RGBA image xarray.  May have a time dimension
             """
             if self.aggregator is None:
-                return apply_value_map(self.value_map, data, self.style.product.band_idx.band)
+                return self.value_map_renderer.apply(data, self.style.product.band_idx.band)
             else:
                 agg = self.aggregator(data)
-                return apply_value_map(self.value_map, agg, self.style.product.band_idx.band)
+                return self.value_map_renderer.apply(agg, self.style.product.band_idx.band)
+
+        def transform_data_indexed(self, data: "xarray.Dataset") -> tuple[DataArray, numpy.ndarray] | None:
+            """
+            Apply image transformation to palette indexes
+
+            :param data: Raw data
+            :return: Tuple of uint8 palette indexes and RGBA palette, or None if the value map has too many rules.
+            """
+            if not self.value_map_renderer.paletted:
+                return None
+            if self.aggregator is not None:
+                data = self.aggregator(data)
+            return (self.value_map_renderer.index(data, self.style.product.band_idx.band),
+                    self.value_map_renderer.palette)
 
         class Legend(ColorMapLegendBase):
             pass
@@ -137,39 +137,97 @@ class ComponentStyleDef(StyleDefBase):
         return normalized * 255
 
 
+    def compress_band_in_place(self, component_name: str, buffer: np.ndarray) -> np.ndarray:
+        """
+        Compress dynamic range of a float component buffer to uint8 range (0-255), in place.
+
+        :param component_name: The name of the component being compressed (i.e. 'red', 'green', 'blue' or 'alpha')
+        :param buffer: The uncompressed floating point component data, overwritten with the compressed data.
+        :return: The buffer
+        """
+        sc_min: float = self.component_scale_ranges[component_name]["min"]
+        sc_max: float = self.component_scale_ranges[component_name]["max"]
+        np.clip(buffer, sc_min, sc_max, out=buffer)
+        np.subtract(buffer, sc_min, out=buffer)
+        np.divide(buffer, sc_max - sc_min, out=buffer)
+        np.multiply(buffer, 255, out=buffer)
+        return buffer
+
+    def accumulate_components(self, data: Dataset, imgband: str, components: LINEAR_COMP_DICT,
+                              buffer: np.ndarray, term: np.ndarray | None) -> np.ndarray | None:
+        """
+        Calculate the weighted sum of the bands of a linear component, in a float32 scratch buffer.
+
+        :param data: Raw data, all bands.
+        :param imgband: The component being calculated (i.e. 'red', 'green', 'blue' or 'alpha')
+        :param components: The linear component dictionary.
+        :param buffer: Scratch buffer for the result.
+        :param term: Scratch buffer for the terms of the sum (allocated on first use if None)
+        :return: The term scratch buffer, for reuse.
+        """
+        first = True
+        for band, intensity in components.items():
+            if band == "scale_range":
+                continue
+            if callable(intensity):
+                values = np.asarray(intensity(data[band], band, imgband))
+                if first:
+                    np.copyto(buffer, values, casting="unsafe")
+                else:
+                    np.add(buffer, values, out=buffer, casting="unsafe")
+            elif first:
+                np.multiply(data[band].values, intensity, out=buffer, dtype=np.float32, casting="unsafe")
+            else:
+                if term is None:
+                    term = np.empty_like(buffer)
+                np.multiply(data[band].values, intensity, out=term, dtype=np.float32, casting="unsafe")
+                np.add(buffer, term, out=buffer)
+            first = False
+        if first:
+            buffer.fill(0)
+        return term
+
     def transform_single_date_data(self, data: Dataset) -> Dataset:
         """
         Apply style to raw data to make an RGBA image xarray (single time slice only)
 
+        Linear components are accumulated, scaled and clipped in a single float32 scratch buffer,
+        and written directly into a shared uint8 image buffer.
+
         :param data: Raw data, all bands.
         :return: RGBA uint8 xarray
         """
+        rgb_components = cast(dict[str, Callable | LINEAR_COMP_DICT], self.rgb_components)
+        ref_bands = [
+            band
+            for components in rgb_components.values() if not callable(components)
+            for band in components if band != "scale_range"
+        ]
+        if ref_bands:
+            ref = data[ref_bands[0]]
+            dims, shape, coords = ref.dims, ref.shape, ref.coords
+        else:
+            dims, shape, coords = tuple(data.sizes.keys()), tuple(data.sizes.values()), data.coords
+        image = np.empty((len(rgb_components),) + shape, dtype="uint8")
+        buffer: np.ndarray | None = None
+        term: np.ndarray | None = None
         imgdata = cast(dict[Hashable, Any], {})
-        for imgband, components in cast(dict[str, Callable | LINEAR_COMP_DICT], self.rgb_components).items():
+        function_data: Dataset | None = None
+        for channel, (imgband, components) in zip(image, rgb_components.items()):
             if callable(components):
-                imgband_data = components(data)
+                if function_data is None:
+                    function_data = self.float32_data(data)
+                imgband_data = components(function_data)
                 imgband_data = imgband_data.astype('uint8')
                 imgdata[imgband] = imgband_data
-            else:
-                imgband_data = None
-                for band, intensity in components.items():
-                    if callable(intensity):
-                        imgband_component = intensity(data[band], band, imgband)
-                    elif band == "scale_range":
-                        continue
-                    else:
-                        imgband_component = data[band] * intensity
-
-                    if imgband_data is not None:
-                        imgband_data += imgband_component
-                    else:
-                        imgband_data = imgband_component
-                if imgband_data is None:
-                    null_np = np.zeros(tuple(data.sizes.values()), 'float64')
-                    imgband_data = DataArray(null_np, data.coords, tuple(data.sizes.keys()))
-                if imgband != "alpha":
-                    imgband_data = self.compress_band(imgband, imgband_data)
-                imgdata[imgband] = imgband_data.astype("uint8")
+                continue
+            if buffer is None:
+                buffer = np.empty(shape, dtype=np.float32)
+            term = self.accumulate_components(data, imgband, components, buffer, term)
+            if imgband != "alpha":
+                self.compress_band_in_place(imgband, buffer)
+            np.copyto(channel, buffer, casting="unsafe")
+            imgdata[imgband] = DataArray(channel, coords=coords, dims=dims)
 
         image_dataset = Dataset(imgdata)
         return image_dataset
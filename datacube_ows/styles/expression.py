@@ -5,14 +5,20 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import operator
-from typing import Any, Type, cast
+from typing import Any, Callable, Type, cast
 
 import lark
+import numpy
 from datacube.virtual.expr import formula_parser
-from xarray import Dataset
+from xarray import DataArray, Dataset
 
 from datacube_ows.config_utils import ConfigException
 
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
 TYPE_CHECKING = False
 if TYPE_CHECKING:
     import datacube_ows.styles.StyleDef
@@ -45,8 +51,9 @@ class ExpressionEvaluator(lark.Transformer):
     floordiv = operator.floordiv
     mod = operator.mod
     mul = operator.mul
-    neg = operator.neg
-    pos = operator.pos
+    # Annotated so subclasses can substitute other unary operator implementations.
+    neg: Callable[..., Any] = operator.neg
+    pos: Callable[..., Any] = operator.pos
     pow = operator.pow
     sub = operator.sub
     truediv = operator.truediv
@@ -88,6 +95,132 @@ class BandListEvaluator(ExpressionEvaluator):
         return set([self.ows_style.local_band(key.value)])
 
 
+### Expression compiler - compiles a parsed expression to a kernel over raw numpy arrays
+
+# A compiled node: takes a dictionary of raw band arrays and returns a tuple of the result,
+# and whether the result is a temporary array owned by the kernel (and so can be overwritten).
+Kernel = Callable[[dict[str, numpy.ndarray]], tuple[Any, bool]]
+
+
+class CompiledNode:
+    """
+    A node of a compiled expression.
+
+    :param kernel: Numpy evaluator for the node.
+    :param numexpr: Equivalent numexpr expression string, or None if not expressible in numexpr.
+    :param literal: The constant value of the node, if the node is a literal (or constant sub-expression).
+    """
+    def __init__(self, kernel: Kernel, numexpr: str | None, literal: Any = None) -> None:
+        self.kernel = kernel
+        self.numexpr = numexpr
+        self.literal = literal
+
+
+def literal_node(value: Any) -> CompiledNode:
+    return CompiledNode(lambda values: (value, False), repr(value), literal=value)
+
+
+def _unary(ufunc: numpy.ufunc, symbol: str, fold: Callable[[Any], Any]) -> Callable[..., CompiledNode]:
+    def compile_op(ev, a: CompiledNode) -> CompiledNode:
+        if a.literal is not None:
+            return literal_node(fold(a.literal))
+        kernel_a = a.kernel
+
+        def kernel(values: dict[str, numpy.ndarray]) -> tuple[Any, bool]:
+            val, owned = kernel_a(values)
+            if owned:
+                return ufunc(val, out=val), True
+            return ufunc(val), True
+        return CompiledNode(kernel, f"({symbol}{a.numexpr})" if a.numexpr else None)
+    return compile_op
+
+
+def _result_dtype(ufunc: numpy.ufunc, a: Any, b: Any) -> numpy.dtype:
+    """
+    The dtype of the result of a binary ufunc.
+
+    Found by applying the ufunc to empty arrays of the operand dtypes, so Python scalars are cast
+    by the same (value-based or weak) promotion rules the installed numpy applies to the real call.
+    """
+    return ufunc(*(
+        numpy.empty(0, dtype=val.dtype) if isinstance(val, numpy.ndarray) else val for val in (a, b)
+    )).dtype
+
+
+def _binary(ufunc: numpy.ufunc, symbol: str | None, fold: Callable[[Any, Any], Any]) -> Callable[..., CompiledNode]:
+    def compile_op(ev, a: CompiledNode, b: CompiledNode) -> CompiledNode:
+        if a.literal is not None and b.literal is not None:
+            # Constants are folded with Python operators, as in ExpressionEvaluator.
+            # (e.g. numpy.power rejects negative integer exponents.)
+            return literal_node(fold(a.literal, b.literal))
+        kernel_a, kernel_b = a.kernel, b.kernel
+
+        def kernel(values: dict[str, numpy.ndarray]) -> tuple[Any, bool]:
+            val_a, owned_a = kernel_a(values)
+            val_b, owned_b = kernel_b(values)
+            # Write the result over a temporary operand, where the type and shape of the result allow.
+            if owned_a or owned_b:
+                dtype = _result_dtype(ufunc, val_a, val_b)
+                shape = numpy.broadcast_shapes(numpy.shape(val_a), numpy.shape(val_b))
+                for val, owned in ((val_a, owned_a), (val_b, owned_b)):
+                    if owned and val.dtype == dtype and val.shape == shape:
+                        return ufunc(val_a, val_b, out=val), True
+            return ufunc(val_a, val_b), True
+        if symbol and a.numexpr and b.numexpr:
+            expr: str | None = f"({a.numexpr}{symbol}{b.numexpr})"
+        else:
+            expr = None
+        return CompiledNode(kernel, expr)
+    return compile_op
+
+
+@lark.v_args(inline=True)
+class ExpressionCompiler(ExpressionEvaluator):
+    """
+    Expression compiler
+
+    Compiles an expression to a kernel over raw numpy arrays, fusing operators in place where possible,
+    and an equivalent numexpr expression.  Constant sub-expressions are evaluated at compile time.
+    """
+    add = _binary(numpy.add, "+", ExpressionEvaluator.add)
+    sub = _binary(numpy.subtract, "-", ExpressionEvaluator.sub)
+    mul = _binary(numpy.multiply, "*", ExpressionEvaluator.mul)
+    truediv = _binary(numpy.true_divide, "/", ExpressionEvaluator.truediv)
+    # numexpr floor division and modulo semantics differ from numpy's for negative operands.
+    floordiv = _binary(numpy.floor_divide, None, ExpressionEvaluator.floordiv)
+    mod = _binary(numpy.remainder, None, ExpressionEvaluator.mod)
+    pow = _binary(numpy.power, "**", ExpressionEvaluator.pow)
+    neg = _unary(numpy.negative, "-", ExpressionEvaluator.neg)
+    pos = _unary(numpy.positive, "+", ExpressionEvaluator.pos)
+
+    def float_literal(self, value):
+        return literal_node(float(value))
+
+    def int_literal(self, value):
+        return literal_node(int(value))
+
+    def __init__(self, style, *args, **kwargs):
+        # Local band names, in order of first use. numexpr variables are named by position.
+        self.bands: list[str] = []
+        super().__init__(style, *args, **kwargs)
+
+    def var_name(self, key):
+        band = self.ows_style.local_band(key.value)
+        if band not in self.bands:
+            self.bands.append(band)
+        return CompiledNode(lambda values: (values[band], False), f"b{self.bands.index(band)}")
+
+
+@lark.v_args(inline=True)
+class UserDefinedExpressionCompiler(ExpressionCompiler):
+    """
+    Expression compiler for user-defined expressions.
+
+    (Doesn't support exponent operator)
+    """
+    pow = not_supported("Exponent operator")
+
+
 ### Expression wrapper - callable wrapper for a configurable expression
 
 class ExpressionException(ConfigException):
@@ -119,15 +252,36 @@ class Expression:
             raise ExpressionException(f"Unrecognised band '{e}' in {expr_str}")
         if len(self.needed_bands) == 0:
             raise ExpressionException(f"Expression references no bands: {self.expr_str}")
+        self.compile()
+
+    @property
+    def evaluator_cls(self) -> Type[ExpressionEvaluator]:
+        if self.style.user_defined:
+            return UserDefinedExpressionEvaluator
+        else:
+            return ExpressionEvaluator
+
+    def compile(self) -> None:
+        """
+        Compile the expression to a kernel over raw numpy arrays (and to a numexpr expression).
+        """
+        if self.style.user_defined:
+            compiler: ExpressionCompiler = UserDefinedExpressionCompiler(self.style)
+        else:
+            compiler = ExpressionCompiler(self.style)
+        try:
+            compiled = cast(CompiledNode, compiler.transform(self.tree))
+        except lark.LarkError as e:
+            raise ExpressionException(f"Invalid expression: {e} {self.expr_str}")
+        self.bands: list[str] = compiler.bands
+        self.kernel: Kernel = compiled.kernel
+        self.numexpr: str | None = compiled.numexpr
 
     def eval_cls(self, data: Dataset) -> ExpressionEvaluator:
         """"
         Return an appropriate Expression Evaluator for a given Dataset
         """
-        if self.style.user_defined:
-            evaluator_cls: Type[ExpressionEvaluator] = UserDefinedExpressionEvaluator
-        else:
-            evaluator_cls = ExpressionEvaluator
+        evaluator_cls = self.evaluator_cls
 
         @lark.v_args(inline=True)
         class ExpressionDataEvaluator(evaluator_cls):  # type: ignore[valid-type, misc]
@@ -137,6 +291,31 @@ class Expression:
         # pyre-ignore[19]
         return cast(ExpressionEvaluator, ExpressionDataEvaluator(self.style))
 
+    def evaluate_raw(self, values: dict[str, numpy.ndarray]) -> numpy.ndarray:
+        """
+        Evaluate the compiled expression over raw band arrays.
+
+        numexpr is used (if installed) for floating point data, otherwise the fused numpy kernel.
+
+        :param values: Raw band arrays by local band name. Input arrays are not modified.
+        :return: The raw result array (never one of the input arrays)
+        """
+        if numexpr is not None and self.numexpr and all(values[b].dtype.kind == "f" for b in self.bands):
+            return numexpr.evaluate(self.numexpr,
+                                    local_dict={f"b{i}": values[b] for i, b in enumerate(self.bands)},
+                                    global_dict={})
+        result, owned = self.kernel(values)
+        if owned:
+            return numpy.asarray(result)
+        # e.g. a single band expression - don't alias the caller's band data.
+        return numpy.array(result)
+
     def __call__(self, data: Dataset) -> Any:
-        evaluator: ExpressionEvaluator = self.eval_cls(data)
-        return evaluator.transform(self.tree)
+        arrays = [data[band] for band in self.bands]
+        dims, shape = arrays[0].dims, arrays[0].shape
+        if any(arr.dims != dims or arr.shape != shape for arr in arrays[1:]):
+            # Bands need aligning or broadcasting - let xarray handle it.
+            evaluator: ExpressionEvaluator = self.eval_cls(data)
+            return evaluator.transform(self.tree)
+        result = self.evaluate_raw({band: arr.values for band, arr in zip(self.bands, arrays)})
+        return DataArray(result, dims=dims, coords=arrays[0].coords)
@@ -25,6 +25,8 @@ class HybridStyleDef(ColorRampDef, ComponentStyleDef):
     Returns a linear blend of a component image and colour ramp image
     """
     auto_legend = False
+    # Hybrid styles blend the colour ramp with component colours, so have no palette.
+    supports_indexed = False
 
     def __init__(self,
                  product: "OWSNamedLayer",
@@ -52,6 +54,7 @@ class HybridStyleDef(ColorRampDef, ComponentStyleDef):
         :return: RGBA uint8 xarray
         """
         #pylint: disable=too-many-locals
+        data = self.float32_data(data)
         if self.index_function is not None:
             data['index_function'] = (data.dims, self.index_function(data).data)
 
@@ -166,6 +166,12 @@ class ColorRamp:
     """
     Represents a colour ramp for image and legend rendering purposes
     """
+    # Number of evenly spaced buckets between the first and last ramp values in the lookup table.
+    LUT_SIZE = 4096
+    # Maximum number of buckets for quantised ramps, so the palette (with entries for below and above the ramp,
+    # and transparent) fits in 8 bits.
+    MAX_QUANTISE = 253
+
     def __init__(self, style: StyleDefBase,
                        ramp_cfg: CFG_DICT,
                        legend: "RampLegendBase") -> None:
@@ -183,6 +189,11 @@ class ColorRamp:
                 unscaled_ramp = read_mpl_ramp(cast(str, ramp_cfg["mpl_ramp"]))
             raw_scaled_ramp = scale_unscaled_ramp(rmin, rmax, unscaled_ramp)
         self.ramp = cast(list[CFG_DICT], raw_scaled_ramp)
+        quantise = ramp_cfg.get("quantise")
+        if quantise is not None and (not isinstance(quantise, int) or not 2 <= quantise <= self.MAX_QUANTISE):
+            raise ConfigException(f"quantise must be an integer from 2 to {self.MAX_QUANTISE} in style {style.name}")
+        self.quantise = cast(int | None, quantise)
+        self.lut_size = self.quantise or self.LUT_SIZE
 
         self.values = cast(list[float], [])
         self.components = cast(MutableMapping[str, list[float]], {})
@@ -247,8 +258,74 @@ class ColorRamp:
             "blue": b,
             "alpha": a
         }
+        self.build_lut()
+
+    # pylint: disable=attribute-defined-outside-init
+    def build_lut(self) -> None:
+        """
+        Pre-compute the 8 bit RGBA lookup table used to apply the ramp to data.
+
+        Entry 0 is the colour below the start of the ramp and entry lut_size + 1 the colour at and above
+        the end of the ramp (so steps at either end of the ramp are exact), entries 1 to lut_size
+        are sampled at the centres of evenly spaced buckets across the ramp, and the final entry
+        (transparent) is used for NaN.  Entries are rounded to the nearest 8 bit value, so are within
+        one unit of exact interpolation (for unquantised ramps).
+        """
+        self._lut_lo = self.values[0]
+        hi = self.values[-1]
+        if hi > self._lut_lo:
+            self._lut_scale = self.lut_size / (hi - self._lut_lo)
+            samples = self._lut_lo + (numpy.arange(self.lut_size) + 0.5) / self._lut_scale
+        else:
+            self._lut_scale = 0.0
+            samples = numpy.full(self.lut_size, self._lut_lo)
+        lut = numpy.zeros((self.lut_size + 3, 4), dtype=ubyte)
+        for i, band in enumerate(("red", "green", "blue", "alpha")):
+            component = self.components[band]
+            lut[0, i] = round(component[0] * 255)
+            lut[1:-2, i] = numpy.rint(self.get_value(samples, band) * 255)
+            lut[-2, i] = round(component[-1] * 255)
+        self._lut = lut
+
+    def lut_index(self, data: numpy.ndarray) -> numpy.ndarray:
+        """
+        Calculate the lookup table entries for data.
+
+        :param data: Numeric data to apply the ramp to.
+        :return: uint16 array of indexes into the lookup table, with the same shape as data.
+        """
+        idx = numpy.subtract(data, self._lut_lo, dtype=numpy.result_type(data.dtype, numpy.float32))
+        idx *= self._lut_scale
+        numpy.clip(idx, -1, self.lut_size, out=idx)
+        idx += 1
+        idx[numpy.isnan(idx)] = self.lut_size + 2
+        return idx.astype(numpy.uint16)
+
+    @property
+    def palette(self) -> numpy.ndarray | None:
+        """
+        The RGBA palette of a quantised ramp, with the transparent (NaN) entry first.
+
+        None for ramps that are not quantised.
+        """
+        if self.quantise is None:
+            return None
+        return numpy.roll(self._lut, 1, axis=0)
+
+    def palette_index(self, data: DataArray) -> DataArray:
+        """
+        Calculate the palette indexes of data, for quantised ramps.
+
+        :param data: Numeric data to apply the ramp to.
+        :return: uint8 indexes into the palette.
+        """
+        idx = self.lut_index(data.values)
+        # Rotate the lookup table indexes to match the palette.
+        idx += 1
+        idx[idx == self.lut_size + 3] = 0
+        return DataArray(idx.astype(numpy.uint8), dims=data.dims, coords=data.coords)
 
-    def get_value(self, data: float | DataArray, band: str) -> numpy.ndarray:
+    def get_value(self, data: float | numpy.ndarray | DataArray, band: str) -> numpy.ndarray:
         return numpy.interp(data, self.values, self.components[band])
 
     def get_8bit_value(self, data: DataArray, band: str) -> numpy.ndarray:
@@ -258,9 +335,13 @@ class ColorRamp:
         return val.astype(ubyte)
 
     def apply(self, data: DataArray) -> Dataset:
+        # One gather from the lookup table into an RGBA buffer (rather than four full interpolations.)
+        idx = self.lut_index(data.values)
+        rgba = numpy.empty(idx.shape + (4,), dtype=ubyte)
+        numpy.take(self._lut, idx, axis=0, out=rgba)
         imgdata = cast(MutableMapping[Hashable, Any], {})
-        for band in self.components:
-            imgdata[band] = (data.dims, self.get_8bit_value(data, band))
+        for i, band in enumerate(self.components):
+            imgdata[band] = (data.dims, rgba[..., i])
         imgdataset = Dataset(imgdata, coords=data.coords)
         return imgdataset
 
@@ -498,6 +579,8 @@ class ColorRampDef(StyleDefBase):
     Colour ramp Style subclass
     """
     auto_legend = True
+    # Quantised ramps only
+    supports_indexed = True
 
     def __init__(self,
                  product: "OWSNamedLayer",
@@ -543,7 +626,9 @@ class ColorRampDef(StyleDefBase):
         :param data: Input dataset
         :return: Matching dataarray carrying the index value
         """
-        index_data = self.index_function(data)
+        index_data = self.index_function(self.float32_data(data))
+        if self.float32_processing and index_data.dtype == numpy.float64:
+            index_data = index_data.astype(numpy.float32)
         data['index_function'] = (index_data.dims, index_data.data)
         return data["index_function"]
 
@@ -557,6 +642,18 @@ class ColorRampDef(StyleDefBase):
         d = self.apply_index(data)
         return self.color_ramp.apply(d)
 
+    def transform_single_date_data_indexed(self, data: Dataset) -> tuple[DataArray, numpy.ndarray] | None:
+        """
+        Apply style to raw data to make palette indexes (single time slice only)
+
+        :param data: Raw data, all bands.
+        :return: Tuple of uint8 palette indexes and RGBA palette, or None if the ramp is not quantised.
+        """
+        palette = self.color_ramp.palette
+        if palette is None:
+            return None
+        return self.color_ramp.palette_index(self.apply_index(data)), palette
+
     class Legend(RampLegendBase):
         def plot_name(self):
             return f"{self.style.product.name}_{self.style.name}_{self.style_or_mdh.min_count}"
@@ -596,6 +693,24 @@ class ColorRampDef(StyleDefBase):
                 agg = cast(FunctionWrapper, self.aggregator)(xformed_data)
             return self.color_ramp.apply(agg)
 
+        def transform_data_indexed(self, data: Dataset) -> tuple[DataArray, numpy.ndarray] | None:
+            """
+            Apply image transformation to palette indexes
+
+            :param data: Raw data
+            :return: Tuple of uint8 palette indexes and RGBA palette, or None if the ramp is not quantised.
+            """
+            palette = self.color_ramp.palette
+            if palette is None or self.animate:
+                return None
+            if self.pass_raw_data:
+                assert self.aggregator is not None  # For type-checker
+                agg = self.aggregator(data)
+            else:
+                xformed_data = cast("ColorRampDef", self.style).apply_index(data)
+                agg = cast(FunctionWrapper, self.aggregator)(xformed_data)
+            return self.color_ramp.palette_index(agg), palette
+
         class Legend(RampLegendBase):
             pass
 
@@ -0,0 +1,357 @@
+# This file is part of datacube-ows, part of the Open Data Cube project.
+# See https://opendatacube.org for more information.
+#
+# Copyright (c) 2017-2024 OWS Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Server-side cache of rendered GetMap and GetTile responses.
+
+Tiles are keyed on everything that determines the rendered image (layer, style, time, tile coordinates/bbox,
+size and format) plus the layer's ``last_updated`` timestamp from the layer ranges table, so tiles
+rendered before a ``datacube-ows-update`` are never served once the server has picked up the new ranges.
+
+Each worker re-reads a layer's ranges at most once every ``ranges_refresh`` seconds, so updates are
+picked up without restarting the server and without a database query per tile.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Hashable, NamedTuple, Type, cast
+
+from datacube_ows.config_utils import CFG_DICT, ConfigException, OWSConfigEntry
+from datacube_ows.http_utils import FlaskResponse
+from datacube_ows.utils import LRUCache
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from datacube_ows.ows_configuration import OWSConfig, OWSNamedLayer
+
+_LOG = logging.getLogger(__name__)
+
+TileKey = tuple[Hashable, ...]
+
+
+class CachedTile(NamedTuple):
+    body: bytes
+    headers: dict[str, str]
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+
+class OWSTileCache(OWSConfigEntry, ABC):
+    """
+    Abstract base class for rendered tile cache backends.
+
+    Cache keys are tuples whose first element is the layer name.
+
+    (Tiles are accessed with lookup() and store() so as not to shadow OWSConfigEntry.get().)
+    """
+    def __init__(self, cfg: CFG_DICT) -> None:
+        super().__init__(cfg)
+        try:
+            self.max_size = int(cast(int | str, cfg.get("max_size", 256))) * 1024 * 1024
+        except ValueError:
+            raise ConfigException(f"max_size in tile_cache section must be an integer: {cfg['max_size']}")
+        if self.max_size <= 0:
+            raise ConfigException(f"max_size in tile_cache section must be greater than zero: {cfg['max_size']}")
+        try:
+            self.ranges_refresh = float(cast(float | str, cfg.get("ranges_refresh", 60)))
+        except ValueError:
+            raise ConfigException(f"ranges_refresh in tile_cache section must be a number: {cfg['ranges_refresh']}")
+        if self.ranges_refresh < 0:
+            raise ConfigException(f"ranges_refresh in tile_cache section must not be negative: {cfg['ranges_refresh']}")
+        # Layer name -> monotonic time the layer's ranges were last re-read.
+        self._ranges_checked: dict[str, float] = {}
+
+    def ranges_refresh_due(self, layer: str) -> bool:
+        """
+        Check whether the named layer's ranges are due to be re-read, and if so restart its refresh timer.
+        """
+        now = time.monotonic()
+        checked = self._ranges_checked.get(layer)
+        if checked is not None and now - checked < self.ranges_refresh:
+            return False
+        self._ranges_checked[layer] = now
+        return True
+
+    @abstractmethod
+    def lookup(self, key: TileKey) -> CachedTile | None:
+        """
+        Return the cached tile for key, or None on a cache miss.
+        """
+
+    @abstractmethod
+    def store(self, key: TileKey, tile: CachedTile) -> None:
+        """
+        Store a tile in the cache, evicting older tiles as required to stay within max_size.
+        """
+
+    @abstractmethod
+    def invalidate(self, layer: str) -> None:
+        """
+        Discard all cached tiles for the named layer.
+        """
+
+    @abstractmethod
+    def clear(self) -> None:
+        """
+        Discard all cached tiles.
+        """
+
+
+class MemoryTileCache(OWSTileCache):
+    """
+    In-process LRU tile cache.  Each worker process maintains its own cache.
+    """
+    def __init__(self, cfg: CFG_DICT) -> None:
+        super().__init__(cfg)
+        self._tiles = LRUCache(self.max_size, sizeof=lambda tile: tile.size)
+
+    def lookup(self, key: TileKey) -> CachedTile | None:
+        return self._tiles.get(key)
+
+    def store(self, key: TileKey, tile: CachedTile) -> None:
+        self._tiles.put(key, tile)
+
+    def invalidate(self, layer: str) -> None:
+        for key in self._tiles.keys():
+            if key[0] == layer:
+                self._tiles.pop(key)
+
+    def clear(self) -> None:
+        self._tiles.clear()
+
+
+class DiskTileCache(OWSTileCache):
+    """
+    Local-disk tile cache, shareable between worker processes on the same host.
+
+    Tiles are stored as one file per tile, under a sub-directory per layer.  Files are written
+    atomically, so concurrent readers never see a partially written tile.  Least recently
+    used tiles (by file modification time) are evicted once the cache exceeds max_size.
+    """
+    def __init__(self, cfg: CFG_DICT) -> None:
+        super().__init__(cfg)
+        if "directory" not in cfg:
+            raise ConfigException("The disk tile cache backend requires a directory")
+        self.directory = cast(str, cfg["directory"])
+        # Approximate running total, to avoid walking the cache directory on every write.
+        # Re-synchronised from disk whenever eviction is triggered.
+        self._size: int | None = None
+
+    def _layer_dir(self, layer: str) -> str:
+        return os.path.join(self.directory, layer.replace(os.sep, "_"))
+
+    def _path(self, key: TileKey) -> str:
+        digest = hashlib.sha256(repr(key[1:]).encode("utf-8")).hexdigest()
+        return os.path.join(self._layer_dir(str(key[0])), digest)
+
+    def lookup(self, key: TileKey) -> CachedTile | None:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fp:
+                header_line, body = fp.read().split(b"\n", 1)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return CachedTile(body, json.loads(header_line))
+
+    def store(self, key: TileKey, tile: CachedTile) -> None:
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp")
+            with os.fdopen(fd, "wb") as fp:
+                fp.write(json.dumps(tile.headers, separators=(",", ":")).encode("utf-8"))
+                fp.write(b"\n")
+                fp.write(tile.body)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            _LOG.warning("Could not write tile to disk cache %s: %s", self.directory, str(e))
+            return
+        if self._size is None:
+            self._size = self._disk_usage()
+        else:
+            self._size += tile.size
+        if self._size > self.max_size:
+            self._evict()
+
+    def _tile_files(self) -> list[tuple[float, int, str]]:
+        files = []
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def _disk_usage(self) -> int:
+        return sum(size for _, size, _ in self._tile_files())
+
+    def _evict(self) -> None:
+        files = sorted(self._tile_files())
+        size = sum(f[1] for f in files)
+        # Evict down to 90% of max_size so we don't re-scan the cache on every subsequent write.
+        target = self.max_size * 0.9
+        for _, file_size, path in files:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= file_size
+        self._size = size
+
+    def invalidate(self, layer: str) -> None:
+        shutil.rmtree(self._layer_dir(layer), ignore_errors=True)
+        self._size = None
+
+    def clear(self) -> None:
+        if os.path.isdir(self.directory):
+            for entry in os.listdir(self.directory):
+                shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+        self._size = None
+
+
+tile_cache_backends: dict[str, Type[OWSTileCache]] = {
+    "memory": MemoryTileCache,
+    "disk": DiskTileCache,
+}
+
+
+def parse_tile_cache(cfg: CFG_DICT | None) -> OWSTileCache | None:
+    """
+    Create a tile cache from a tile_cache configuration section.
+
+    :param cfg: The tile_cache section of the wms configuration (or None if tile caching is not configured.)
+    :return: A tile cache object, or None if tile caching is not configured.
+    """
+    if cfg is None:
+        return None
+    backend = cfg.get("backend", "memory")
+    if backend not in tile_cache_backends:
+        raise ConfigException(f"Unknown tile_cache backend: {backend} (supported backends: {', '.join(tile_cache_backends)})")
+    return tile_cache_backends[cast(str, backend)](cfg)
+
+
+def _layer_version(cfg: "OWSConfig", layer_name: str) -> str | None:
+    """
+    Identify the current version of the layer's data.
+
+    The layer's ranges are re-read from the database at most once per ranges_refresh interval,
+    so tiles rendered before a ``datacube-ows-update`` run stop being served without a restart.
+
+    :return: The isoformat last_updated timestamp of the layer's ranges, or None if the layer is not cacheable.
+    """
+    layer: "OWSNamedLayer | None" = cfg.layer_index.get(layer_name)
+    if layer is None or layer.hide:
+        return None
+    if cfg.tile_cache is not None and cfg.tile_cache.ranges_refresh_due(layer_name):
+        layer.force_range_update()
+        if layer.hide:
+            return None
+    # Loaded ranges only - reading layer.ranges would hit the database per request for dynamic layers.
+    last_updated = layer.ranges_last_updated
+    if last_updated is None:
+        return ""
+    return last_updated.isoformat()
+
+
+def wmts_tile_key(args: dict[str, str], cfg: "OWSConfig") -> TileKey | None:
+    """
+    Cache key for a WMTS GetTile request.
+
+    :param args: The (lower-cased) request arguments
+    :param cfg: The OWS configuration object
+    :return: A cache key tuple, or None if the request should not be cached.
+    """
+    layer_name = args.get("layer", "")
+    version = _layer_version(cfg, layer_name)
+    if version is None:
+        return None
+    return (
+        layer_name,
+        args.get("style", ""),
+        args.get("time", ""),
+        args.get("tilematrixset", ""),
+        args.get("tilematrix", ""),
+        args.get("tilerow", ""),
+        args.get("tilecol", ""),
+        args.get("format", ""),
+        version,
+    )
+
+
+# WMS GetMap arguments that affect the rendered image.
+WMS_KEY_ARGS = (
+    "version", "styles", "crs", "srs", "bbox", "width", "height",
+    "time", "format", "code", "colorscheme", "colorscalerange",
+)
+
+
+def wms_tile_key(args: dict[str, str], cfg: "OWSConfig") -> TileKey | None:
+    """
+    Cache key for a WMS GetMap request.
+
+    :param args: The (lower-cased) request arguments
+    :param cfg: The OWS configuration object
+    :return: A cache key tuple, or None if the request should not be cached.
+    """
+    layer_name = args.get("layers", "").split(",")[0]
+    version = _layer_version(cfg, layer_name)
+    if version is None:
+        return None
+    return (layer_name,) + tuple(args.get(arg, "") for arg in WMS_KEY_ARGS) + (version,)
+
+
+def cached_tile(args: dict[str, str],
+                key_func: Callable[[dict[str, str], "OWSConfig"], TileKey | None],
+                render: Callable[[dict[str, str]], FlaskResponse]) -> FlaskResponse:
+    """
+    Serve a rendered tile from the tile cache, rendering and caching it on a cache miss.
+
+    :param args: The (lower-cased) request arguments
+    :param key_func: Function to calculate a cache key from the request arguments
+    :param render: Function to render the tile on a cache miss
+    :return: A Flask response tuple
+    """
+    from datacube_ows.ows_configuration import get_config
+    cfg = get_config()
+    tile_cache = cfg.tile_cache
+    if tile_cache is None or args.get("ows_stats"):
+        return render(args)
+    key = key_func(args, cfg)
+    if key is None:
+        return render(args)
+    tile = tile_cache.lookup(key)
+    if tile is not None:
+        return tile.body, 200, tile.headers
+    response = render(args)
+    cache_response(tile_cache, key, response)
+    return response
+
+
+def cache_response(tile_cache: OWSTileCache, key: TileKey | None, response: FlaskResponse) -> None:
+    """
+    Store a successful image response in the tile cache.
+
+    :param tile_cache: The tile cache
+    :param key: The cache key (or None if the response is not cacheable)
+    :param response: A Flask response tuple
+    """
+    body, status, headers = response
+    if key is not None and status == 200 and isinstance(body, bytes):
+        tile_cache.store(key, CachedTile(body, headers))
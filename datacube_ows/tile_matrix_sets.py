@@ -103,6 +103,10 @@ class TileMatrixSet(OWSConfigEntry):
             raise ConfigException(
                 f"The unit coefficients of tile matrix set {identifier} must have 2 dimensions")
         self.unit_coefficients = cast(list[float], unit_coefficients)
+        self.metatile_size = cfg.get("metatile_size", 1)
+        if not isinstance(self.metatile_size, int) or self.metatile_size < 1:
+            raise ConfigException(
+                f"The metatile size of tile matrix set {identifier} must be a positive integer: {self.metatile_size}")
 
     @property
     def crs_cfg(self) -> CFG_DICT:
@@ -129,15 +133,26 @@ class TileMatrixSet(OWSConfigEntry):
     def height_exponent(self, scale_no):
         return self.exponent(1, scale_no)
 
-    def wms_bbox_coords(self, tile_matrix, row, col):
+    def metatile(self, tile_matrix, row, col):
+        # Find the metatile containing a tile, clipped to the edges of the tile matrix.
+        # Returns the row and column of the top-left tile and the number of rows and columns of tiles
+        n = self.metatile_size
+        meta_row = row - row % n
+        meta_col = col - col % n
+        n_rows = max(min(n, 2 ** self.height_exponent(tile_matrix) - meta_row), 1)
+        n_cols = max(min(n, 2 ** self.width_exponent(tile_matrix) - meta_col), 1)
+        return meta_row, meta_col, n_rows, n_cols
+
+    def wms_bbox_coords(self, tile_matrix, row, col, n_rows=1, n_cols=1):
         # Convert WMTS params to coordinate window for WMS
+        # (optionally spanning a block of n_rows by n_cols tiles)
         pixel = [col, row]
         scale_denominator = self.scale_set[tile_matrix]
         pixel_span = [scale_denominator * 0.00028 * u for u in self.unit_coefficients]
         tile_span = [ps * ts for ps, ts in zip(pixel_span, self.tile_size)]
 
         mins = [mo + p * ts for mo, p, ts in zip(self.matrix_origin, pixel, tile_span)]
-        maxs = [m + ts for m, ts in zip(mins, tile_span)]
+        maxs = [m + ts * n for m, ts, n in zip(mins, tile_span, (n_cols, n_rows))]
 
         if self.crs_cfg["vertical_coord_first"]:
             return (
@@ -196,6 +196,8 @@ def add_ranges(cfg: OWSConfig, layer_names: list[str]) -> bool:
             continue
         layer = cfg.layer_index[name]
         layer.ows_index().create_range_entry(layer, cache)
+        if cfg.tile_cache is not None:
+            cfg.tile_cache.invalidate(name)
 
     click.echo("Done.")
     return errors
@@ -6,7 +6,9 @@
 
 import datetime
 import logging
+from collections import OrderedDict
 from functools import wraps
+from threading import Lock
 from time import monotonic
 from typing import Any, Callable, TypeVar, cast
 
@@ -170,3 +172,82 @@ def default_to_utc(dt):
     if not dt.tzinfo:
         dt = dt.replace(tzinfo=pytz.utc)
     return dt
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded, least-recently-used cache.
+
+    Entries are evicted (least recently used first) once the total size of all entries exceeds max_size.
+    By default every entry has a size of one, so max_size is simply the maximum number of entries.
+    Entries may optionally expire a fixed time after they are added.
+    """
+    def __init__(self, max_size: int, sizeof: Callable[[Any], int] = lambda v: 1, ttl: float | None = None) -> None:
+        """
+        :param max_size: The maximum total size of all cached entries.
+        :param sizeof: A function returning the size of a cached value (in the same units as max_size)
+        :param ttl: Optional time-to-live of cache entries, in seconds.
+        """
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.ttl = ttl
+        self.size = 0
+        self._entries: OrderedDict[Any, tuple[Any, int, float | None]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                value, size, expires = self._entries[key]
+            except KeyError:
+                return default
+            if expires is not None and monotonic() >= expires:
+                del self._entries[key]
+                self.size -= size
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Any, value: Any) -> None:
+        size = self.sizeof(value)
+        expires = None if self.ttl is None else monotonic() + self.ttl
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            if size > self.max_size:
+                # Would evict everything else and still not fit.
+                return
+            self._entries[key] = (value, size, expires)
+            self.size += size
+            while self.size > self.max_size:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def pop(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                value, size, _ = self._entries.pop(key)
+            except KeyError:
+                return default
+            self.size -= size
+            return value
+
+    def keys(self) -> list[Any]:
+        with self._lock:
+            return list(self._entries.keys())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __contains__(self, key: Any) -> bool:
+        with self._lock:
+            if key not in self._entries:
+                return False
+            expires = self._entries[key][2]
+            return expires is None or monotonic() < expires
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -12,14 +12,14 @@ from dateutil.parser import parse
 from odc.geo import geom
 from odc.geo.geobox import GeoBox
 from ows.util import Version
-from rasterio import MemoryFile
 
 from datacube_ows.config_utils import ConfigException
 from datacube_ows.loading import DataStacker
 from datacube_ows.ogc_exceptions import WCS1Exception
 from datacube_ows.ows_configuration import get_config
 from datacube_ows.resource_limits import ResourceLimited
-from datacube_ows.wcs_utils import get_bands_from_styles
+from datacube_ows.wcs_utils import (CHUNKED_FORMATS, get_bands_from_styles,
+                                    write_geotiff)
 
 
 class WCS1GetCoverageRequest:
@@ -315,11 +315,15 @@ def get_coverage_data(req, qprof):
     qprof.end_event("count-datasets")
     qprof["n_datasets"] = n_datasets
 
+    chunked = (req.format.mime in CHUNKED_FORMATS
+               and req.layer.resource_limits.chunk_wcs(req.geobox.height, req.geobox.width, len(req.times)))
+    qprof["chunked"] = chunked
     try:
         req.layer.resource_limits.check_wcs(n_datasets,
                                             req.geobox.height, req.geobox.width,
                                             sum(req.layer.band_idx.dtype_size(b) for b in req.bands),
-                                            len(req.times))
+                                            len(req.times),
+                                            chunked=chunked)
     except ResourceLimited as e:
         if e.wcs_hard or not req.layer.low_res_product_names:
             raise WCS1Exception(
@@ -391,12 +395,17 @@ def get_coverage_data(req, qprof):
             str(q): [str(i) for i in ids]
             for q, ids in stacker.dsids().items()
         }
-    qprof.start_event("load-data")
-    output = stacker.data(datasets, skip_corrections=True)
-    qprof.end_event("load-data")
+    sanitised_bands = [req.layer.band_idx.locale_band(b) for b in req.bands]
+    if chunked:
+        # Data is loaded one chunk at a time, as it is written.
+        output = stacker.chunked_data(datasets, sanitised_bands, req.layer.resource_limits.wcs_chunk_size,
+                                      skip_corrections=True)
+    else:
+        qprof.start_event("load-data")
+        output = stacker.data(datasets, skip_corrections=True)
+        qprof.end_event("load-data")
 
     # Clean extent flag band from output
-    sanitised_bands = [req.layer.band_idx.locale_band(b) for b in req.bands]
     for k, v in output.data_vars.items():
         if k not in sanitised_bands:
             output = output.drop_vars([k])
@@ -405,7 +414,7 @@ def get_coverage_data(req, qprof):
 
 
 def get_tiff(req, data):
-    """Uses rasterio MemoryFiles in order to return a streamable GeoTiff response"""
+    """Write the coverage as a tiled GeoTiff, one block at a time, returning a streamable response"""
     # Does not support multi-time dimension data - is this even possible in GeoTiff?
     supported_dtype_map = {
         'uint8': 1,
@@ -425,36 +434,25 @@ def get_tiff(req, data):
     dtype = str(max(dtype_list, key=lambda d: supported_dtype_map[str(d)]))
 
     data = data.squeeze(dim="time", drop=True)
-    data = data.astype(dtype)
     cfg = get_config()
     xname = cfg.published_CRSs[req.response_crsid]["horizontal_coord"]
     yname = cfg.published_CRSs[req.response_crsid]["vertical_coord"]
     nodata = 0
     for band in data.data_vars:
         nodata = req.layer.band_idx.nodata_val(band)
-    with MemoryFile() as memfile:
-        # pylint: disable=protected-access, bad-continuation
-        with memfile.open(
-            driver="GTiff",
-            width=data.sizes[xname],
-            height=data.sizes[yname],
-            count=len(data.data_vars),
-            transform=req.affine,
-            crs=req.response_crsid,
-            nodata=nodata,
-            tiled=True,
-            compress="lzw",
-            interleave="band",
-            dtype=dtype) as dst:
-            for idx, band in enumerate(data.data_vars, start=1):
-                dst.write(data[band].values, idx)
-                dst.set_band_description(idx, req.layer.band_idx.band_label(band))
-                if cfg.wcs_tiff_statistics:
-                    dst.update_tags(idx, STATISTICS_MINIMUM=numpy.nanmin(data[band].values))
-                    dst.update_tags(idx, STATISTICS_MAXIMUM=numpy.nanmax(data[band].values))
-                    dst.update_tags(idx, STATISTICS_MEAN=numpy.nanmean(data[band].values))
-                    dst.update_tags(idx, STATISTICS_STDDEV=numpy.nanstd(data[band].values))
-        return memfile.read()
+    return write_geotiff(
+        data, dtype,
+        {band: req.layer.band_idx.band_label(band) for band in data.data_vars},
+        statistics=cfg.wcs_tiff_statistics,
+        spool_dir=cfg.wcs_tiff_spool_dir,
+        width=data.sizes[xname],
+        height=data.sizes[yname],
+        transform=req.affine,
+        crs=req.response_crsid,
+        nodata=nodata,
+        tiled=True,
+        compress="lzw",
+        interleave="band")
 
 
 def get_netcdf(req, data):
@@ -7,11 +7,9 @@
 import collections
 import logging
 
-import numpy
 from dateutil.parser import parse
 from odc.geo.geobox import GeoBox
 from ows.wcs.v20 import ScaleAxis, ScaleExtent, ScaleSize, Slice, Trim
-from rasterio import MemoryFile
 
 from datacube_ows.loading import DataStacker
 from datacube_ows.ogc_exceptions import WCS2Exception
@@ -19,6 +17,7 @@ from datacube_ows.ows_configuration import get_config
 from datacube_ows.resource_limits import ResourceLimited
 from datacube_ows.utils import default_to_utc
 from datacube_ows.wcs_scaler import WCSScaler, WCSScalerUnknownDimension
+from datacube_ows.wcs_utils import CHUNKED_FORMATS, write_geotiff
 
 # from datacube_ows.wcs_utils import get_bands_from_styles
 
@@ -261,11 +260,15 @@ def get_coverage_data(request, styles, qprof):
     qprof.end_event("count-datasets")
     qprof["n_datasets"] = n_datasets
 
+    chunked = (fmt.mime in CHUNKED_FORMATS
+               and layer.resource_limits.chunk_wcs(geobox.height, geobox.width, len(times)))
+    qprof["chunked"] = chunked
     try:
         layer.resource_limits.check_wcs(n_datasets,
                                               geobox.height, geobox.width,
                                               sum(layer.band_idx.dtype_size(b) for b in bands),
-                                              len(times)
+                                              len(times),
+                                              chunked=chunked
                                        )
     except ResourceLimited as e:
         if e.wcs_hard or not layer.low_res_product_names:
@@ -288,12 +291,17 @@ def get_coverage_data(request, styles, qprof):
             str(q): [str(i) for i in ids]
             for q, ids in stacker.dsids().items()
         }
-    qprof.start_event("load-data")
-    output = stacker.data(datasets, skip_corrections=True)
-    qprof.end_event("load-data")
+    raw_bands = [layer.band_idx.locale_band(b) for b in bands]
+    if chunked:
+        # Data is loaded one chunk at a time, as it is written.
+        output = stacker.chunked_data(datasets, raw_bands, layer.resource_limits.wcs_chunk_size,
+                                      skip_corrections=True)
+    else:
+        qprof.start_event("load-data")
+        output = stacker.data(datasets, skip_corrections=True)
+        qprof.end_event("load-data")
 
     # Clean extent flag band from output
-    raw_bands = [layer.band_idx.locale_band(b) for b in bands]
     for k, v in output.data_vars.items():
         if k not in raw_bands:
             output = output.drop_vars([k])
@@ -317,7 +325,7 @@ def get_coverage_data(request, styles, qprof):
 
 
 def get_tiff(request, data, crs, product, width, height, affine):
-    """Uses rasterio MemoryFiles in order to return a streamable GeoTiff response"""
+    """Write the coverage as a GeoTiff, one block at a time, returning a streamable response"""
     # Does not support multi-time dimension data - is this even possible in GeoTiff?
     supported_dtype_map = {
         'uint8': 1,
@@ -343,51 +351,41 @@ def get_tiff(request, data, crs, product, width, height, affine):
     if len(data.time) > 1:
         raise WCS2Exception("Multiple time slices not supported by GeoTIFF format")
     data = data.squeeze(dim="time", drop=True)
-    data = data.astype(dtype)
     nodata = 0
     for band in data.data_vars:
         nodata = product.band_idx.nodata_val(band)
-    with MemoryFile() as memfile:
-        # pylint: disable=protected-access, bad-continuation
-
-        kwargs = {}
-        if gtiff.tile_width is not None:
-            kwargs['blockxsize'] = gtiff.tile_width
-        if gtiff.tile_height is not None:
-            kwargs['blockysize'] = gtiff.tile_height
-
-        if gtiff.predictor:
-            predictor = gtiff.predictor.lower()
-            if predictor == 'horizontal':
-                kwargs['predictor'] = 2
-            elif predictor == 'floatingpoint':
-                kwargs['predictor'] = 3
-        elif dtype == "float64":
-                kwargs["predictor"] = 3
-        else:
-            kwargs["predictor"] = 2
-
-        with memfile.open(
-            driver="GTiff",
-            width=width,
-            height=height,
-            count=len(data.data_vars),
-            transform=affine,
-            crs=crs,
-            nodata=nodata,
-            tiled=gtiff.tiling if gtiff.tiling is not None else True,
-            compress=gtiff.compression.lower() if gtiff.compression else "lzw",
-            interleave=gtiff.interleave or "band",
-            dtype=dtype, **kwargs) as dst:
-            for idx, band in enumerate(data.data_vars, start=1):
-                dst.write(data[band].values, idx)
-                dst.set_band_description(idx, product.band_idx.band_label(band))
-                if cfg.wcs_tiff_statistics:
-                    dst.update_tags(idx, STATISTICS_MINIMUM=numpy.nanmin(data[band].values))
-                    dst.update_tags(idx, STATISTICS_MAXIMUM=numpy.nanmax(data[band].values))
-                    dst.update_tags(idx, STATISTICS_MEAN=numpy.nanmean(data[band].values))
-                    dst.update_tags(idx, STATISTICS_STDDEV=numpy.nanstd(data[band].values))
-        return memfile.read()
+
+    kwargs = {}
+    if gtiff.tile_width is not None:
+        kwargs['blockxsize'] = gtiff.tile_width
+    if gtiff.tile_height is not None:
+        kwargs['blockysize'] = gtiff.tile_height
+
+    if gtiff.predictor:
+        predictor = gtiff.predictor.lower()
+        if predictor == 'horizontal':
+            kwargs['predictor'] = 2
+        elif predictor == 'floatingpoint':
+            kwargs['predictor'] = 3
+    elif dtype == "float64":
+            kwargs["predictor"] = 3
+    else:
+        kwargs["predictor"] = 2
+
+    return write_geotiff(
+        data, dtype,
+        {band: product.band_idx.band_label(band) for band in data.data_vars},
+        statistics=cfg.wcs_tiff_statistics,
+        spool_dir=cfg.wcs_tiff_spool_dir,
+        width=width,
+        height=height,
+        transform=affine,
+        crs=crs,
+        nodata=nodata,
+        tiled=gtiff.tiling if gtiff.tiling is not None else True,
+        compress=gtiff.compression.lower() if gtiff.compression else "lzw",
+        interleave=gtiff.interleave or "band",
+        **kwargs)
 
 
 def get_netcdf(request, data, crs):
@@ -4,8 +4,24 @@
 # Copyright (c) 2017-2024 OWS Contributors
 # SPDX-License-Identifier: Apache-2.0
 
+import os
+import tempfile
+from typing import IO, Any, Iterator
+
+import dask
+import numpy
+import rasterio
+import xarray
+from rasterio.windows import Window
+
 from datacube_ows.ogc_exceptions import WCS1Exception, WCS2Exception
 
+# Size of the chunks GeoTIFF responses are streamed in.
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# MIME types of WCS formats whose renderers write chunked (dask-backed) coverage data one chunk at a time.
+CHUNKED_FORMATS = ("image/geotiff",)
+
 
 def get_bands_from_styles(styles, layer, version=1):
     styles = styles.split(",")
@@ -21,3 +37,139 @@ def get_bands_from_styles(styles, layer, version=1):
             if b not in style.flag_bands:
                 bands.add(b)
     return bands
+
+
+class BandStatistics:
+    """
+    Running band statistics, accumulated one block at a time (ignoring NaNs).
+
+    Blocks are combined with the parallel variance algorithm of Chan et al, so the standard
+    deviation is calculated without holding (or making a floating point copy of) the whole band.
+    """
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum: Any = None
+        self.maximum: Any = None
+
+    def add(self, block: numpy.ndarray) -> None:
+        if block.dtype.kind == "f":
+            block = block[~numpy.isnan(block)]
+        count = block.size
+        if not count:
+            return
+        block_min = block.min()
+        block_max = block.max()
+        self.minimum = block_min if self.minimum is None else min(self.minimum, block_min)
+        self.maximum = block_max if self.maximum is None else max(self.maximum, block_max)
+        block_mean = float(block.mean(dtype="float64"))
+        block_m2 = float(numpy.square(block - block_mean, dtype="float64").sum())
+        total = self.count + count
+        delta = block_mean - self.mean
+        self.m2 += block_m2 + delta * delta * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+
+    def tags(self) -> dict[str, Any]:
+        """
+        :return: GDAL statistics metadata tags for the band.
+        """
+        if not self.count:
+            return {
+                "STATISTICS_MINIMUM": numpy.nan,
+                "STATISTICS_MAXIMUM": numpy.nan,
+                "STATISTICS_MEAN": numpy.nan,
+                "STATISTICS_STDDEV": numpy.nan,
+            }
+        return {
+            "STATISTICS_MINIMUM": self.minimum,
+            "STATISTICS_MAXIMUM": self.maximum,
+            "STATISTICS_MEAN": self.mean,
+            "STATISTICS_STDDEV": numpy.sqrt(self.m2 / self.count),
+        }
+
+
+def _stream_file(f: IO[bytes], chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    try:
+        while chunk := f.read(chunk_size):
+            yield chunk
+    finally:
+        f.close()
+
+
+def _write_blocks(dst: rasterio.io.DatasetWriter, data: xarray.Dataset, dtype: str,
+                  statistics: list[BandStatistics] | None) -> None:
+    # Write in-memory data one GeoTIFF block at a time, converting each block to the output type.
+    for idx, band in enumerate(data.data_vars, start=1):
+        values = data[band].values
+        for _, window in dst.block_windows(idx):
+            block = values[window.toslices()].astype(dtype, copy=False)
+            dst.write(block, idx, window=window)
+            if statistics is not None:
+                statistics[idx - 1].add(block)
+
+
+def _write_chunks(dst: rasterio.io.DatasetWriter, data: xarray.Dataset, dtype: str,
+                  statistics: list[BandStatistics] | None) -> None:
+    # Compute and write dask-backed data one chunk at a time.  All bands of a chunk are computed together,
+    # so chunks that load several bands are only loaded once.
+    bands = [data[band].data for band in data.data_vars]
+    row_chunks, col_chunks = bands[0].chunks
+    row_off = 0
+    for i, height in enumerate(row_chunks):
+        col_off = 0
+        for j, width in enumerate(col_chunks):
+            blocks = dask.compute(*[band.blocks[i, j] for band in bands], scheduler="synchronous")
+            window = Window(col_off, row_off, width, height)
+            for idx, block in enumerate(blocks, start=1):
+                block = block.astype(dtype, copy=False)
+                dst.write(block, idx, window=window)
+                if statistics is not None:
+                    statistics[idx - 1].add(block)
+            col_off += width
+        row_off += height
+
+
+def write_geotiff(data: xarray.Dataset, dtype: str, band_labels: dict[str, str],
+                  statistics: bool = False, spool_dir: str | None = None, **profile: Any) -> Iterator[bytes]:
+    """
+    Write coverage data as a (tiled) GeoTIFF, returning an iterator suitable for a streamed Flask response.
+
+    Data is converted and written one block (tile or strip) at a time to a temporary file,
+    so no full-size copy of the data or in-memory copy of the encoded file is made.
+    Dask-backed data (as returned by DataStacker.chunked_data) is computed and written one
+    chunk at a time, so the whole coverage is never held in memory.
+    (GeoTIFF headers contain the offsets of every compressed block, so the file must be complete
+    before it can be sent.)  The temporary file is removed once it has been read.
+
+    :param data: The coverage data, without a time dimension.  Every data variable is written as a band,
+                 in order.  Arrays must have dimensions (y, x).
+    :param dtype: The output data type.
+    :param band_labels: Band descriptions, by data variable name.
+    :param statistics: If true, calculate band statistics and store them in the band metadata.
+    :param spool_dir: Directory to write the temporary file in.  Defaults to the system temporary directory.
+    :param profile: Rasterio creation profile: (width, height, transform, crs, nodata, and creation options.)
+    :return: An iterator of chunks of the GeoTIFF file.
+    """
+    fd, path = tempfile.mkstemp(suffix=".tif", dir=spool_dir)
+    os.close(fd)
+    try:
+        with rasterio.open(path, "w", driver="GTiff", count=len(data.data_vars), dtype=dtype, **profile) as dst:
+            stats = [BandStatistics() for _ in data.data_vars] if statistics else None
+            if data.chunks:
+                _write_chunks(dst, data, dtype, stats)
+            else:
+                _write_blocks(dst, data, dtype, stats)
+            for idx, band in enumerate(data.data_vars, start=1):
+                dst.set_band_description(idx, band_labels[str(band)])
+                if stats is not None:
+                    dst.update_tags(idx, **stats[idx - 1].tags())
+        f = open(path, "rb")
+    finally:
+        try:
+            # The open file remains readable after unlinking (on POSIX systems)
+            os.remove(path)
+        except OSError:
+            pass
+    return _stream_file(f)
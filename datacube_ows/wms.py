@@ -12,6 +12,7 @@ from datacube_ows.http_utils import cache_control_headers, get_service_base_url
 from datacube_ows.legend_generator import legend_graphic
 from datacube_ows.ogc_exceptions import WMSException
 from datacube_ows.ows_configuration import get_config
+from datacube_ows.tile_cache import cached_tile, wms_tile_key
 from datacube_ows.utils import log_call
 
 WMS_REQUESTS = ("GETMAP", "GETFEATUREINFO", "GETLEGENDGRAPHIC")
@@ -26,7 +27,7 @@ def handle_wms(nocase_args):
     elif operation == "GETCAPABILITIES":
         return get_capabilities(nocase_args)
     elif operation == "GETMAP":
-        return get_map(nocase_args)
+        return cached_tile(nocase_args, wms_tile_key, get_map)
     elif operation == "GETFEATUREINFO":
         return feature_info(nocase_args)
     elif operation == "GETLEGENDGRAPHIC":
@@ -18,6 +18,7 @@ from pytz import utc
 from rasterio.warp import Resampling
 
 from datacube_ows.config_utils import ConfigException
+from datacube_ows.encoders import ENCODERS
 from datacube_ows.ogc_exceptions import WMSException
 from datacube_ows.ogc_utils import create_geobox
 from datacube_ows.ows_configuration import OWSNamedLayer, get_config
@@ -412,7 +413,13 @@ class GetMapParameters(GetParameters):
         self.format = get_arg(args, "format", "image format",
                               errcode=WMSException.INVALID_FORMAT,
                               lower=True,
-                              permitted_values=["image/png"])
+                              permitted_values=list(ENCODERS))
+        self.encoder = self.layer.image_encoders.for_format(self.format)
+        if self.encoder is None:
+            raise WMSException(f"Format {self.format} is not supported by layer {self.layer.name}",
+                               WMSException.INVALID_FORMAT,
+                               locator="Format parameter",
+                               valid_keys=self.layer.image_encoders.formats)
 
         self.style = single_style_from_args(self.layer, args)
         cfg = get_config()
@@ -439,6 +446,20 @@ class GetMapParameters(GetParameters):
             request_bands=self.style.odc_needed_bands(),
         )
 
+    def expand_geobox(self, args):
+        """
+        Render over a larger area than requested (e.g. a WMTS metatile.)
+
+        The zoom factor and resource scale of the original request are retained, so zoom factor
+        and resource scale limits are applied as for the original request.  The dataset limit
+        applies to the datasets for the whole expanded area.
+
+        :param args: bbox, width and height arguments for the expanded render area.
+        """
+        self.geobox = _get_geobox(args, self.cfg.crs(self.crsid))
+        # Web-merc antimeridian hack may apply differently to the expanded area.
+        self.crs = self.geobox.crs
+
 
 class GetFeatureInfoParameters(GetParameters):
     def get_layer(self, args):
@@ -494,6 +515,11 @@ def cosine_of_solar_zenith(lat, lon, utc_dt):
 def solar_correct_data(data, dataset):
     # Apply solar angle correction to the data for a dataset.
     # See for example http://gsp.humboldt.edu/olm_2015/Courses/GSP_216_Online/lesson4-1/radiometric.html
+    return data / solar_correction_factor(dataset)
+
+
+def solar_correction_factor(dataset):
+    # The divisor for solar angle correction of the data for a dataset.
     native_x = (dataset.bounds.right + dataset.bounds.left) / 2.0
     native_y = (dataset.bounds.top + dataset.bounds.bottom) / 2.0
     pt = geom.point(native_x, native_y, dataset.crs)
@@ -501,9 +527,7 @@ def solar_correct_data(data, dataset):
     data_time = dataset.center_time.astimezone(utc)
     data_lon, data_lat = geo_pt.coords[0]
 
-    csz = cosine_of_solar_zenith(data_lat, data_lon, data_time)
-
-    return data / csz
+    return cosine_of_solar_zenith(data_lat, data_lon, data_time)
 
 
 def wofls_fuser(dest, src):
@@ -8,12 +8,16 @@ import logging
 
 from flask import render_template
 
-from datacube_ows.data import get_map
+from datacube_ows.data import get_map, render_map
 from datacube_ows.feature_info import feature_info
-from datacube_ows.http_utils import cache_control_headers, get_service_base_url
+from datacube_ows.http_utils import (cache_control_headers,
+                                     get_service_base_url, image_response)
 from datacube_ows.ogc_exceptions import WMSException, WMTSException
 from datacube_ows.ows_configuration import get_config
+from datacube_ows.query_profiler import QueryProfiler
+from datacube_ows.tile_cache import cache_response, cached_tile, wmts_tile_key
 from datacube_ows.utils import log_call
+from datacube_ows.wms_utils import GetMapParameters
 
 _LOG = logging.getLogger(__name__)
 
@@ -102,6 +106,19 @@ def get_capabilities(args):
     )
 
 
+def get_tile_matrix_set(cfg, identifier):
+    tms = cfg.tile_matrix_sets.get(identifier)
+    if not tms:
+        for _tms in cfg.tile_matrix_sets.values():
+            if identifier == _tms.wkss:
+                tms = _tms
+                break
+
+    if tms is None:
+        raise WMTSException("Invalid Tile Matrix Set: " + identifier)
+    return tms
+
+
 @log_call
 def wmts_args_to_wms(args, cfg):
     layer = args.get("layer")
@@ -127,15 +144,7 @@ def wmts_args_to_wms(args, cfg):
         "requestid": args["requestid"]
     }
 
-    tms = cfg.tile_matrix_sets.get(tileMatrixSet)
-    if not tms:
-        for _tms in cfg.tile_matrix_sets.values():
-            if tileMatrixSet == _tms.wkss:
-                tms = _tms
-                break
-
-    if tms is None:
-        raise WMTSException("Invalid Tile Matrix Set: " + tileMatrixSet)
+    tms = get_tile_matrix_set(cfg, tileMatrixSet)
 
     wms_args["crs"] = tms.crs_name
     crs_cfg = cfg.published_CRSs[tms.crs_name]
@@ -153,6 +162,12 @@ def wmts_args_to_wms(args, cfg):
         col = int(col)
     except ValueError:
         raise WMTSException(f"Invalid Tile Col: {col}")
+    if row < 0 or row >= 2 ** tms.height_exponent(tileMatrix):
+        raise WMTSException(f"Tile Row out of range: {row}", WMTSException.TILE_OUT_OF_RANGE,
+                            locator="TileRow parameter")
+    if col < 0 or col >= 2 ** tms.width_exponent(tileMatrix):
+        raise WMTSException(f"Tile Col out of range: {col}", WMTSException.TILE_OUT_OF_RANGE,
+                            locator="TileCol parameter")
     wms_args["bbox"] = "%f,%f,%f,%f" % tms.wms_bbox_coords(tileMatrix, row, col)
 
     # GetFeatureInfo only args
@@ -165,15 +180,21 @@ def wmts_args_to_wms(args, cfg):
     if args.get("ows_stats"):
         wms_args["ows_stats"] = "y"
 
-    return wms_args
+    return wms_args, tms
 
 
 @log_call
 def get_tile(args):
+    return cached_tile(args, wmts_tile_key, _render_tile)
+
+
+def _render_tile(args):
     cfg = get_config()
-    wms_args = wmts_args_to_wms(args, cfg)
+    wms_args, tms = wmts_args_to_wms(args, cfg)
 
     try:
+        if tms.metatile_size > 1 and cfg.tile_cache is not None and not args.get("ows_stats"):
+            return _render_metatile(args, wms_args, tms, cfg)
         return get_map(wms_args)
     except WMSException as wmse:
         first_error = wmse.errors[0]
@@ -186,10 +207,54 @@ def get_tile(args):
         raise e
 
 
+def _render_metatile(args, wms_args, tms, cfg):
+    # Render the whole metatile containing the requested tile in one pass, slice it into tiles
+    # and store the sibling tiles in the tile cache.
+    tile_matrix = int(args["tilematrix"])
+    row = int(args["tilerow"])
+    col = int(args["tilecol"])
+    meta_row, meta_col, n_rows, n_cols = tms.metatile(tile_matrix, row, col)
+    if n_rows == 1 and n_cols == 1:
+        # Metatiling not enabled (or the tile matrix is only one tile).
+        return get_map(wms_args)
+
+    params = GetMapParameters(wms_args)
+    width = params.geobox.width
+    height = params.geobox.height
+    params.expand_geobox({
+        "bbox": "%f,%f,%f,%f" % tms.wms_bbox_coords(tile_matrix, meta_row, meta_col, n_rows, n_cols),
+        "width": width * n_cols,
+        "height": height * n_rows,
+    })
+    qprof = QueryProfiler(False)
+    rendered = render_map(params, qprof, wms_args["requestid"], render_resource_limited=False)
+    if rendered.resource_limited:
+        # Zoom factor and resource scale limits are those of a single tile, but the dataset
+        # limit applies to the datasets for the whole metatile.  Nothing has been searched for
+        # or loaded beyond the dataset count, so fall back to rendering the requested tile alone,
+        # which counts (and searches for) the datasets over the single tile's area.
+        return get_map(wms_args)
+
+    headers = rendered.cache_headers()
+    response = None
+    for r in range(n_rows):
+        for c in range(n_cols):
+            window = (slice(r * height, (r + 1) * height), slice(c * width, (c + 1) * width))
+            tile_response = image_response(rendered.write(qprof, window), rendered.encoder.mime,
+                                           cfg=cfg, extra_headers=headers)
+            if (meta_row + r, meta_col + c) == (row, col):
+                # Requested tile is cached by the caller.
+                response = tile_response
+            else:
+                tile_args = dict(args, tilerow=str(meta_row + r), tilecol=str(meta_col + c))
+                cache_response(cfg.tile_cache, wmts_tile_key(tile_args, cfg), tile_response)
+    return response
+
+
 @log_call
 def get_feature_info(args):
     cfg = get_config()
-    wms_args = wmts_args_to_wms(args, cfg)
+    wms_args, _ = wmts_args_to_wms(args, cfg)
     wms_args["query_layers"] = wms_args["layers"]
 
     try:
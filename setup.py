@@ -23,7 +23,7 @@ install_requirements = [
     'matplotlib',
     'pyparsing',
     'antimeridian',
-    'numpy>=1.22',
+    'numpy>=1.24',
     'scipy',
     'Pillow>=10.2.0',
     'Babel',
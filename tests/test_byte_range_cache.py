@@ -0,0 +1,153 @@
+# This file is part of datacube-ows, part of the Open Data Cube project.
+# See https://opendatacube.org for more information.
+#
+# Copyright (c) 2017-2024 OWS Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+from unittest.mock import MagicMock
+
+import numpy
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+import datacube_ows.byte_range_cache
+from datacube_ows.byte_range_cache import (ByteRangeCache, DiskBlockStore,
+                                           parse_byte_range_cache)
+from datacube_ows.config_utils import ConfigException
+
+
+@pytest.fixture
+def cog(tmp_path):
+    path = str(tmp_path / "cog.tif")
+    with rasterio.open(path, "w", driver="GTiff", width=512, height=512, count=1, dtype="uint16",
+                       tiled=True, blockxsize=256, blockysize=256,
+                       crs="EPSG:4326", transform=from_origin(0, 10, 0.01, 0.01)) as dst:
+        dst.write(numpy.arange(512 * 512, dtype="uint16").reshape(1, 512, 512))
+    return path
+
+
+@pytest.fixture
+def fetches(cog, monkeypatch):
+    fetched = []
+
+    def fake_fetch_range(url, start, end):
+        fetched.append((url, start))
+        with open(cog, "rb") as f:
+            f.seek(start)
+            return f.read(end - start), os.path.getsize(cog)
+    monkeypatch.setattr(datacube_ows.byte_range_cache, "fetch_range", fake_fetch_range)
+    return fetched
+
+
+def test_parse_byte_range_cache(tmp_path):
+    assert parse_byte_range_cache(None) is None
+    cache = parse_byte_range_cache({})
+    assert isinstance(cache, ByteRangeCache)
+    assert cache.block_size == 64 * 1024
+    assert cache.directory is None
+    cache = parse_byte_range_cache({"directory": str(tmp_path / "cache"), "max_size": 1000})
+    assert cache.max_disk_size == 10000
+    assert os.path.isdir(tmp_path / "cache")
+    with pytest.raises(ConfigException) as e:
+        parse_byte_range_cache({"max_size": "lots"})
+    assert "must be integers" in str(e.value)
+    with pytest.raises(ConfigException) as e:
+        parse_byte_range_cache({"block_size": 0})
+    assert "must be positive" in str(e.value)
+
+
+def test_parse_byte_range_cache_untested_rasterio(monkeypatch):
+    # Relies on a private rasterio API, so is disabled for untested rasterio versions.
+    monkeypatch.setattr(rasterio, "__version__", "1.5.0")
+    assert parse_byte_range_cache({}) is None
+
+
+def test_cached_read(cog, fetches):
+    cache = ByteRangeCache({"block_size": 4096})
+    with open(cog, "rb") as f:
+        raw = f.read()
+    assert cache.size("key", "url") == len(raw)
+    assert cache.read("key", "url", 4000, 200) == raw[4000:4200]
+    assert cache.read("key", "url", len(raw) - 10, 100) == raw[-10:]
+    n_fetches = len(fetches)
+    assert cache.read("key", "url", 100, 5000) == raw[100:5100]
+    assert len(fetches) == n_fetches
+
+
+def test_cached_read_past_eof(cog, fetches):
+    with open(cog, "rb") as f:
+        raw = f.read()
+    # Block size that divides the file size exactly, so reads past EOF would start a new block.
+    block_size = next(bs for bs in range(4096, 0, -1) if len(raw) % bs == 0)
+    cache = ByteRangeCache({"block_size": block_size})
+    assert cache.read("key", "url", len(raw) - 10, 100) == raw[-10:]
+    assert cache.read("key", "url", len(raw), 100) == b""
+    assert cache.read("key", "url", len(raw) + 100, 100) == b""
+    assert all(start < len(raw) for _, start in fetches)
+
+
+def test_s3_custom_endpoint_not_cached(monkeypatch):
+    cache = ByteRangeCache({})
+    monkeypatch.delenv("AWS_S3_ENDPOINT", raising=False)
+    monkeypatch.delenv("AWS_HTTPS", raising=False)
+    monkeypatch.delenv("AWS_VIRTUAL_HOSTING", raising=False)
+    with cache.patch_url(None) as patch_url:
+        assert patch_url("s3://bucket/cog.tif").startswith("/vsi")
+    monkeypatch.setenv("AWS_S3_ENDPOINT", "minio.example.com:9000")
+    with cache.patch_url(None) as patch_url:
+        assert patch_url("s3://bucket/cog.tif") == "s3://bucket/cog.tif"
+        assert patch_url("https://example.com/cog.tif").startswith("/vsi")
+
+
+def test_patch_url_shares_cache_across_signed_urls(cog, fetches):
+    cache = ByteRangeCache({"block_size": 16 * 1024})
+    url = "https://example.com/data/cog.tif"
+    n_fetches = 0
+    for sig in ("sig1", "sig2"):
+        with cache.patch_url(lambda u: f"{u}?sig={sig}") as patch_url:
+            path = patch_url(url)
+            assert path.startswith("/vsi")
+            assert patch_url(url) == path
+            # Non-remote URLs are not cached.
+            assert patch_url("file:///data/cog.tif") == "file:///data/cog.tif?sig=" + sig
+            with rasterio.open(path) as src:
+                data = src.read(1)
+        assert (data == numpy.arange(512 * 512, dtype="uint16").reshape(512, 512)).all()
+        if sig == "sig1":
+            n_fetches = len(fetches)
+            assert {u for u, _ in fetches} == {url + "?sig=sig1"}
+    # Second read is served entirely from cache
+    assert len(fetches) == n_fetches
+
+
+def test_disk_block_store(tmp_path, cog, fetches):
+    store = DiskBlockStore(str(tmp_path / "blocks"), 100)
+    assert store.get(("url", 0)) is None
+    store.put(("url", 0), b"x" * 20)
+    assert store.get(("url", 0)) == b"x" * 20
+    for i in range(1, 10):
+        store.put(("url", i), b"y" * 20)
+    store.prune()
+    assert sum(e.stat().st_size for e in os.scandir(tmp_path / "blocks")) <= 100
+    # Disk store shared between caches (e.g. in different processes)
+    cache_dir = str(tmp_path / "shared")
+    ByteRangeCache({"block_size": 4096, "directory": cache_dir}).read("key", "url", 0, 10000)
+    n_fetches = len(fetches)
+    cache = ByteRangeCache({"block_size": 4096, "directory": cache_dir})
+    cache.read("key", "url", 0, 10000)
+    assert len(fetches) == n_fetches
+
+
+def test_fetch_range_http(monkeypatch):
+    session = MagicMock()
+    session.get.return_value.status_code = 206
+    session.get.return_value.content = b"abcd"
+    session.get.return_value.headers = {"Content-Range": "bytes 4-7/100"}
+    monkeypatch.setattr(datacube_ows.byte_range_cache._local, "session", session, raising=False)
+    assert datacube_ows.byte_range_cache.fetch_range("https://example.com/f.tif", 4, 8) == (b"abcd", 100)
+    assert session.get.call_args.kwargs["headers"] == {"Range": "bytes=4-7"}
+    session.get.return_value.status_code = 200
+    session.get.return_value.content = b"0123456789"
+    assert datacube_ows.byte_range_cache.fetch_range("https://example.com/f.tif", 4, 8) == (b"4567", 10)
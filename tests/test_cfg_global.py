@@ -274,3 +274,61 @@ def test_bad_integers_in_wms_section(minimal_global_raw_cfg):
         cfg = OWSConfig(cfg=minimal_global_raw_cfg)
     assert "caps_cache_maxage in wms section cannot be negative" in str(e.value)
     assert "-100" in str(e.value)
+
+
+def test_bad_max_load_threads(minimal_global_raw_cfg):
+    OWSConfig._instance = None
+    minimal_global_raw_cfg["global"]["max_load_threads"] = 0
+    with pytest.raises(ConfigException) as e:
+        cfg = OWSConfig(cfg=minimal_global_raw_cfg)
+    assert "max_load_threads must be a positive integer" in str(e.value)
+
+
+def test_float32_processing(minimal_global_raw_cfg):
+    OWSConfig._instance = None
+    cfg = OWSConfig(cfg=minimal_global_raw_cfg)
+    assert not cfg.float32_processing
+    OWSConfig._instance = None
+    minimal_global_raw_cfg["global"]["float32_processing"] = True
+    cfg = OWSConfig(cfg=minimal_global_raw_cfg)
+    assert cfg.float32_processing
+
+
+def test_gdal_environment(minimal_global_raw_cfg):
+    OWSConfig._instance = None
+    cfg = OWSConfig(cfg=minimal_global_raw_cfg)
+    assert cfg.gdal_environment is None
+    OWSConfig._instance = None
+    minimal_global_raw_cfg["global"]["gdal_environment"] = {
+        "block_cache_size": 1024 * 1024,
+        "options": {"GDAL_HTTP_MAX_RETRY": "3", "GDAL_HTTP_VERSION": "1.1"},
+    }
+    cfg = OWSConfig(cfg=minimal_global_raw_cfg)
+    opts = cfg.gdal_environment.gdal_options()
+    assert opts["GDAL_DISABLE_READDIR_ON_OPEN"] == "EMPTY_DIR"
+    assert opts["GDAL_HTTP_MULTIPLEX"] == "YES"
+    assert opts["GDAL_HTTP_VERSION"] == "1.1"
+    assert opts["GDAL_HTTP_MAX_RETRY"] == "3"
+    assert opts["CPL_VSIL_CURL_CACHE_SIZE"] == str(64 * 1024 * 1024)
+    assert opts["GDAL_CACHEMAX"] == str(1024 * 1024)
+    OWSConfig._instance = None
+    minimal_global_raw_cfg["global"]["gdal_environment"] = {
+        "vsi_cache_size": None,
+        "http_multiplex": False,
+        "disable_readdir_on_open": False,
+    }
+    cfg = OWSConfig(cfg=minimal_global_raw_cfg)
+    assert cfg.gdal_environment.gdal_options() == {}
+
+
+def test_bad_gdal_environment(minimal_global_raw_cfg):
+    OWSConfig._instance = None
+    minimal_global_raw_cfg["global"]["gdal_environment"] = {"vsi_cache_size": -1}
+    with pytest.raises(ConfigException) as e:
+        cfg = OWSConfig(cfg=minimal_global_raw_cfg)
+    assert "vsi_cache_size in gdal_environment section must be a positive integer" in str(e.value)
+    OWSConfig._instance = None
+    minimal_global_raw_cfg["global"]["gdal_environment"] = {"options": ["GDAL_CACHEMAX"]}
+    with pytest.raises(ConfigException) as e:
+        cfg = OWSConfig(cfg=minimal_global_raw_cfg)
+    assert "options in gdal_environment section must be a dictionary" in str(e.value)
@@ -444,6 +444,66 @@ def test_resource_limit_checks(minimal_layer_cfg, minimal_global_cfg):
     assert "too much projected resource requirements" in str(e.value)
 
 
+def test_resource_limit_wcs_chunking(minimal_layer_cfg, minimal_global_cfg):
+    minimal_layer_cfg["resource_limits"] = {
+        "wcs": {"max_image_size": 100 * 100 * 32, "chunk_size": 256, "max_chunked_image_size": 1000 * 1000 * 32},
+    }
+    lyr = parse_ows_layer(minimal_layer_cfg,
+                          global_cfg=minimal_global_cfg)
+    assert not lyr.resource_limits.chunk_wcs(height=200, width=256, n_dates=1)
+    assert lyr.resource_limits.chunk_wcs(height=200, width=640, n_dates=1)
+    assert not lyr.resource_limits.chunk_wcs(height=200, width=640, n_dates=2)
+    lyr.resource_limits.check_wcs(n_datasets=9, width=640, height=480, pixel_size=64, n_dates=1, chunked=True)
+    with pytest.raises(ResourceLimited) as e:
+        lyr.resource_limits.check_wcs(n_datasets=9, width=640, height=480, pixel_size=64, n_dates=1)
+    assert "too much data" in str(e.value)
+    with pytest.raises(ResourceLimited) as e:
+        lyr.resource_limits.check_wcs(n_datasets=9, width=6400, height=4800, pixel_size=64, n_dates=1,
+                                      chunked=True)
+    assert "too much data" in str(e.value)
+    # Chunked requests default to the unchunked size limit
+    del minimal_layer_cfg["resource_limits"]["wcs"]["max_chunked_image_size"]
+    minimal_global_cfg.layer_index = {}
+    lyr = parse_ows_layer(minimal_layer_cfg,
+                          global_cfg=minimal_global_cfg)
+    assert lyr.resource_limits.max_chunked_image_size_wcs == 100 * 100 * 32
+    with pytest.raises(ResourceLimited) as e:
+        lyr.resource_limits.check_wcs(n_datasets=9, width=640, height=480, pixel_size=64, n_dates=1,
+                                      chunked=True)
+    assert "too much data" in str(e.value)
+    minimal_layer_cfg["resource_limits"]["wcs"]["chunk_size"] = 0
+    minimal_global_cfg.layer_index = {}
+    with pytest.raises(ConfigException) as excinfo:
+        parse_ows_layer(minimal_layer_cfg,
+                        global_cfg=minimal_global_cfg)
+    assert "chunk_size must be a positive integer" in str(excinfo.value)
+
+
+def test_resource_limit_overviews(minimal_layer_cfg, minimal_global_cfg):
+    minimal_layer_cfg["resource_limits"] = {
+        "wms": {"min_zoom_level": 5, "overview_factors": [2, 4, 8]},
+    }
+    lyr = parse_ows_layer(minimal_layer_cfg,
+                          global_cfg=minimal_global_cfg)
+    assert lyr.resource_limits.overview_factors == [2, 4, 8]
+    mock_req_scale = MagicMock()
+    mock_req_scale.overview_factor.return_value = 8
+    mock_req_scale.overview_adjusted_zoom_level.return_value = 5.5
+    mock_req_scale.load_adjusted_zoom_level = 2.5
+    lyr.resource_limits.check_wms(n_datasets=9, zoom_factor=100.0, request_scale=mock_req_scale)
+    mock_req_scale.overview_adjusted_zoom_level.assert_called_with([2, 4, 8])
+    mock_req_scale.overview_adjusted_zoom_level.return_value = 4.5
+    with pytest.raises(ResourceLimited) as e:
+        lyr.resource_limits.check_wms(n_datasets=9, zoom_factor=100.0, request_scale=mock_req_scale)
+    assert "too much projected resource requirements" in str(e.value)
+    for bad in ([4, 2], [1, 2], [2, 2], 4, [2.5]):
+        minimal_layer_cfg["resource_limits"]["wms"]["overview_factors"] = bad
+        minimal_global_cfg.layer_index = {}
+        with pytest.raises(ConfigException) as excinfo:
+            parse_ows_layer(minimal_layer_cfg, global_cfg=minimal_global_cfg)
+        assert "overview_factors must be a list of increasing integers" in str(excinfo.value)
+
+
 
 def test_manual_merge(minimal_layer_cfg, minimal_global_cfg):
     minimal_layer_cfg["image_processing"]["manual_merge"] = True
@@ -8,7 +8,9 @@ from unittest.mock import MagicMock
 
 import pytest
 
+import datacube_ows.wmts
 from datacube_ows.config_utils import ConfigException
+from datacube_ows.ogc_exceptions import WMTSException
 from datacube_ows.tile_matrix_sets import TileMatrixSet
 
 
@@ -180,3 +182,79 @@ def test_tms_wms_bbox(wwwm_tms_cfg, tmsmin_global_cfg):
     assert a == pytest.approx(9705668.103538, 0.001)
     assert d == pytest.approx(-12210356.64638, 0.001)
     assert c == pytest.approx(10018754.17139, 0.001)
+    a, b, c, d = tms.wms_bbox_coords(7, 32, 24, n_rows=2, n_cols=3)
+    assert b == pytest.approx(-12523442.7142, 0.001)
+    assert a == pytest.approx(9705668.103538 - 313086.0675, 0.001)
+    assert d == pytest.approx(-12523442.7142 + 3 * 313086.0675, 0.001)
+    assert c == pytest.approx(10018754.17139, 0.001)
+
+
+def test_tms_metatile(wwwm_tms_cfg, tmsmin_global_cfg):
+    tms = TileMatrixSet("test", wwwm_tms_cfg, tmsmin_global_cfg)
+    assert tms.metatile_size == 1
+    assert tms.metatile(7, 33, 25) == (33, 25, 1, 1)
+    wwwm_tms_cfg["metatile_size"] = 4
+    tms = TileMatrixSet("test", wwwm_tms_cfg, tmsmin_global_cfg)
+    assert tms.metatile(7, 33, 25) == (32, 24, 4, 4)
+    assert tms.metatile(7, 127, 126) == (124, 124, 4, 4)
+    # Clipped to the edges of the tile matrix
+    assert tms.metatile(1, 1, 0) == (0, 0, 2, 2)
+    assert tms.metatile(0, 0, 0) == (0, 0, 1, 1)
+
+
+def test_render_metatile_matrix_edge(wwwm_tms_cfg, tmsmin_global_cfg, monkeypatch):
+    wwwm_tms_cfg["metatile_size"] = 4
+    tms = TileMatrixSet("test", wwwm_tms_cfg, tmsmin_global_cfg)
+    tmsmin_global_cfg.tile_matrix_sets = {"test": tms}
+    args = {
+        "layer": "a_layer", "style": "", "format": "image/png", "tilematrixset": "test",
+        "tilematrix": "7", "tilerow": "130", "tilecol": "25", "requestid": "abc",
+    }
+    with pytest.raises(WMTSException) as excinfo:
+        datacube_ows.wmts.wmts_args_to_wms(args, tmsmin_global_cfg)
+    assert excinfo.value.errors[0]["code"] == WMTSException.TILE_OUT_OF_RANGE
+    assert excinfo.value.errors[0]["locator"] == "TileRow parameter"
+    args["tilerow"] = "33"
+    args["tilecol"] = "-1"
+    with pytest.raises(WMTSException) as excinfo:
+        datacube_ows.wmts.wmts_args_to_wms(args, tmsmin_global_cfg)
+    assert excinfo.value.errors[0]["locator"] == "TileCol parameter"
+
+    # A metatile clipped down to a single tile is rendered alone.
+    monkeypatch.setattr(datacube_ows.wmts, "get_map", lambda wms_args: "single tile")
+    monkeypatch.setattr(datacube_ows.wmts, "GetMapParameters", MagicMock(side_effect=AssertionError))
+    args["tilematrix"] = "0"
+    args["tilerow"] = "0"
+    args["tilecol"] = "0"
+    wms_args, wms_tms = datacube_ows.wmts.wmts_args_to_wms(args, tmsmin_global_cfg)
+    assert wms_tms is tms
+    assert datacube_ows.wmts._render_metatile(args, wms_args, tms, tmsmin_global_cfg) == "single tile"
+
+
+def test_render_metatile_resource_limited(wwwm_tms_cfg, tmsmin_global_cfg, monkeypatch):
+    wwwm_tms_cfg["metatile_size"] = 4
+    tms = TileMatrixSet("test", wwwm_tms_cfg, tmsmin_global_cfg)
+    args = {
+        "layer": "a_layer", "style": "", "format": "image/png", "tilematrixset": "test",
+        "tilematrix": "7", "tilerow": "33", "tilecol": "25", "requestid": "abc",
+    }
+    render_map = MagicMock()
+    render_map.return_value.resource_limited = True
+    monkeypatch.setattr(datacube_ows.wmts, "render_map", render_map)
+    monkeypatch.setattr(datacube_ows.wmts, "GetMapParameters", MagicMock())
+    get_map = MagicMock(return_value="single tile")
+    monkeypatch.setattr(datacube_ows.wmts, "get_map", get_map)
+    wms_args = {"requestid": "abc"}
+    assert datacube_ows.wmts._render_metatile(args, wms_args, tms, tmsmin_global_cfg) == "single tile"
+    # The metatile is only checked against resource limits, not rendered, before falling back.
+    assert render_map.call_args.kwargs["render_resource_limited"] is False
+    # The fallback renders the requested tile alone, from the original (single tile) arguments.
+    get_map.assert_called_once_with(wms_args)
+
+
+def test_tms_metatile_size(wwwm_tms_cfg, tmsmin_global_cfg):
+    for bad in (0, -2, 2.5, "four"):
+        wwwm_tms_cfg["metatile_size"] = bad
+        with pytest.raises(ConfigException) as excinfo:
+            TileMatrixSet("test", wwwm_tms_cfg, tmsmin_global_cfg)
+        assert "metatile size" in str(excinfo.value)
@@ -5,18 +5,30 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import datetime
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from unittest.mock import MagicMock
 
 import numpy as np
 import pytest
+from affine import Affine
+from odc.geo.geobox import GeoBox
 from odc.geo.geom import polygon
-from xarray import Dataset
+from PIL import Image
+from xarray import DataArray, Dataset
 
 import datacube_ows.data
 import datacube_ows.feature_info
+from datacube_ows.config_utils import ConfigException
+from datacube_ows.encoders import ImageEncoders, indexed_image
 from datacube_ows.feature_info import get_s3_browser_uris
-from datacube_ows.loading import DataStacker, ProductBandQuery
+from datacube_ows.loading import DataStacker, ProductBandQuery, load_executor
 from datacube_ows.ogc_exceptions import WMSException
+from datacube_ows.ows_configuration import LoadingCfg
+from datacube_ows.query_profiler import QueryProfiler
+from datacube_ows.resource_limits import ResourceLimited
 from tests.test_styles import product_layer  # noqa: F401
 
 
@@ -324,3 +336,499 @@ def test_create_nodata(dummy_raw_calc_data):
     with pytest.raises(WMSException) as e:
         data_out = ds.create_nodata_filled_flag_bands(Dataset(), pbq)
     assert "Cannot add default flag data as there is no non-flag data available" in str(e.value)
+
+
+def test_rendered_map_window():
+    params = MagicMock()
+    params.geobox = GeoBox((512, 512), Affine(10.0, 0.0, 0.0, 0.0, -10.0, 5120.0), "EPSG:3857")
+    params.style.get_multi_date_handler.return_value = None
+    params.layer.image_encoders = ImageEncoders({})
+    qprof = QueryProfiler(False)
+    window = (slice(256, 512), slice(0, 256))
+
+    rendered = datacube_ows.data.RenderedMap(params, 0)
+    img = Image.open(BytesIO(rendered.write(qprof, window)))
+    assert img.size == (256, 256)
+
+    coords = params.geobox.coordinates
+    red = np.zeros((512, 512), dtype="uint8")
+    red[256:, :256] = 200
+    img_data = Dataset({
+        band: DataArray(red if band == "red" else np.full((512, 512), 255, dtype="uint8"),
+                        coords={"y": coords["y"].values, "x": coords["x"].values},
+                        dims=["y", "x"])
+        for band in ("red", "green", "blue", "alpha")
+    })
+    rendered = datacube_ows.data.RenderedMap(params, 3, img_data=img_data)
+    img = Image.open(BytesIO(rendered.write(qprof, window)))
+    assert img.size == (256, 256)
+    assert img.convert("RGBA").getpixel((0, 0)) == (200, 255, 255, 255)
+    img = Image.open(BytesIO(rendered.write(qprof)))
+    assert img.size == (512, 512)
+    assert img.convert("RGBA").getpixel((0, 0)) == (0, 255, 255, 255)
+    # Paletted image
+    index = np.zeros((1, 512, 512), dtype="uint8")
+    index[0, 256:, :256] = 1
+    index[0, 300, 10] = 2
+    palette = np.array([[0, 0, 0, 0], [200, 255, 255, 255], [1, 2, 3, 255]], dtype="uint8")
+    img_data = indexed_image(DataArray(index, dims=["time", "y", "x"],
+                                       coords={"time": [datetime.datetime(2020, 1, 1)],
+                                               "y": coords["y"].values, "x": coords["x"].values}),
+                             palette)
+    rendered = datacube_ows.data.RenderedMap(params, 3, img_data=img_data)
+    img = Image.open(BytesIO(rendered.write(qprof, window)))
+    assert img.mode == "P"
+    assert img.size == (256, 256)
+    assert img.convert("RGBA").getpixel((0, 0)) == (200, 255, 255, 255)
+    assert img.convert("RGBA").getpixel((10, 44)) == (1, 2, 3, 255)
+
+
+def test_rendered_map_format():
+    params = MagicMock()
+    params.geobox = GeoBox((64, 64), Affine(10.0, 0.0, 0.0, 0.0, -10.0, 640.0), "EPSG:3857")
+    params.style.get_multi_date_handler.return_value = None
+    params.layer.image_encoders = ImageEncoders({"formats": ["image/png", "image/jpeg", "image/webp"]})
+    params.format = "image/jpeg"
+    qprof = QueryProfiler(False)
+    rendered = datacube_ows.data.RenderedMap(params, 0)
+    assert rendered.encoder.mime == "image/jpeg"
+    img = Image.open(BytesIO(rendered.write(qprof)))
+    assert img.format == "JPEG"
+    assert img.size == (64, 64)
+
+    coords = params.geobox.coordinates
+    img_data = Dataset({
+        band: DataArray(np.full((64, 64), 100, dtype="uint8"),
+                        coords={"y": coords["y"].values, "x": coords["x"].values},
+                        dims=["y", "x"])
+        for band in ("red", "green", "blue")
+    })
+    params.format = "image/webp"
+    rendered = datacube_ows.data.RenderedMap(params, 3, img_data=img_data)
+    img = Image.open(BytesIO(rendered.write(qprof)))
+    assert img.format == "WEBP"
+    # Animation is only supported for PNG - rejected before any search or load.
+    params.times = [datetime.date(2020, 1, 1), datetime.date(2020, 1, 2)]
+    params.style.get_multi_date_handler.return_value.animate = True
+    params.encoder.mime = "image/webp"
+    with pytest.raises(WMSException) as e:
+        datacube_ows.data.render_map(params, qprof)
+    assert "only supported in image/png format" in str(e.value)
+
+
+def test_rendered_map_animation():
+    params = MagicMock()
+    params.geobox = GeoBox((64, 64), Affine(10.0, 0.0, 0.0, 0.0, -10.0, 640.0), "EPSG:3857")
+    params.layer.image_encoders = ImageEncoders({"png": {"stream_animation": True}})
+    params.style.get_multi_date_handler.return_value.frame_duration = 300
+    params.style.count_dates.return_value = 2
+    coords = params.geobox.coordinates
+    data = Dataset({"band": DataArray(np.zeros((2, 64, 64)), dims=["time", "y", "x"],
+                                      coords={"time": [datetime.datetime(2020, 1, 1), datetime.datetime(2021, 1, 1)],
+                                              "y": coords["y"].values, "x": coords["x"].values})})
+
+    def frames(data, mask):
+        assert data.sizes["y"] == 32
+        for idx in range(2):
+            yield Dataset({
+                band: DataArray(np.full((32, 64), idx * 100, dtype="uint8"),
+                                coords={"y": data.y.values, "x": data.x.values},
+                                dims=["y", "x"])
+                for band in ("red", "green", "blue")
+            })
+    params.style.transform_data_frames.side_effect = frames
+    rendered = datacube_ows.data.RenderedMap(params, 3, animation=(data, None))
+    assert rendered.streamable
+    img = Image.open(BytesIO(rendered.write(QueryProfiler(False), (slice(0, 32), slice(0, 64)))))
+    assert img.n_frames == 2
+    assert img.size == (64, 32)
+    img.seek(1)
+    assert img.info["duration"] == 300
+    assert img.convert("RGBA").getpixel((0, 0)) == (100, 100, 100, 255)
+
+
+def test_apply_style_paletted():
+    style = MagicMock()
+    qprof = QueryProfiler(True)
+    assert datacube_ows.data._apply_style("data", style, "mask", qprof) is style.transform_data.return_value
+    style.transform_data_indexed.assert_not_called()
+    assert datacube_ows.data._apply_style("data", style, "mask", qprof,
+                                          paletted=True) is style.transform_data_indexed.return_value
+    assert qprof.profile()["info"]["paletted"]
+    style.transform_data_indexed.return_value = None
+    assert datacube_ows.data._apply_style("data", style, "mask", qprof,
+                                          paletted=True) is style.transform_data.return_value
+
+
+def test_render_map_resource_limited_unrendered(monkeypatch):
+    # The WMTS metatile fallback: a request over the dataset limit is returned before any search or load.
+    params = MagicMock()
+    params.times = [datetime.date(2020, 1, 1)]
+    params.layer.resource_limits.overview_factors = None
+    params.layer.resource_limits.check_wms.side_effect = ResourceLimited(["too many datasets"])
+    stacker = MagicMock()
+    stacker.n_datasets.return_value = 500
+    monkeypatch.setattr(datacube_ows.data, "DataStacker", MagicMock(return_value=stacker))
+    qprof = QueryProfiler(True)
+    rendered = datacube_ows.data.render_map(params, qprof, render_resource_limited=False)
+    assert rendered.resource_limited
+    assert rendered.n_datasets == 500
+    # Limits are checked against the dataset count for the rendered area and the request's own zoom and scale.
+    params.layer.resource_limits.check_wms.assert_called_once_with(500, params.zf, params.resources)
+    assert qprof.profile()["info"]["resource_limited"]
+    stacker.datasets.assert_not_called()
+    stacker.data.assert_not_called()
+    stacker.extent.assert_not_called()
+
+
+def test_datastacker_search_memo(monkeypatch):
+    layer = MagicMock()
+    index = layer.ows_index.return_value
+    datasets = [MagicMock(), MagicMock()]
+    datasets[0].id = "id1"
+    datasets[1].id = "id2"
+    index.ds_search.return_value = iter(datasets)
+    ds = DataStacker.__new__(DataStacker)
+    ds._layer = layer
+    ds.cfg = MagicMock()
+    ds.cfg.dataset_search_cache = None
+    ds._geobox = MagicMock()
+    ds._times = [datetime.date(2020, 1, 1)]
+    ds._needed_bands = ["band1"]
+    ds.style = None
+    ds.group_by = MagicMock()
+    ds.resource_limited = False
+    ds._ds_cache = {}
+    # Count, ids and datasets all come from a single index search.
+    assert ds.n_datasets() == 2
+    assert list(ds.dsids().values()) == [["id1", "id2"]]
+    query = ProductBandQuery.simple_layer_query(layer, ["band1"])
+    assert ds._query_datasets(query) == datasets
+    index.ds_search.assert_called_once()
+    index.count.assert_not_called()
+    index.dsid_search.assert_not_called()
+    index.ds_get.assert_not_called()
+    # As does the extent
+    ext = MagicMock()
+    monkeypatch.setattr("datacube_ows.loading.datasets_extent", MagicMock(return_value=ext))
+    ext.intersection.return_value.is_empty = False
+    assert ds.extent() is ext.intersection.return_value
+    index.extent.assert_not_called()
+
+
+def test_datastacker_search_cache_memo():
+    layer = MagicMock()
+    index = layer.ows_index.return_value
+    datasets = [MagicMock(), MagicMock()]
+    ds = DataStacker.__new__(DataStacker)
+    ds._layer = layer
+    ds.cfg = MagicMock()
+    ds.cfg.dataset_search_cache.search.return_value = datasets
+    ds._geobox = MagicMock()
+    ds._times = [datetime.date(2020, 1, 1)]
+    ds._needed_bands = ["band1"]
+    ds.style = None
+    ds.group_by = MagicMock()
+    ds.resource_limited = False
+    ds._ds_cache = {}
+    assert ds.n_datasets() == 2
+    query = ProductBandQuery.simple_layer_query(layer, ["band1"])
+    assert ds._query_datasets(query) == datasets
+    ds.cfg.dataset_search_cache.search.assert_called_once()
+    index.ds_search.assert_not_called()
+
+
+def test_load_executor():
+    cfg = MagicMock()
+    cfg.max_load_threads = 1
+    assert load_executor(cfg) is None
+    assert load_executor(MagicMock()) is None
+    cfg.max_load_threads = 2
+    executor = load_executor(cfg)
+    assert executor is not None
+    assert load_executor(cfg) is executor
+
+
+def test_datastacker_concurrent_load():
+    layer = MagicMock()
+    layer.loading = LoadingCfg({}, "test")
+    ds = DataStacker.__new__(DataStacker)
+    ds._layer = layer
+    ds.cfg = MagicMock()
+    ds.cfg.max_load_threads = 2
+    ds._geobox = MagicMock()
+    ds._resampling = "nearest"
+    times = np.array(["2020-01-01", "2020-01-02", "2020-01-03"], dtype="datetime64[ns]")
+    datasets = DataArray(np.empty(3, dtype=object), coords={"time": times}, dims=["time"])
+
+    def read_data(dss, measurements, geobox, resampling="nearest", fuse_func=None):
+        return Dataset({"band1": DataArray(dss.time.values.astype("int64"), coords={"time": dss.time.values}, dims=["time"])})
+
+    ds.read_data = read_data
+    query = ProductBandQuery.simple_layer_query(layer, ["band1"])
+    data = ds.data({query: datasets})
+    assert list(data.time.values) == list(times)
+    assert list(data["band1"].values) == list(times.astype("int64"))
+
+
+def test_layer_load_executor():
+    cfg = MagicMock()
+    cfg.max_load_threads = 1
+    layer = MagicMock()
+    layer.name = "concurrent_layer"
+    layer.loading = LoadingCfg({"concurrency": 3}, "test")
+    executor = load_executor(cfg, layer)
+    assert executor is not None
+    assert executor is load_executor(cfg, layer)
+    assert executor is not load_executor(cfg)
+    layer.loading = LoadingCfg({"concurrency": 1}, "test")
+    assert load_executor(cfg, layer) is None
+    with pytest.raises(ConfigException) as e:
+        LoadingCfg({"concurrency": 0}, "test")
+    assert "loading concurrency must be a positive integer" in str(e.value)
+    with pytest.raises(ConfigException) as e:
+        LoadingCfg({"timeout": -1}, "test")
+    assert "loading timeout must be a positive number" in str(e.value)
+
+
+def test_datastacker_split_bands_and_timeout():
+    layer = MagicMock()
+    layer.name = "split_layer"
+    layer.float32_processing = False
+    layer.loading = LoadingCfg({"concurrency": 4, "split_bands": True, "timeout": 0.5}, "test")
+    ds = DataStacker.__new__(DataStacker)
+    ds._layer = layer
+    ds.cfg = MagicMock()
+    ds._geobox = MagicMock()
+    ds._resampling = "nearest"
+    times = np.array(["2020-01-01", "2020-01-02"], dtype="datetime64[ns]")
+    datasets = DataArray(np.empty(2, dtype=object), coords={"time": times}, dims=["time"])
+    reads = []
+
+    def read_data(dss, measurements, geobox, resampling="nearest", fuse_func=None):
+        reads.append(tuple(measurements))
+        return Dataset({
+            band: DataArray(dss.time.values.astype("int64") + i, coords={"time": dss.time.values}, dims=["time"])
+            for i, band in enumerate(measurements)
+        })
+
+    ds.read_data = read_data
+    query = ProductBandQuery.simple_layer_query(layer, ["band1", "band2"])
+    query.products[0].lookup_measurements.return_value = {"band1": MagicMock(), "band2": MagicMock()}
+    data = ds.data({query: datasets})
+    assert sorted(reads) == [("band1",), ("band1",), ("band2",), ("band2",)]
+    assert list(data.time.values) == list(times)
+    assert list(data["band2"].values) == list(times.astype("int64"))
+
+    def slow_read_data(*args, **kwargs):
+        time.sleep(1.5)
+        return read_data(*args, **kwargs)
+
+    ds.read_data = slow_read_data
+    with pytest.raises(WMSException) as e:
+        ds.data({query: datasets})
+    assert "Timed out loading data for layer split_layer" in str(e.value.errors)
+    assert e.value.http_response == 504
+
+
+def test_manual_data_stack(monkeypatch):
+    from datacube_ows.ogc_utils import mask_by_val
+    layer = MagicMock()
+    layer.extent_mask_func = [mask_by_val]
+    layer.solar_correction = False
+    ds = DataStacker.__new__(DataStacker)
+    ds._layer = layer
+    ds.cfg = MagicMock()
+    ds.cfg.max_load_threads = 1
+    ds._geobox = MagicMock()
+    ds.style = MagicMock()
+    ds.style.flag_bands = {"pq"}
+    time = np.array(["2020-01-01"], dtype="datetime64[ns]")
+    scenes = [MagicMock(), MagicMock()]
+    datasets_arr = np.empty(1, dtype=object)
+    datasets_arr[0] = tuple(scenes)
+    datasets = DataArray(datasets_arr, coords={"time": time}, dims=["time"])
+    loaded = {
+        id(scenes[0]): ([[-999, 1], [2, -999]], [[0, 1], [1, 0]]),
+        id(scenes[1]): ([[5, 6], [7, -999]], [[2, 2], [2, 0]]),
+    }
+
+    def read_data_for_single_dataset(scene, measurements, geobox, fuse_func=None):
+        band, pq = loaded[id(scene)]
+        return Dataset({
+            "band": DataArray(np.array([band], dtype="int16"), dims=["time", "y", "x"],
+                              coords={"time": time}, attrs={"nodata": -999}),
+            "pq": DataArray(np.array([pq], dtype="uint8"), dims=["time", "y", "x"],
+                            coords={"time": time}, attrs={"nodata": 0}),
+        })
+
+    ds.read_data_for_single_dataset = read_data_for_single_dataset
+    result = ds.manual_data_stack(datasets, {}, {"band", "pq"}, False, fuse_func=None)
+    assert result["band"].dtype == np.float32
+    np.testing.assert_equal(result["band"].values[0], [[5, 1], [2, np.nan]])
+    assert result["pq"].dtype == np.uint16
+    np.testing.assert_equal(result["pq"].values[0], [[2, 1], [1, 0]])
+    assert result["band"].attrs["nodata"] == -999
+
+    layer.solar_correction = True
+    monkeypatch.setattr("datacube_ows.loading.solar_correction_factor", lambda scene: 0.5)
+    result = ds.manual_data_stack(datasets, {}, {"band", "pq"}, False, fuse_func=None)
+    np.testing.assert_equal(result["band"].values[0], [[10, 2], [4, np.nan]])
+    np.testing.assert_equal(result["pq"].values[0], [[2, 1], [1, 0]])
+    result = ds.manual_data_stack(datasets, {}, {"band", "pq"}, True, fuse_func=None)
+    np.testing.assert_equal(result["band"].values[0], [[5, 1], [2, np.nan]])
+
+
+def test_manual_data_stack_read_ahead():
+    ds = DataStacker.__new__(DataStacker)
+    ds._layer = MagicMock()
+    executor = ThreadPoolExecutor(max_workers=2)
+    submitted = []
+
+    def load(scene):
+        submitted.append(scene)
+        return scene
+
+    pending = deque()
+    loaded = ds._read_ahead(executor, load, range(5), pending, 2)
+    assert next(loaded) == 0
+    # One read popped and one more submitted - the window stays bounded.
+    assert len(pending) == 2
+    assert list(loaded) == [1, 2, 3, 4]
+    assert not pending
+    assert sorted(submitted) == [0, 1, 2, 3, 4]
+    executor.shutdown()
+
+
+def test_chunked_data(monkeypatch):
+    layer = MagicMock()
+    layer.mosaic_date_func = None
+    layer.always_fetch_bands = []
+    layer.float32_processing = False
+    layer.band_idx.locale_band = lambda b: b
+    layer.band_idx.dtype_val = lambda b: "int16"
+    layer.band_idx.nodata_val = lambda b: -999
+    geobox = GeoBox((3, 5), Affine(1.0, 0.0, 0.0, 0.0, -1.0, 3.0), "EPSG:4326")
+    ds = DataStacker(layer, geobox, [datetime.date(2020, 1, 1)], bands=["band"])
+    time = np.array(["2020-01-01"], dtype="datetime64[ns]")
+    query = ProductBandQuery.simple_layer_query(layer, ["band"])
+    searches = []
+
+    def datasets(self):
+        searches.append(tuple(self._geobox.shape))
+        # The bottom-right chunk has no data
+        n_times = 0 if self._geobox.shape == (1, 1) else 1
+        return {query: DataArray(np.empty(n_times, dtype=object), coords={"time": time[:n_times]}, dims=["time"])}
+
+    def data(self, datasets_by_query, skip_corrections=False):
+        shape = (1,) + self._geobox.shape
+        values = np.full(shape, 7.0, dtype="float32")
+        # Unfilled pixel from manual merge
+        values[0, 0, 0] = np.nan
+        return Dataset({"band": DataArray(values, dims=["time", "y", "x"], coords={"time": time})})
+
+    monkeypatch.setattr(DataStacker, "datasets", datasets)
+    monkeypatch.setattr(DataStacker, "data", data)
+    monkeypatch.setattr(DataStacker, "n_datasets", MagicMock(side_effect=AssertionError("Unexpected count")))
+    result = ds.chunked_data(ds.datasets(), ["band"], chunk_size=2)
+    assert searches == [(3, 5)]
+    assert result["band"].dtype == np.int16
+    assert result["band"].shape == (1, 3, 5)
+    assert result["band"].attrs["nodata"] == -999
+    values = result["band"].values
+    assert sorted(searches[1:]) == sorted([(2, 2), (2, 2), (2, 1), (1, 2), (1, 2), (1, 1)])
+    np.testing.assert_equal(values[0], [
+        [-999, 7, -999, 7, -999],
+        [7, 7, 7, 7, 7],
+        [-999, 7, -999, 7, -999],
+    ])
+
+
+def test_merge_buffer_dtypes():
+    time = np.array(["2020-01-01"], dtype="datetime64[ns]")
+    data = Dataset({
+        "int16": DataArray(np.zeros((1, 2, 2), dtype="int16"), dims=["time", "y", "x"], coords={"time": time}),
+    })
+    # Matches data.where(mask) and data / csz
+    src = data["int16"]
+    assert DataStacker._merge_buffers(data, (), masked=True, solar=False)["int16"].dtype == src.where(src > 0).dtype
+    assert DataStacker._merge_buffers(data, (), masked=True, solar=True)["int16"].dtype == (src.where(src > 0) / 0.5).dtype
+    assert DataStacker._merge_buffers(data, (), masked=False, solar=True)["int16"].dtype == (src / 0.5).dtype
+    assert DataStacker._merge_buffers(data, (), masked=False, solar=True)["int16"].dtype == np.float64
+    assert DataStacker._merge_buffers(data, (), masked=False, solar=False)["int16"].dtype == np.int16
+
+
+def test_float32_merge_buffers():
+    time = np.array(["2020-01-01"], dtype="datetime64[ns]")
+    data = Dataset({
+        "int": DataArray(np.zeros((1, 2, 2), dtype="int32"), dims=["time", "y", "x"], coords={"time": time}),
+        "dbl": DataArray(np.zeros((1, 2, 2), dtype="float64"), dims=["time", "y", "x"], coords={"time": time}),
+        "pq": DataArray(np.zeros((1, 2, 2), dtype="uint8"), dims=["time", "y", "x"], coords={"time": time}),
+    })
+    buffers = DataStacker._merge_buffers(data, {"pq"}, masked=True, solar=False)
+    assert buffers["int"].dtype == np.float64
+    assert buffers["dbl"].dtype == np.float64
+    assert buffers["pq"].dtype == np.uint16
+    buffers = DataStacker._merge_buffers(data, {"pq"}, masked=True, solar=True, float32=True)
+    assert buffers["int"].dtype == np.float32
+    assert buffers["dbl"].dtype == np.float32
+    assert np.isnan(buffers["int"].values).all()
+    assert buffers["pq"].dtype == np.uint16
+    converted = DataStacker._float32_data(data)
+    assert converted["dbl"].dtype == np.float32
+    assert converted["int"].dtype == np.int32
+    assert DataStacker._float32_data(converted) is converted
+
+
+def test_extent_mask():
+    from datacube_ows.ogc_utils import mask_by_nan, mask_by_val
+    time = np.array(["2020-01-01", "2020-01-02"], dtype="datetime64[ns]")
+    data = Dataset({
+        "red": DataArray(np.array([[[0, 1], [2, 3]], [[4, 0], [6, 7]]], dtype="int16"),
+                         dims=["time", "y", "x"], coords={"time": time}, attrs={"nodata": 0}),
+        "green": DataArray(np.array([[[1, 1], [1, 0]], [[1, 1], [1, 1]]], dtype="int16"),
+                           dims=["time", "y", "x"], coords={"time": time}, attrs={"nodata": 0}),
+        "pq": DataArray(np.zeros((2, 2, 2), dtype="uint8"),
+                        dims=["time", "y", "x"], coords={"time": time}, attrs={"nodata": 0}),
+    })
+    layer = MagicMock()
+    layer.data_manual_merge = False
+    layer.extent_mask_func = [mask_by_val]
+    style = MagicMock()
+    style.needed_bands = ["red", "green", "pq"]
+    style.flag_bands = {"pq"}
+    mask = datacube_ows.data._extent_mask(data, layer, style)
+    assert mask.dims == ("time", "y", "x")
+    np.testing.assert_equal(mask.values, [[[False, True], [True, False]], [[True, False], [True, True]]])
+
+    layer.data_manual_merge = True
+    fdata = data.astype("float32").where(data != 0)
+    np.testing.assert_equal(datacube_ows.data._extent_mask(fdata, layer, style).values, mask.values)
+
+    layer.data_manual_merge = False
+    layer.extent_mask_func = [mask_by_nan]
+    np.testing.assert_equal(datacube_ows.data._extent_mask(fdata, layer, style).values, mask.values)
+
+    style.needed_bands = ["pq"]
+    assert datacube_ows.data._extent_mask(data, layer, style).values.all()
+
+
+def test_write_polygon():
+    geobox = GeoBox((4, 4), Affine(1.0, 0.0, 0.0, 0.0, -1.0, 4.0), "EPSG:3857")
+    layer = MagicMock()
+    layer.image_encoders = ImageEncoders({})
+    zoom_fill = [150, 180, 200, 160]
+    covering = polygon([(-1, -1), (-1, 5), (5, 5), (5, -1), (-1, -1)], "EPSG:3857")
+    body = datacube_ows.data._write_polygon(geobox, covering, zoom_fill, layer)
+    assert body is datacube_ows.data._write_polygon(geobox, covering, zoom_fill, layer)
+    assert Image.open(BytesIO(body)).convert("RGBA").getpixel((0, 0)) == (150, 180, 200, 160)
+
+    disjoint = polygon([(10, 10), (10, 12), (12, 12), (12, 10), (10, 10)], "EPSG:3857")
+    body = datacube_ows.data._write_polygon(geobox, disjoint, zoom_fill, layer)
+    assert body is datacube_ows.data._write_empty(geobox)
+    assert Image.open(BytesIO(body)).convert("RGBA").getpixel((0, 0)) == (0, 0, 0, 0)
+
+    partial = polygon([(-1, -1), (-1, 2), (5, 2), (5, -1), (-1, -1)], "EPSG:3857")
+    img = Image.open(BytesIO(datacube_ows.data._write_polygon(geobox, partial, zoom_fill, layer))).convert("RGBA")
+    assert img.getpixel((0, 0)) == (0, 0, 0, 0)
+    assert img.getpixel((0, 3)) != (0, 0, 0, 0)
@@ -0,0 +1,57 @@
+# This file is part of datacube-ows, part of the Open Data Cube project.
+# See https://opendatacube.org for more information.
+#
+# Copyright (c) 2017-2024 OWS Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from datacube_ows.config_utils import ConfigException
+from datacube_ows.index.dataset_cache import DatasetCache, parse_dataset_cache
+
+
+def fake_dataset(dsid):
+    ds = MagicMock()
+    ds.id = dsid
+    return ds
+
+
+def test_parse_dataset_cache():
+    assert parse_dataset_cache(None) is None
+    cache = parse_dataset_cache({})
+    assert isinstance(cache, DatasetCache)
+    assert cache.max_datasets == 50000
+    with pytest.raises(ConfigException) as e:
+        parse_dataset_cache({"max_datasets": "many"})
+    assert "must be numbers" in str(e.value)
+    with pytest.raises(ConfigException) as e:
+        parse_dataset_cache({"ttl": -1})
+    assert "must be positive" in str(e.value)
+
+
+def test_dataset_cache_bulk_get():
+    index = MagicMock()
+    index.datasets.bulk_get.side_effect = lambda ids: [fake_dataset(dsid) for dsid in ids]
+    cache = DatasetCache({"max_datasets": 3})
+    first = cache.bulk_get(index, ["a", "b"])
+    assert [ds.id for ds in first] == ["a", "b"]
+    index.datasets.bulk_get.assert_called_once_with(["a", "b"])
+    second = cache.bulk_get(index, ["c", "b", "a"])
+    assert [ds.id for ds in second] == ["c", "b", "a"]
+    assert second[1] is first[1]
+    index.datasets.bulk_get.assert_called_with(["c"])
+    # Fully cached - no index access
+    cache.bulk_get(index, ["a", "c"])
+    assert index.datasets.bulk_get.call_count == 2
+    cache.clear()
+    cache.bulk_get(index, ["a"])
+    assert index.datasets.bulk_get.call_count == 3
+
+
+def test_dataset_cache_missing_ids():
+    index = MagicMock()
+    index.datasets.bulk_get.return_value = []
+    cache = DatasetCache({})
+    assert cache.bulk_get(index, ["gone"]) == []
@@ -0,0 +1,196 @@
+# This file is part of datacube-ows, part of the Open Data Cube project.
+# See https://opendatacube.org for more information.
+#
+# Copyright (c) 2017-2024 OWS Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from io import BytesIO
+
+import numpy as np
+import pytest
+import xarray
+from PIL import Image
+
+from datacube_ows.config_utils import ConfigException
+from datacube_ows.encoders import (ENCODERS, TRANSPARENT, AnimatedPngWriter,
+                                   ImageEncoders, JpegEncoder, PngEncoder,
+                                   WebpEncoder, encode_animation, index_array,
+                                   indexed_image, is_indexed, rgba_array,
+                                   solid_colour, solid_png)
+
+
+def rgb_image(width=4, height=3, alpha=True):
+    bands = {
+        "red": np.arange(width * height, dtype="uint8").reshape(height, width),
+        "green": np.full((height, width), 20, dtype="uint8"),
+        "blue": np.full((height, width), 30, dtype="uint8"),
+    }
+    if alpha:
+        bands["alpha"] = np.full((height, width), 255, dtype="uint8")
+    return xarray.Dataset({
+        band: xarray.DataArray(values, dims=["y", "x"],
+                               coords={"y": np.arange(height), "x": np.arange(width)})
+        for band, values in bands.items()
+    })
+
+
+def test_rgba_array():
+    img = rgb_image()
+    rgba = rgba_array(img)
+    assert rgba.shape == (3, 4, 4)
+    assert rgba.flags["C_CONTIGUOUS"]
+    assert list(rgba[1, 2]) == [6, 20, 30, 255]
+    # x, y order
+    assert (rgba_array(img.transpose("x", "y")) == rgba).all()
+    rgba = rgba_array(rgb_image(alpha=False))
+    assert (rgba[:, :, 3] == 255).all()
+
+
+def test_solid_colour():
+    rgba = np.zeros((3, 4, 4), dtype="uint8")
+    assert solid_colour(rgba) == TRANSPARENT
+    rgba[:, :, 0] = 7
+    rgba[1, 1, 0] = 8
+    assert solid_colour(rgba) == TRANSPARENT
+    rgba[:, :, 3] = 255
+    assert solid_colour(rgba) is None
+    rgba[1, 1, 0] = 7
+    assert solid_colour(rgba) == (7, 0, 0, 255)
+
+
+def test_png_encoder():
+    rgba = rgba_array(rgb_image())
+    for cfg in ({}, {"compress_level": 0}, {"compress_level": 9, "strategy": "rle"}):
+        img = Image.open(BytesIO(PngEncoder(cfg).encode(rgba)))
+        assert img.format == "PNG"
+        assert (np.asarray(img.convert("RGBA")) == rgba).all()
+    rgba[:, :, 3] = 0
+    assert PngEncoder({}).encode(rgba) is solid_png(4, 3, TRANSPARENT)
+    img = Image.open(BytesIO(solid_png(4, 3, (1, 2, 3, 4))))
+    assert img.size == (4, 3)
+    assert img.convert("RGBA").getpixel((3, 2)) == (1, 2, 3, 4)
+
+
+def test_png_encoder_indexed():
+    palette = np.array([[0, 0, 0, 0], [255, 0, 0, 255], [0, 0, 255, 128]], dtype="uint8")
+    index = xarray.DataArray(np.array([[0, 1, 2, 1], [2, 2, 1, 0], [1, 1, 1, 1]], dtype="uint8"),
+                             dims=["y", "x"], coords={"y": np.arange(3), "x": np.arange(4)})
+    img_data = indexed_image(index, palette)
+    assert is_indexed(img_data)
+    assert not is_indexed(rgb_image())
+    idx = index_array(img_data.transpose("x", "y"))
+    assert (idx == index.values).all()
+    png = PngEncoder({}).encode_indexed(idx, palette)
+    img = Image.open(BytesIO(png))
+    assert img.mode == "P"
+    assert "transparency" in img.info
+    assert (np.asarray(img.convert("RGBA")) == palette[index.values]).all()
+    big = np.ascontiguousarray(np.tile(idx, (64, 64)))
+    assert len(PngEncoder({}).encode_indexed(big, palette)) < len(PngEncoder({}).encode(palette[big]))
+    # Single colour images are served pre-encoded.
+    assert PngEncoder({}).encode_indexed(np.zeros((3, 4), dtype="uint8"), palette) is solid_png(4, 3, TRANSPARENT)
+    assert PngEncoder({}).encode_indexed(np.ones((3, 4), dtype="uint8"), palette) is solid_png(4, 3, (255, 0, 0, 255))
+    assert PngEncoder({}).paletted
+    assert not PngEncoder({"paletted": False}).paletted
+
+
+def test_png_encoder_errors():
+    with pytest.raises(ConfigException) as e:
+        PngEncoder({"compress_level": 10})
+    assert "compress_level must be an integer from 0 to 9" in str(e.value)
+    with pytest.raises(ConfigException) as e:
+        ImageEncoders({"png": {"strategy": "squash"}})
+    assert "Unknown PNG compression strategy" in str(e.value)
+
+
+def test_jpeg_encoder():
+    rgba = rgba_array(rgb_image(64, 64))
+    rgba[:32, :, 3] = 0
+    encoder = JpegEncoder({"quality": 90, "background": [0, 0, 0]})
+    img = Image.open(BytesIO(encoder.encode(rgba)))
+    assert img.format == "JPEG"
+    assert img.mode == "RGB"
+    # Transparent pixels are flattened onto the background colour
+    assert max(img.getpixel((10, 10))) < 8
+    assert abs(img.getpixel((10, 50))[2] - 30) < 8
+    rgba[:, :, 3] = 0
+    assert encoder.encode(rgba) is encoder.encode(rgba)
+    assert encoder.encode(rgba) != JpegEncoder({"quality": 90}).encode(rgba)
+    assert Image.open(BytesIO(JpegEncoder({}).encode(rgba))).getpixel((0, 0))[0] > 247
+    palette = np.array([[0, 0, 0, 0], [255, 0, 0, 255]], dtype="uint8")
+    img = Image.open(BytesIO(encoder.encode_indexed(np.ones((8, 8), dtype="uint8"), palette)))
+    assert img.getpixel((4, 4))[0] > 247
+    with pytest.raises(ConfigException) as e:
+        JpegEncoder({"quality": 0})
+    assert "JPEG quality must be an integer from 1 to 95" in str(e.value)
+    with pytest.raises(ConfigException) as e:
+        JpegEncoder({"background": "white"})
+    assert "JPEG background must be a list of 3 integers" in str(e.value)
+
+
+def test_webp_encoder():
+    rgba = rgba_array(rgb_image(64, 64))
+    rgba[:32, :, 3] = 0
+    img = Image.open(BytesIO(WebpEncoder({"lossless": True}).encode(rgba)))
+    assert img.format == "WEBP"
+    assert (np.asarray(img.convert("RGBA"))[32:] == rgba[32:]).all()
+    assert (np.asarray(img.convert("RGBA"))[:32, :, 3] == 0).all()
+    img = Image.open(BytesIO(WebpEncoder({"quality": 50}).encode(rgba)))
+    assert img.convert("RGBA").getpixel((10, 10))[3] == 0
+    assert img.convert("RGBA").getpixel((10, 50))[3] == 255
+    with pytest.raises(ConfigException) as e:
+        WebpEncoder({"method": 7})
+    assert "WebP method must be an integer from 0 to 6" in str(e.value)
+
+
+def test_image_encoders():
+    encoders = ImageEncoders({})
+    assert encoders.formats == ["image/png"]
+    encoders = ImageEncoders({"formats": list(ENCODERS), "jpeg": {"quality": 70}})
+    assert encoders.formats == list(ENCODERS)
+    assert encoders.for_format("image/jpeg").quality == 70
+    assert encoders.for_format("image/png") is encoders.png
+    assert encoders.for_format("image/gif") is None
+    encoders = ImageEncoders({"formats": ["image/png"]})
+    assert encoders.formats == ["image/png"]
+    assert encoders.for_format("image/jpeg") is None
+    with pytest.raises(ConfigException) as e:
+        ImageEncoders({"formats": ["image/jpeg"]})
+    assert "image/png must be included" in str(e.value)
+    with pytest.raises(ConfigException) as e:
+        ImageEncoders({"formats": ["image/png", "image/gif"]})
+    assert "Unsupported image format: image/gif" in str(e.value)
+
+
+def test_encode_animation():
+    frames = [rgba_array(rgb_image(8, 6)) for _ in range(3)]
+    frames[1][:, :, 0] = 7
+    frames[2][:3, :, 3] = 0
+    consumed = []
+
+    def frame_gen():
+        for frame in frames:
+            consumed.append(frame)
+            yield frame
+
+    parts = encode_animation(frame_gen(), 3, 250, encoder=PngEncoder({"compress_level": 1}))
+    # Frames are encoded as they are consumed
+    header = next(parts)
+    assert header.startswith(b"\x89PNG")
+    assert len(consumed) == 1
+    img = Image.open(BytesIO(header + b"".join(parts)))
+    assert img.n_frames == 3
+    for idx, frame in enumerate(frames):
+        img.seek(idx)
+        assert img.info["duration"] == 250
+        assert (np.asarray(img.convert("RGBA")) == frame).all()
+
+    writer = AnimatedPngWriter(PngEncoder({}), 2)
+    writer.add_frame(frames[0])
+    with pytest.raises(ValueError) as e:
+        writer.add_frame(rgba_array(rgb_image(4, 3)))
+    assert "must all be the same size" in str(e.value)
+    with pytest.raises(ValueError) as e:
+        writer.finish()
+    assert "expected 2" in str(e.value)
+    assert PngEncoder({"stream_animation": True}).stream_animation
@@ -98,4 +98,15 @@ def test_multidate_handler():
 
     assert "Aggregator function is required" in str(excinfo.value)
 
+    mdh_anim = StyleDefBase.MultiDateHandler(
+        FakeMdhStyle(), {"allowed_count_range": [2, 10], "animate": True, "frame_duration": 65535}
+    )
+    assert mdh_anim.frame_duration == 65535
+    for bad_duration in (65536, -1, "slow"):
+        with pytest.raises(ConfigException) as excinfo:
+            bad_mdh = StyleDefBase.MultiDateHandler(
+                FakeMdhStyle(), {"allowed_count_range": [2, 10], "animate": True, "frame_duration": bad_duration}
+            )
+        assert "frame_duration must be an integer" in str(excinfo.value)
+
     assert mdh.transform_data(None) == None
@@ -5,11 +5,13 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import datetime
+from io import BytesIO
 from unittest.mock import MagicMock
 
 import pytest
 import xarray
 from odc.geo.geom import polygon
+from PIL import Image
 from pytz import utc
 
 import datacube_ows.http_utils
@@ -314,9 +316,16 @@ def test_png_loop_over_anim():
         "blue": dummy_da(150, "blue", xyt_coords, dtype="uint8"),
         "alpha": dummy_da(200, "alpha", xyt_coords, dtype="uint8"),
     })
-    imgs = datacube_ows.ogc_utils.xarray_image_as_png(data, loop_over="time", animate=True)
-    assert len(imgs) == 173
+    imgs = datacube_ows.ogc_utils.xarray_image_as_png(data, loop_over="time", animate=True, frame_duration=500)
+    assert len(imgs) == 211
     assert imgs.find(b"\x89PNG") == 0
+    img = Image.open(BytesIO(imgs))
+    assert img.is_animated
+    assert img.n_frames == 2
+    for frame in range(2):
+        img.seek(frame)
+        assert img.info["duration"] == 500
+        assert img.convert("RGBA").getpixel((2, 2)) == (100, 70, 150, 200)
 
 
 def test_render_frame():
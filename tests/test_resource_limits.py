@@ -40,6 +40,21 @@ def test_request_scale():
     assert pytest.approx(rs3.load_adjusted_zoom_level, 0.1) == -3.0
 
 
+def test_request_scale_overviews():
+    # 256x256 tile at 100m/pixel, over 25m data: 4x decimation
+    tile = create_geobox(minx=0.0, maxx=25600.0, miny=0.0, maxy=25600.0,
+                         crs=CRS("EPSG:3857"), width=256, height=256)
+    rs = datacube_ows.resource_limits.RequestScale(CRS("EPSG:3857"), (25.0, 25.0),
+                                                   tile, 1, total_band_size=6)
+    assert pytest.approx(rs.decimation, 1e-8) == 4.0
+    assert rs.overview_factor([]) == 1
+    assert rs.overview_factor([2, 4, 8]) == 4
+    assert rs.overview_factor([2, 3, 8]) == 3
+    assert rs.overview_factor([8, 16]) == 1
+    assert pytest.approx(rs.overview_adjusted_zoom_level([2, 4, 8]), 1e-8) == rs.load_adjusted_zoom_level + 2.0
+    assert pytest.approx(rs.overview_adjusted_zoom_level([]), 1e-8) == rs.load_adjusted_zoom_level
+
+
 def test_degree_to_metres():
     xres, yres = datacube_ows.resource_limits.RequestScale._metre_resolution(
         None,
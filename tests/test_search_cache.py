@@ -0,0 +1,105 @@
+# This file is part of datacube-ows, part of the Open Data Cube project.
+# See https://opendatacube.org for more information.
+#
+# Copyright (c) 2017-2024 OWS Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from unittest.mock import MagicMock
+
+import pytest
+from odc.geo.geom import box
+
+from datacube_ows.config_utils import ConfigException
+from datacube_ows.index.search_cache import (DatasetSearchCache,
+                                             parse_dataset_search_cache)
+
+
+def test_parse_search_cache():
+    assert parse_dataset_search_cache(None) is None
+    cache = parse_dataset_search_cache({})
+    assert cache.max_datasets == 10000
+    assert cache.ttl == 300
+    assert cache.max_cell_size == 11.25
+    with pytest.raises(ConfigException) as e:
+        parse_dataset_search_cache({"ttl": "forever"})
+    assert "must be numbers" in str(e.value)
+    with pytest.raises(ConfigException) as e:
+        parse_dataset_search_cache({"max_cell_size": -1})
+    assert "must be positive" in str(e.value)
+    with pytest.raises(ConfigException) as e:
+        parse_dataset_search_cache({"max_datasets": 0})
+    assert "must be positive" in str(e.value)
+
+
+def test_grid_cells():
+    cell = DatasetSearchCache.cell_geom((8, 227, 38))
+    left, bottom, right, top = cell.boundingbox
+    search = box(left + 0.1, bottom + 0.1, right - 0.1, top - 0.1, "EPSG:4326")
+    assert DatasetSearchCache.grid_cells(search) == [(8, 227, 38)]
+    # Straddles a cell boundary.
+    assert len(DatasetSearchCache.grid_cells(box(-0.5, -0.5, 0.5, 0.5, "EPSG:4326"))) == 4
+    # Too big.
+    assert DatasetSearchCache.grid_cells(box(-100, -50, 100, 50, "EPSG:4326")) is None
+    assert DatasetSearchCache.grid_cells(box(0, 0, 15, 15, "EPSG:4326")) is None
+    assert len(DatasetSearchCache.grid_cells(box(0, 0, 15, 15, "EPSG:4326"), max_cell_size=22.5)) == 1
+
+
+def test_search_cache():
+    layer = MagicMock()
+    layer.name = "a_layer"
+    layer.ranges_last_updated = None
+    product = MagicMock()
+    product.name = "a_product"
+    left, bottom, right, top = DatasetSearchCache.cell_geom((6, 56, 9)).boundingbox
+    inside = MagicMock()
+    inside.id = "inside"
+    inside.extent = box(left, bottom, left + 1.0, bottom + 1.0, "EPSG:4326")
+    outside = MagicMock()
+    outside.id = "outside"
+    outside.extent = box(left + 3.0, bottom + 3.0, left + 4.0, bottom + 4.0, "EPSG:4326")
+    index = layer.ows_index.return_value
+    index.ds_search.side_effect = lambda *args, **kwargs: [inside, outside]
+
+    cache = DatasetSearchCache({"ttl": 60})
+    # Overlapping searches in the same grid cell
+    tile1 = box(left + 0.2, bottom + 0.2, left + 2.7, bottom + 2.7, "EPSG:4326")
+    tile2 = box(left + 0.3, bottom + 0.3, left + 2.8, bottom + 2.8, "EPSG:4326")
+    assert cache.search(layer, None, tile1, [product]) == [inside]
+    assert cache.search(layer, None, tile2, [product]) == [inside]
+    assert index.ds_search.call_count == 1
+    # Different times are cached separately
+    cache.search(layer, ["2020-01-01"], tile2, [product])
+    assert index.ds_search.call_count == 2
+    # Range update invalidates
+    layer.ranges_last_updated = "now"
+    cache.search(layer, None, tile1, [product])
+    assert index.ds_search.call_count == 3
+    cache.clear()
+    cache.search(layer, None, tile1, [product])
+    assert index.ds_search.call_count == 4
+
+
+def test_search_cache_oversized_cell():
+    layer = MagicMock()
+    layer.name = "a_layer"
+    layer.ranges_last_updated = None
+    left, bottom, right, top = DatasetSearchCache.cell_geom((6, 56, 9)).boundingbox
+    datasets = []
+    for i in range(3):
+        ds = MagicMock()
+        ds.id = i
+        ds.extent = box(left, bottom, left + 1.0, bottom + 1.0, "EPSG:4326")
+        datasets.append(ds)
+    index = layer.ows_index.return_value
+    index.ds_search.side_effect = lambda *args, **kwargs: iter(datasets)
+
+    cache = DatasetSearchCache({"max_datasets": 2})
+    tile = box(left + 0.2, bottom + 0.2, left + 2.7, bottom + 2.7, "EPSG:4326")
+    # Cell search, then direct search
+    assert cache.search(layer, None, tile, []) == datasets
+    assert index.ds_search.call_count == 2
+    assert index.ds_search.call_args.kwargs["geom"] == tile
+    # Oversized cell is remembered - direct search only
+    assert cache.search(layer, None, tile, []) == datasets
+    assert index.ds_search.call_count == 3
+    assert index.ds_search.call_args.kwargs["geom"] == tile
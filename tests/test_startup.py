@@ -116,6 +116,60 @@ def test_prometheus_inactive(monkeypatch):
     initialise_prometheus(None)
 
 
+def test_initialise_gdal_environment(monkeypatch):
+    from datacube.utils.rio import get_rio_env, set_default_rio_config
+
+    from datacube_ows.startup_utils import (GDAL_ENV_OPENED, GDAL_ENV_REUSED,
+                                            CredentialManager,
+                                            activate_gdal_environment,
+                                            initialise_gdal_environment)
+    initialise_gdal_environment(None)
+    cfg = MagicMock()
+    cfg.gdal_environment = None
+    initialise_gdal_environment(cfg)
+    assert CredentialManager.gdal_opts == {}
+    CredentialManager._instance = None
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "")
+    CredentialManager()
+    cfg.gdal_environment = MagicMock()
+    cfg.gdal_environment.gdal_options.return_value = {"GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR"}
+    opened = GDAL_ENV_OPENED._value.get()
+    reused = GDAL_ENV_REUSED._value.get()
+    try:
+        initialise_gdal_environment(cfg, MagicMock())
+        assert get_rio_env()["GDAL_DISABLE_READDIR_ON_OPEN"] == "EMPTY_DIR"
+        assert GDAL_ENV_OPENED._value.get() == opened + 1
+        assert activate_gdal_environment()
+        assert GDAL_ENV_REUSED._value.get() == reused + 1
+        # No environment configured: not counted as reuse
+        with patch("datacube_ows.startup_utils.activate_from_config", return_value=None), \
+                patch("datacube_ows.startup_utils.get_rio_env", return_value={}):
+            assert not activate_gdal_environment()
+        assert GDAL_ENV_REUSED._value.get() == reused + 1
+        # S3 access setup is passed the GDAL options
+        CredentialManager._instance.use_aws = True
+        with patch("datacube_ows.startup_utils.configure_s3_access") as s3a:
+            initialise_gdal_environment(cfg)
+            assert s3a.call_args.kwargs["GDAL_DISABLE_READDIR_ON_OPEN"] == "EMPTY_DIR"
+    finally:
+        CredentialManager.gdal_opts = {}
+        CredentialManager._instance = None
+        set_default_rio_config()
+
+
+def test_get_config_initialises_gdal_environment(monkeypatch):
+    import datacube_ows.ows_configuration
+    cfg = MagicMock()
+    cfg.gdal_environment_initialised = False
+    cfg.ready = True
+    monkeypatch.setattr(datacube_ows.ows_configuration, "OWSConfig", lambda **kwargs: cfg)
+    with patch("datacube_ows.startup_utils.initialise_gdal_environment") as init_gdal:
+        assert datacube_ows.ows_configuration.get_config() is cfg
+        assert datacube_ows.ows_configuration.get_config() is cfg
+        init_gdal.assert_called_once()
+        assert init_gdal.call_args.args[0] is cfg
+
+
 def test_supported_version():
     from datacube_ows.protocol_versions import SupportedSvcVersion
     ver = SupportedSvcVersion("wts", "1.2.3", "a", "b")
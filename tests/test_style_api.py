@@ -75,6 +75,62 @@ def test_perband_component_style(dummy_raw_data, null_mask, simple_rgb_perband_s
         assert channel in result.data_vars.keys()
 
 
+def test_component_style_accumulation(dummy_raw_calc_data, raw_calc_null_mask):
+    style = StandaloneStyle({
+        "name": "test_style",
+        "title": "Test Style",
+        "abstract": "This is a Test Style for Datacube WMS",
+        "needed_bands": ["ir", "red", "green", "blue"],
+        "components": {
+            "red": {"red": 0.5, "ir": 0.5},
+            "green": {"green": 1.0, "blue": -0.25, "scale_range": [0, 600]},
+            "blue": {"blue": lambda data, band, imgband: data * 0.3},
+            "alpha": {"ir": 0.1},
+        },
+        "scale_range": [0, 1000],
+    })
+    mask = style.to_mask(dummy_raw_calc_data, raw_calc_null_mask)
+    result = style.transform_data(dummy_raw_calc_data, mask)
+    ir, red, green, blue = (dummy_raw_calc_data[b].values.ravel().astype("float64")
+                            for b in ("ir", "red", "green", "blue"))
+    expected = {
+        "red": (0.5 * red + 0.5 * ir).clip(0, 1000) / 1000 * 255,
+        "green": (green - 0.25 * blue).clip(0, 600) / 600 * 255,
+        "blue": (0.3 * blue).clip(0, 1000) / 1000 * 255,
+        "alpha": 0.1 * ir,
+    }
+    for channel, values in expected.items():
+        assert result[channel].dtype == "uint8"
+        assert abs(result[channel].values.ravel().astype("int") - values.astype("uint8")).max() <= 1
+
+
+@pytest.mark.parametrize("extra_cfg", [
+    {"index_expression": "(ir-red)/(ir+red)"},
+    {"index_function": {"function": "datacube_ows.band_utils.norm_diff",
+                        "mapped_bands": True, "kwargs": {"band1": "ir", "band2": "red"}},
+     "needed_bands": ["ir", "red"]},
+    {"index_expression": "(ir-red)/(ir+red)", "component_ratio": 0.4,
+     "components": {"red": {"red": 1.0}, "green": {"green": 1.0}, "blue": {"blue": 1.0}},
+     "scale_range": [0, 1000]},
+])
+def test_float32_processing(dummy_raw_calc_data, raw_calc_null_mask, simple_ramp_style_cfg, extra_cfg):
+    del simple_ramp_style_cfg["index_function"]
+    del simple_ramp_style_cfg["needed_bands"]
+    simple_ramp_style_cfg.update(extra_cfg)
+    results = []
+    for float32 in (False, True):
+        style = StandaloneStyle(simple_ramp_style_cfg)
+        style.product.float32_processing = float32
+        assert style.float32_processing == float32
+        if float32:
+            index = style.apply_index(dummy_raw_calc_data.copy())
+            assert index.dtype == "float32"
+        results.append(apply_ows_style(style, dummy_raw_calc_data.copy(), valid_data_mask=raw_calc_null_mask))
+    for channel in ("red", "green", "blue", "alpha"):
+        assert results[1][channel].dtype == "uint8"
+        assert abs(results[0][channel].values.astype("int") - results[1][channel].values).max() <= 1
+
+
 def test_external_legends(simple_rgb_style_cfg):
     simple_rgb_style_cfg["legend"] = {
         "url": "http://fake.com/not/a/real/image_url.png"
@@ -626,6 +682,37 @@ def test_colormap_style(dummy_col_map_data, raw_calc_null_mask, simple_colormap_
     # point 5 fall through -transparent
     assert result["alpha"].values[5] == 0
 
+def test_colormap_style_dtypes(dummy_col_map_data, raw_calc_null_mask, simple_colormap_style_cfg):
+    style = StandaloneStyle(simple_colormap_style_cfg)
+    expected = apply_ows_style(style, dummy_col_map_data, valid_data_mask=raw_calc_null_mask)
+    # 8 and 16 bit data is rendered through a lookup table, other data types through the rule masks.
+    for dtype in ("uint8", "int16", "uint16", "float32"):
+        data = dummy_col_map_data.copy()
+        data["pq"] = dummy_col_map_data["pq"].astype(dtype)
+        data["pq"].attrs = dummy_col_map_data["pq"].attrs
+        result = apply_ows_style(style, data, valid_data_mask=raw_calc_null_mask)
+        for channel in ("red", "green", "blue", "alpha"):
+            assert (result[channel].values == expected[channel].values).all()
+    renderer = style.value_map_renderer
+    assert len(renderer.palette) == 4
+    assert len(renderer._luts) == 3
+
+
+def test_colormap_style_indexed(dummy_col_map_data, raw_calc_null_mask, simple_colormap_style_cfg):
+    style = StandaloneStyle(simple_colormap_style_cfg)
+    expected = apply_ows_style(style, dummy_col_map_data, valid_data_mask=raw_calc_null_mask)
+    mask = raw_calc_null_mask.copy()
+    mask.values[1] = False
+    expected["alpha"].values[1] = 0
+    indexed = style.transform_data_indexed(dummy_col_map_data, style.to_mask(dummy_col_map_data, mask))
+    assert indexed["index"].dtype == "uint8"
+    rgba = indexed.attrs["palette"][indexed["index"].values.ravel()]
+    assert (rgba[:, 3] == expected["alpha"].values.ravel()).all()
+    visible = expected["alpha"].values.ravel() > 0
+    for i, channel in enumerate(("red", "green", "blue")):
+        assert (rgba[visible, i] == expected[channel].values.ravel()[visible]).all()
+
+
 def test_colormap_multidate(dummy_col_map_time_data, timed_raw_calc_null_mask, simple_colormap_style_cfg):
     result = apply_ows_style_cfg(
                         simple_colormap_style_cfg,
@@ -834,6 +921,39 @@ def test_animated_colour_map(enum_animated_value_map, dummy_col_map_time_data, t
     assert result["blue"].values[0][1] == 0
 
 
+def test_animated_colour_map_frames(enum_animated_value_map, dummy_col_map_time_data, timed_raw_calc_null_mask):
+    style = StandaloneStyle(enum_animated_value_map)
+    mask = style.to_mask(dummy_col_map_time_data, timed_raw_calc_null_mask)
+    result = style.transform_data(dummy_col_map_time_data, mask)
+    frames = style.transform_data_frames(dummy_col_map_time_data, mask)
+    for idx in range(2):
+        frame = next(frames)
+        assert "time" not in frame.dims
+        for channel in ("red", "green", "blue", "alpha"):
+            assert (frame[channel].values == result[channel].isel(time=idx).values).all()
+    assert next(frames, None) is None
+
+
+def test_animated_colour_map_frames_aggregator(enum_animated_value_map, dummy_col_map_time_data,
+                                               timed_raw_calc_null_mask):
+    style = StandaloneStyle(enum_animated_value_map)
+    assert style.get_multi_date_handler(2).per_frame
+    # An aggregator that compares dates must see the whole time stack.
+    enum_animated_value_map["multi_date"][0]["aggregator_function"] = lambda data: data.isel(time=[1, 0])
+    style = StandaloneStyle(enum_animated_value_map)
+    assert not style.get_multi_date_handler(2).per_frame
+    mask = style.to_mask(dummy_col_map_time_data, timed_raw_calc_null_mask)
+    result = style.transform_data(dummy_col_map_time_data, mask)
+    frames = list(style.transform_data_frames(dummy_col_map_time_data, mask))
+    assert len(frames) == 2
+    for idx, frame in enumerate(frames):
+        assert "time" not in frame.dims
+        for channel in ("red", "green", "blue", "alpha"):
+            assert (frame[channel].values == result[channel].isel(time=idx).values).all()
+    enum_animated_value_map["multi_date"][0]["aggregator_function"] = "datacube_ows.band_utils.multi_date_pass"
+    assert StandaloneStyle(enum_animated_value_map).get_multi_date_handler(2).per_frame
+
+
 @pytest.fixture
 def enum_colormap_aggregate_multidate():
     def test_agg(data):
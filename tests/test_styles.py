@@ -812,6 +812,60 @@ def test_bad_mpl_ramp():
         ramp = read_mpl_ramp("definitely_not_a_real_matplotlib_ramp_name")
     assert "Invalid Matplotlib name: " in str(e.value)
 
+def test_ramp_lut():
+    from datacube_ows.styles.ramp import ColorRamp, ColorRampDef
+
+    style = MagicMock()
+    style.auto_legend = False
+    ramp = ColorRamp(style, {"range": [-0.5, 2.5]}, ColorRampDef.Legend(MagicMock(), {}))
+    rng = np.random.default_rng(42)
+    values = np.concatenate([
+        rng.uniform(-1.0, 3.0, 10000),
+        np.array(ramp.values),
+        [-0.5, 2.5, -np.inf, np.inf, np.nan],
+    ]).astype("float32")
+    data = DataArray(values, dims=["x"])
+    result = ramp.apply(data)
+    for band in ("red", "green", "blue", "alpha"):
+        expected = np.rint(ramp.get_value(values[:-1], band) * 255)
+        assert (np.abs(result[band].values[:-1].astype("int") - expected) <= 1).all()
+        # Ramp points are exact
+        n = len(ramp.values)
+        assert (result[band].values[10000:10000 + n] == expected[10000:10000 + n]).all()
+        # NaN is transparent
+        assert result[band].values[-1] == 0
+    # Default ramp is transparent below the range, and opaque from the start of the range.
+    assert list(result["alpha"].values[-5:-1]) == [255, 255, 0, 255]
+
+
+def test_ramp_quantised():
+    from datacube_ows.styles.ramp import ColorRamp, ColorRampDef
+
+    style = MagicMock()
+    style.auto_legend = False
+    ramp = ColorRamp(style, {"range": [0.0, 1.0], "quantise": 10}, ColorRampDef.Legend(MagicMock(), {}))
+    values = np.array([-1.0, 0.0, 0.04, 0.06, 0.5, 0.99, 1.0, 2.0, np.nan], dtype="float32")
+    data = DataArray(values, dims=["x"])
+    rgba = ramp.apply(data)
+    idx = ramp.palette_index(data)
+    assert idx.dtype == np.uint8
+    palette = ramp.palette
+    assert len(palette) == 13
+    assert list(palette[0]) == [0, 0, 0, 0]
+    assert idx.values[-1] == 0
+    # 0.04 and 0.06 are in the same bucket
+    assert idx.values[2] == idx.values[1]
+    for i, band in enumerate(("red", "green", "blue", "alpha")):
+        assert (palette[idx.values, i] == rgba[band].values).all()
+    assert len(set(idx.values)) == 6
+    unquantised = ColorRamp(style, {"range": [0.0, 1.0]}, ColorRampDef.Legend(MagicMock(), {}))
+    assert unquantised.palette is None
+    for bad in (1, 254, "lots"):
+        with pytest.raises(ConfigException) as e:
+            ColorRamp(style, {"range": [0.0, 1.0], "quantise": bad}, ColorRampDef.Legend(MagicMock(), {}))
+        assert "quantise must be an integer from 2 to 253" in str(e.value)
+
+
 @pytest.fixture
 def style_with_pq_masking():
     cfg = {
@@ -875,3 +929,98 @@ def test_styles_with_invalid_pq_masks(product_layer, style_with_pq_masking):
     with pytest.raises(ConfigException) as e:
         style_def = datacube_ows.styles.StyleDef(product_layer, style_with_pq_masking)
     assert "contains a mask, but the layer has no flag bands" in str(e.value)
+
+
+def test_compiled_masks():
+    from datacube_ows.config_utils import compiled_mask
+    from datacube_ows.styles.base import StyleMask
+
+    flags_def = {
+        "nodata": {"bits": 0, "values": {"0": False, "1": True}},
+        "cloud": {"bits": [1, 2], "values": {"0": "clear", "1": "thin", "2": "thick", "3": "shadow"}},
+        "water": {"bits": 7, "values": {"0": False, "1": True}},
+    }
+    style = MagicMock()
+    style.stand_alone = True
+    rules = [
+        StyleMask({"band": "pq", "flags": {"nodata": False, "cloud": "clear"}}, style),
+        StyleMask({"band": "pq", "flags": {"or": {"cloud": "thick", "water": True}}, "invert": True}, style),
+        StyleMask({"band": "pq", "values": [0, 3, 130]}, style),
+        StyleMask({"band": "pq", "values": [1, 128], "invert": True}, style),
+    ]
+    for dtype in ("uint8", "uint16", "int16", "int32"):
+        pq = DataArray(np.arange(-512, 512).astype(dtype), dims=["x"],
+                       attrs={"flags_definition": flags_def})
+        combined = None
+        for rule in rules:
+            with patch("datacube_ows.config_utils.can_compile_mask", return_value=False):
+                expected = rule.create_mask(pq)
+            assert (rule.create_mask(pq).values == expected.values).all()
+            combined = expected if combined is None else combined & expected
+        luts = {}
+        assert (compiled_mask(rules, pq, luts) == combined.values).all()
+        assert len(luts) == (1 if np.dtype(dtype).itemsize <= 2 else 0)
+        # Lookup tables are reused
+        assert (compiled_mask(rules, pq, luts) == combined.values).all()
+
+
+def test_compiled_expressions():
+    from datacube_ows.styles.expression import Expression, ExpressionException
+
+    style = MagicMock()
+    style.user_defined = False
+    style.local_band = lambda b: b
+    rng = np.random.default_rng(42)
+    for dtype in ("int16", "uint16", "float32", "float64"):
+        data = Dataset({
+            band: DataArray(rng.integers(1, 1000, (2, 5, 4)).astype(dtype), dims=["time", "y", "x"])
+            for band in ("red", "nir", "swir")
+        })
+        raw = {band: data[band].values.copy() for band in data.data_vars}
+        for expr_str in ("(nir-red)/(nir+red)", "-red + 2*nir - (3+4)*swir", "nir ** 2 / red",
+                         "red // 7 % 5", "2.5 * (red + nir + swir) / 3", "nir", "red * 2 ** -1"):
+            expr = Expression(style, expr_str)
+            expected = expr.eval_cls(data).transform(expr.tree)
+            result = expr(data)
+            assert result.dims == ("time", "y", "x")
+            assert result.dtype == expected.dtype
+            np.testing.assert_allclose(result.values, expected.values, rtol=1e-6)
+            # Input data is never overwritten
+            for band, values in raw.items():
+                assert (data[band].values == values).all()
+    # Out of range constants promote (or are rejected) as in the uncompiled evaluator,
+    # rather than wrapping around in a small integer intermediate.
+    data = Dataset({
+        band: DataArray(rng.integers(1, 100, (2, 5, 4)).astype("uint8"), dims=["time", "y", "x"])
+        for band in ("red", "nir")
+    })
+    expr = Expression(style, "(red + nir) + 300")
+    try:
+        expected = expr.eval_cls(data).transform(expr.tree)
+    except OverflowError:
+        # NEP 50 promotion (numpy 2) rejects the constant outright
+        with pytest.raises(OverflowError):
+            expr(data)
+    else:
+        result = expr(data)
+        assert result.dtype == expected.dtype
+        assert (result.values == expected.values).all()
+        assert (result.values >= 300).all()
+    expr = Expression(style, "(nir-red)/(nir+red)")
+    assert expr.bands == ["nir", "red"]
+    assert expr.numexpr == "((b0-b1)/(b0+b1))"
+    assert Expression(style, "nir // 2").numexpr is None
+    # Single band expressions don't alias the input data
+    raw_nir = np.ones((3, 4))
+    assert not np.shares_memory(Expression(style, "nir").evaluate_raw({"nir": raw_nir}), raw_nir)
+    # Bands that need broadcasting fall back to xarray
+    data = Dataset({
+        "nir": DataArray(np.ones((3, 4)), dims=["y", "x"]),
+        "red": DataArray(np.ones((4,)), dims=["x"]),
+    })
+    assert expr(data).shape == (3, 4)
+    # Unsupported operators are rejected at compile time
+    style.user_defined = True
+    with pytest.raises(ExpressionException) as e:
+        Expression(style, "nir ** 2")
+    assert "Exponent operator not supported" in str(e.value)
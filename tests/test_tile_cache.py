@@ -0,0 +1,213 @@
+# This file is part of datacube-ows, part of the Open Data Cube project.
+# See https://opendatacube.org for more information.
+#
+# Copyright (c) 2017-2024 OWS Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import datetime
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+from datacube_ows.config_utils import ConfigException
+from datacube_ows.tile_cache import (CachedTile, DiskTileCache,
+                                     MemoryTileCache, cached_tile,
+                                     parse_tile_cache, wms_tile_key,
+                                     wmts_tile_key)
+from datacube_ows.utils import LRUCache
+
+
+def test_lru_cache_eviction():
+    cache = LRUCache(3)
+    for i in range(3):
+        cache.put(i, str(i))
+    assert cache.get(0) == "0"
+    cache.put(3, "3")
+    # 1 is now least recently used.
+    assert 1 not in cache
+    assert cache.get(0) == "0"
+    assert len(cache) == 3
+    assert cache.pop(0) == "0"
+    assert cache.pop(0, "missing") == "missing"
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.size == 0
+
+
+def test_lru_cache_sizeof():
+    cache = LRUCache(10, sizeof=len)
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    assert cache.size == 10
+    cache.put("c", b"1")
+    assert "a" not in cache
+    assert cache.size == 6
+    # Too large to ever fit
+    cache.put("d", b"12345678901")
+    assert "d" not in cache
+    assert cache.size == 6
+
+
+def test_parse_tile_cache():
+    assert parse_tile_cache(None) is None
+    assert isinstance(parse_tile_cache({}), MemoryTileCache)
+    assert isinstance(parse_tile_cache({"backend": "disk", "directory": "/tmp"}), DiskTileCache)
+
+
+def test_parse_tile_cache_errors():
+    with pytest.raises(ConfigException) as e:
+        parse_tile_cache({"backend": "carrier_pigeon"})
+    assert "Unknown tile_cache backend" in str(e.value)
+    with pytest.raises(ConfigException) as e:
+        parse_tile_cache({"backend": "disk"})
+    assert "requires a directory" in str(e.value)
+    with pytest.raises(ConfigException) as e:
+        parse_tile_cache({"max_size": "lots"})
+    assert "must be an integer" in str(e.value)
+    with pytest.raises(ConfigException) as e:
+        parse_tile_cache({"max_size": 0})
+    assert "must be greater than zero" in str(e.value)
+    with pytest.raises(ConfigException) as e:
+        parse_tile_cache({"ranges_refresh": "often"})
+    assert "must be a number" in str(e.value)
+    with pytest.raises(ConfigException) as e:
+        parse_tile_cache({"ranges_refresh": -1})
+    assert "must not be negative" in str(e.value)
+
+
+def test_memory_tile_cache():
+    cache = MemoryTileCache({"max_size": 1})
+    tile = CachedTile(b"x" * 1000, {"Content-Type": "image/png"})
+    cache.store(("layer1", 1), tile)
+    cache.store(("layer2", 1), tile)
+    assert cache.lookup(("layer1", 1)) == tile
+    cache.store(("layer1", 2), CachedTile(b"x" * (1024 * 1024 + 1), {}))
+    assert cache.lookup(("layer1", 2)) is None
+    cache.invalidate("layer1")
+    assert cache.lookup(("layer1", 1)) is None
+    assert cache.lookup(("layer2", 1)) == tile
+    cache.clear()
+    assert cache.lookup(("layer2", 1)) is None
+
+
+def test_disk_tile_cache(tmp_path):
+    cache = DiskTileCache({"backend": "disk", "directory": str(tmp_path), "max_size": 1})
+    tile = CachedTile(b"\n\x00tile\n", {"Content-Type": "image/png"})
+    assert cache.lookup(("layer1", 1)) is None
+    cache.store(("layer1", 1), tile)
+    cache.store(("layer2", 1), tile)
+    assert cache.lookup(("layer1", 1)) == tile
+    cache.invalidate("layer1")
+    assert cache.lookup(("layer1", 1)) is None
+    assert cache.lookup(("layer2", 1)) == tile
+    cache.clear()
+    assert cache.lookup(("layer2", 1)) is None
+
+
+def test_disk_tile_cache_eviction(tmp_path):
+    cache = DiskTileCache({"backend": "disk", "directory": str(tmp_path), "max_size": 1})
+    big = CachedTile(b"x" * 400 * 1024, {})
+    for i in range(4):
+        cache.store(("layer", i), big)
+        # Ensure distinct modification times, regardless of filesystem timestamp resolution
+        for j in range(i + 1):
+            path = cache._path(("layer", j))
+            if os.path.exists(path):
+                os.utime(path, (1000 + j, 1000 + j))
+    assert cache.lookup(("layer", 0)) is None
+    assert cache.lookup(("layer", 3)) == big
+
+
+@pytest.fixture
+def cache_cfg():
+    cfg = MagicMock()
+    layer = MagicMock()
+    layer.hide = False
+    layer.dynamic = False
+    layer.ranges_last_updated = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    cfg.layer_index = {"a_layer": layer}
+    cfg.tile_cache = MemoryTileCache({})
+    return cfg
+
+
+def test_tile_keys(cache_cfg):
+    wmts_args = {
+        "layer": "a_layer", "style": "a_style", "tilematrixset": "WholeWorld_WebMercator",
+        "tilematrix": "5", "tilerow": "3", "tilecol": "7", "format": "image/png",
+    }
+    key = wmts_tile_key(wmts_args, cache_cfg)
+    assert key[0] == "a_layer"
+    assert key[-1] == "2024-01-01T00:00:00+00:00"
+    assert wmts_tile_key(dict(wmts_args, tilecol="8"), cache_cfg) != key
+    assert wmts_tile_key(dict(wmts_args, layer="no_layer"), cache_cfg) is None
+
+    wms_args = {
+        "layers": "a_layer", "styles": "", "crs": "EPSG:3857", "bbox": "0,0,1,1",
+        "width": "256", "height": "256", "format": "image/png", "requestid": "abc",
+    }
+    key = wms_tile_key(wms_args, cache_cfg)
+    assert key[0] == "a_layer"
+    assert wms_tile_key(dict(wms_args, requestid="def"), cache_cfg) == key
+    assert wms_tile_key(dict(wms_args, bbox="0,0,2,2"), cache_cfg) != key
+    cache_cfg.layer_index["a_layer"].ranges_last_updated = datetime.datetime(2024, 2, 1)
+    assert wms_tile_key(wms_args, cache_cfg) != key
+    cache_cfg.layer_index["a_layer"].hide = True
+    assert wms_tile_key(wms_args, cache_cfg) is None
+
+
+def test_tile_keys_ranges_refresh(cache_cfg):
+    layer = cache_cfg.layer_index["a_layer"]
+    wms_args = {"layers": "a_layer", "bbox": "0,0,1,1"}
+    cache_cfg.tile_cache = MemoryTileCache({"ranges_refresh": 3600})
+    key = wms_tile_key(wms_args, cache_cfg)
+    assert layer.force_range_update.call_count == 1
+    # Ranges are not re-read again within the refresh interval.
+    wms_tile_key(wms_args, cache_cfg)
+    assert layer.force_range_update.call_count == 1
+
+    # An update run picked up by the next refresh changes the key.
+    def update_ranges():
+        layer.ranges_last_updated = datetime.datetime(2024, 2, 1)
+    cache_cfg.tile_cache = MemoryTileCache({"ranges_refresh": 0})
+    layer.force_range_update.side_effect = update_ranges
+    assert wms_tile_key(wms_args, cache_cfg) != key
+    assert layer.force_range_update.call_count == 2
+
+    # Layers whose ranges can no longer be read are not cached.
+    def hide():
+        layer.hide = True
+    layer.force_range_update.side_effect = hide
+    assert wms_tile_key(wms_args, cache_cfg) is None
+
+
+def test_cached_tile(monkeypatch, cache_cfg):
+    monkeypatch.setattr("datacube_ows.ows_configuration.get_config", lambda: cache_cfg)
+    calls = []
+
+    def render(args):
+        calls.append(args)
+        return b"tile", 200, {"Content-Type": "image/png"}
+
+    args = {"layers": "a_layer", "bbox": "0,0,1,1"}
+    assert cached_tile(args, wms_tile_key, render) == (b"tile", 200, {"Content-Type": "image/png"})
+    assert cached_tile(args, wms_tile_key, render) == (b"tile", 200, {"Content-Type": "image/png"})
+    assert len(calls) == 1
+    cached_tile(dict(args, ows_stats="y"), wms_tile_key, render)
+    assert len(calls) == 2
+    cached_tile(dict(args, layers="no_layer"), wms_tile_key, render)
+    assert len(calls) == 3
+
+
+def test_lru_cache_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("datacube_ows.utils.monotonic", lambda: now[0])
+    cache = LRUCache(10, ttl=5)
+    cache.put("a", 1)
+    assert "a" in cache
+    now[0] = 104.0
+    assert cache.get("a") == 1
+    now[0] = 105.0
+    assert "a" not in cache
+    assert cache.get("a") is None
+    assert len(cache) == 0
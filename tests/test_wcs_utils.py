@@ -0,0 +1,73 @@
+# This file is part of datacube-ows, part of the Open Data Cube project.
+# See https://opendatacube.org for more information.
+#
+# Copyright (c) 2017-2024 OWS Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+
+import dask.array
+import numpy
+import pytest
+import rasterio
+import xarray
+from affine import Affine
+from rasterio.io import MemoryFile
+
+from datacube_ows.wcs_utils import BandStatistics, write_geotiff
+
+
+def test_band_statistics():
+    values = numpy.arange(1000, dtype="float32").reshape(40, 25)
+    values[3, 4] = numpy.nan
+    stats = BandStatistics()
+    for rows in range(0, 40, 16):
+        stats.add(values[rows:rows + 16])
+    stats.add(numpy.full((2, 2), numpy.nan, dtype="float32"))
+    tags = stats.tags()
+    assert tags["STATISTICS_MINIMUM"] == 0
+    assert tags["STATISTICS_MAXIMUM"] == 999
+    assert tags["STATISTICS_MEAN"] == pytest.approx(numpy.nanmean(values))
+    assert tags["STATISTICS_STDDEV"] == pytest.approx(numpy.nanstd(values))
+    assert numpy.isnan(BandStatistics().tags()["STATISTICS_MEAN"])
+
+
+def test_write_geotiff(tmp_path):
+    data = xarray.Dataset({
+        "red": (("y", "x"), numpy.arange(300 * 200, dtype="uint8").reshape(300, 200)),
+        "nir": (("y", "x"), numpy.arange(300 * 200, dtype="int16").reshape(300, 200)),
+    })
+    spool_dir = str(tmp_path)
+    chunks = write_geotiff(data, "int16", {"red": "Red", "nir": "Near Infrared"},
+                           statistics=True, spool_dir=spool_dir,
+                           width=200, height=300, transform=Affine(10.0, 0.0, 1000.0, 0.0, -10.0, 5000.0),
+                           crs="EPSG:3577", nodata=-999, tiled=True, blockxsize=64, blockysize=64,
+                           compress="deflate", interleave="band")
+    # The spooled file is removed before the response is streamed.
+    assert os.listdir(spool_dir) == []
+    with MemoryFile(b"".join(chunks)) as memfile, memfile.open() as src:
+        assert src.count == 2
+        assert src.dtypes == ("int16", "int16")
+        assert src.block_shapes == [(64, 64), (64, 64)]
+        assert src.descriptions == ("Red", "Near Infrared")
+        assert src.nodata == -999
+        assert src.crs == rasterio.crs.CRS.from_epsg(3577)
+        assert (src.read(1) == data["red"].values).all()
+        assert (src.read(2) == data["nir"].values).all()
+        assert float(src.tags(2)["STATISTICS_MEAN"]) == pytest.approx(data["nir"].values.mean())
+        assert float(src.tags(1)["STATISTICS_MAXIMUM"]) == 255
+
+
+def test_write_geotiff_chunked(tmp_path):
+    red = numpy.arange(300 * 200, dtype="int16").reshape(300, 200)
+    data = xarray.Dataset({
+        "red": (("y", "x"), dask.array.from_array(red, chunks=128)),
+    })
+    chunks = write_geotiff(data, "int16", {"red": "Red"},
+                           statistics=True, spool_dir=str(tmp_path),
+                           width=200, height=300, transform=Affine(10.0, 0.0, 1000.0, 0.0, -10.0, 5000.0),
+                           crs="EPSG:3577", nodata=-999, tiled=True, blockxsize=128, blockysize=128)
+    with MemoryFile(b"".join(chunks)) as memfile, memfile.open() as src:
+        assert (src.read(1) == red).all()
+        assert float(src.tags(1)["STATISTICS_MEAN"]) == pytest.approx(red.mean())
+        assert float(src.tags(1)["STATISTICS_STDDEV"]) == pytest.approx(red.std(), rel=1e-4)